@@ -0,0 +1,93 @@
+"""
+Measures how long the github-docx command takes to start for the cases that
+should not load the converters: --help, rejecting a bad argument, and a dry
+run of a local folder. Each command runs in a fresh interpreter; the median
+wall time is compared with a bare "python -c pass", and python -X importtime
+shows whether python-docx, lxml, requests or pygments were imported.
+
+Exits with an error when a command takes more than --budget milliseconds over
+the bare interpreter or imports one of those packages, so it can gate changes
+the same way run_benchmarks.py --compare does.
+
+Example:
+    python benchmarks/cli_startup.py --repeat 20 --budget 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('docx', 'lxml', 'requests', 'urllib3', 'pygments')
+
+COMMANDS = [
+    ('--help', ['--help']),
+    ('bad url', ['https://example.com/not/github']),
+    ('dry run (local)', [ROOT, '--source', 'local', '--dry-run', '-e', '.py']),
+]
+
+
+def run(args, env):
+    """Runs one command in a fresh interpreter and returns its wall time in milliseconds."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + args, env=env, cwd=ROOT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def heavy_imports(args, env):
+    """Top-level packages from HEAVY that the command imports, according to -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    found = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip().split('.')[0]
+            if name in HEAVY:
+                found.add(name)
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help="Runs per command; the median is reported")
+    parser.add_argument('--budget', type=float, default=50.0,
+                        help="Allowed milliseconds over a bare interpreter before the check fails")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    env.pop('GITHUB_TOKEN', None)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # Measure with .pyc files, as an installed package has
+
+    def median(command):
+        run(command, env)  # Warm the file system cache and .pyc files
+        return statistics.median(run(command, env) for _ in range(args.repeat))
+
+    bare = median(['-c', 'pass'])
+    eager = median(['-c', 'import docx, requests'])
+    print(f"{'python -c pass':28} {bare:7.1f} ms")
+    print(f"{'import docx, requests':28} {eager:7.1f} ms  (+{eager - bare:.1f} ms, what every run used to pay)")
+
+    failures = []
+    for label, command in COMMANDS:
+        command = ['-m', 'github_docx'] + command
+        elapsed = median(command)
+        heavy = heavy_imports(command, env)
+        print(f"{'github-docx ' + label:28} {elapsed:7.1f} ms  (+{elapsed - bare:.1f} ms)"
+              + (f"  imports {', '.join(heavy)}" if heavy else ""))
+        if elapsed - bare > args.budget:
+            failures.append(f"{label} took {elapsed - bare:.1f} ms over the interpreter (budget {args.budget:.0f} ms)")
+        if heavy:
+            failures.append(f"{label} imported {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Local stand-in for the parts of the GitHub API the converters use, serving a
+synthetic repository. Used by run_benchmarks.py so runs are repeatable and
+never touch the real API or its rate limit.
+
+Endpoints: repository info, commits, recursive trees, contents listings,
+tarballs and raw file downloads (under /raw). Listings carry ETags and
+answer If-None-Match with 304, like GitHub does. POST /graphql answers the
+blob queries of the "graphql" source mode (aliased object(oid: ...) fields
+asking for text, byteSize and isBinary); nothing else of GraphQL is
+understood.
+"""
+
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote, quote
+
+OWNER = "bench"
+REPO = "repo"
+BRANCH = "main"
+ROOT_FOLDER = "src"  # Everything lives under this folder; the benchmark converts it
+BLOB_FIELD = re.compile(r'(\w+): object\(oid: "([0-9a-f]{40})"\)')
+
+
+def blob_sha(data):
+    """Git blob SHA of some bytes, as GitHub reports it."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def synthetic_file(rng, index, size):
+    """Roughly size bytes of plausible source code."""
+    lines = [f"// Generated file {index}\n"]
+    total = len(lines[0])
+    n = 0
+    while total < size:
+        line = f"    int value_{n} = compute({rng.randint(0, 9999)}, \"item {n}\");  // step {n}\n"
+        lines.append(line)
+        total += len(line)
+        n += 1
+    return ''.join(lines).encode('utf-8')
+
+
+def build_repo(file_count=200, depth=2, fanout=4, median_size=4000, size_sigma=1.0,
+               extensions=('.cpp', '.h', '.py'), seed=1):
+    """
+    Returns {path: bytes} for a repository of file_count files spread over a
+    folder tree depth levels deep with fanout subfolders per level. File
+    sizes follow a log-normal distribution around median_size.
+    """
+    rng = random.Random(seed)
+    folders = [ROOT_FOLDER]
+    level = [ROOT_FOLDER]
+    for _ in range(depth):
+        level = [f"{parent}/dir{i}" for parent in level for i in range(fanout)]
+        folders.extend(level)
+
+    files = {}
+    for index in range(file_count):
+        folder = folders[index % len(folders)]
+        ext = extensions[index % len(extensions)]
+        size = max(16, int(rng.lognormvariate(0, size_sigma) * median_size))
+        files[f"{folder}/file{index}{ext}"] = synthetic_file(rng, index, size)
+    return files
+
+
+class FakeGitHub:
+    """
+    Serves a repository (a {path: bytes} dict) on 127.0.0.1 in a background
+    thread. latency is added to every request; rate_limit API requests are
+    allowed per rate_window seconds (None for no limit); trees with more
+    entries than tree_limit are reported as truncated, which makes the
+    converters fall back to walking the contents API. GraphQL responses over
+    graphql_max_bytes fail with a 502, as large ones do on GitHub when the
+    query times out.
+    """
+
+    def __init__(self, files, latency=0.0, rate_limit=None, rate_window=60.0, tree_limit=100000,
+                 graphql_max_bytes=4 * 1024 * 1024):
+        self.files = files
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.tree_limit = tree_limit
+        self.graphql_max_bytes = graphql_max_bytes
+        self.commit_sha = hashlib.sha1(repr(sorted(files)).encode('utf-8')).hexdigest()
+        self.tree_sha = hashlib.sha1(self.commit_sha.encode('ascii')).hexdigest()
+        self.blob_shas = {path: blob_sha(data) for path, data in files.items()}
+        self.blobs = {sha: files[path] for path, sha in self.blob_shas.items()}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+        self._tarball = None
+        self.server = None
+        self.base = None
+
+    def start(self):
+        handler = type('Handler', (_Handler,), {'github': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+
+    def count(self, kind):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def take_rate_limit(self):
+        """Returns (allowed, remaining, reset epoch) for one more API request."""
+        with self._lock:
+            now = time.time()
+            if now >= self._window_start + self.rate_window:
+                self._window_start, self._window_used = now, 0
+            reset = self._window_start + self.rate_window
+            if self.rate_limit is None:
+                return True, 5000, reset
+            if self._window_used >= self.rate_limit:
+                return False, 0, reset
+            self._window_used += 1
+            return True, self.rate_limit - self._window_used, reset
+
+    def listing(self, folder):
+        """Contents API entries directly inside folder, or None if it does not exist."""
+        prefix = folder + '/' if folder else ''
+        entries = {}
+        for path in self.files:
+            if not path.startswith(prefix):
+                continue
+            name, _, rest = path[len(prefix):].partition('/')
+            if rest:
+                entries[name] = {'type': 'dir', 'name': name, 'path': prefix + name,
+                                 'url': self.contents_url(prefix + name)}
+            else:
+                entries[name] = {'type': 'file', 'name': name, 'path': path, 'sha': self.blob_shas[path],
+                                 'size': len(self.files[path]), 'url': self.contents_url(path),
+                                 'download_url': f"{self.base}/raw/{OWNER}/{REPO}/{self.commit_sha}/{quote(path)}"}
+        if not entries and folder:
+            return None
+        return list(entries.values())
+
+    def contents_url(self, path):
+        return f"{self.base}/repos/{OWNER}/{REPO}/contents/{quote(path)}"
+
+    def tree(self):
+        entries, folders = [], set()
+        for path, data in self.files.items():
+            parts = path.split('/')
+            folders.update('/'.join(parts[:i]) for i in range(1, len(parts)))
+            entries.append({'path': path, 'type': 'blob', 'sha': self.blob_shas[path], 'size': len(data)})
+        entries.extend({'path': folder, 'type': 'tree'} for folder in folders)
+        entries.sort(key=lambda entry: entry['path'])
+        return {'sha': self.tree_sha, 'tree': entries, 'truncated': len(entries) > self.tree_limit}
+
+    def graphql_blobs(self, query):
+        """The data of a blob query: {alias: blob} for every object(oid: ...) field."""
+        fields = {}
+        for alias, sha in BLOB_FIELD.findall(query):
+            data = self.blobs.get(sha)
+            if data is None:
+                fields[alias] = None
+                continue
+            binary = b'\0' in data[:8000]
+            fields[alias] = {'byteSize': len(data), 'isBinary': binary,
+                             'text': None if binary else data.decode('utf-8', errors='replace')}
+        return fields
+
+    def tarball(self):
+        with self._lock:
+            if self._tarball is None:
+                buf = io.BytesIO()
+                with tarfile.open(fileobj=buf, mode='w:gz') as archive:
+                    for path, data in self.files.items():
+                        info = tarfile.TarInfo(f"{OWNER}-{REPO}-{self.commit_sha[:7]}/{path}")
+                        info.size = len(data)
+                        archive.addfile(info, io.BytesIO(data))
+                self._tarball = buf.getvalue()
+            return self._tarball
+
+
+class _Handler(BaseHTTPRequestHandler):
+    github = None
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, status=200, headers=None, content_type='application/json'):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, headers):
+        body = json.dumps(data).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        headers['ETag'] = etag
+        if self.headers.get('If-None-Match') == etag:
+            self.github.count('not_modified')
+            self.send_response(304)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(body, headers=headers)
+
+    def not_found(self, headers=None):
+        self.send_body(json.dumps({'message': 'Not Found'}).encode('utf-8'), 404, headers)
+
+    def do_POST(self):
+        github = self.github
+        if github.latency:
+            time.sleep(github.latency)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlparse(self.path).path != '/graphql':
+            return self.not_found()
+        github.count('graphql')
+        if not self.headers.get('Authorization'):
+            return self.send_body(json.dumps({'message': 'Requires authentication'}).encode('utf-8'), 401)
+
+        allowed, remaining, reset = github.take_rate_limit()
+        headers = {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(int(reset) + 1)}
+        if not allowed:
+            github.count('rate_limited')
+            body = json.dumps({'message': 'API rate limit exceeded'}).encode('utf-8')
+            return self.send_body(body, 403, headers)
+
+        request = json.loads(body)
+        variables = request.get('variables', {})
+        if (variables.get('owner'), variables.get('name')) != (OWNER, REPO):
+            errors = [{'type': 'NOT_FOUND', 'message': 'Could not resolve to a Repository'}]
+            return self.send_body(json.dumps({'data': {'repository': None}, 'errors': errors}).encode('utf-8'),
+                                  headers=headers)
+        response = json.dumps({'data': {'repository': github.graphql_blobs(request['query'])}}).encode('utf-8')
+        if len(response) > github.graphql_max_bytes:
+            github.count('graphql_too_large')
+            body = json.dumps({'message': 'Something went wrong while executing your query. '
+                                          'This may be the result of a timeout.'}).encode('utf-8')
+            return self.send_body(body, 502, headers)
+        return self.send_body(response, headers=headers)
+
+    def do_GET(self):
+        github = self.github
+        if github.latency:
+            time.sleep(github.latency)
+        url = urlparse(self.path)
+        path = unquote(url.path)
+
+        if path.startswith('/raw/'):
+            github.count('raw')
+            file_path = path.split('/', 5)[5]
+            if file_path not in github.files:
+                return self.not_found()
+            return self.send_body(github.files[file_path], content_type='text/plain')
+
+        allowed, remaining, reset = github.take_rate_limit()
+        headers = {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(int(reset) + 1)}
+        if not allowed:
+            github.count('rate_limited')
+            body = json.dumps({'message': 'API rate limit exceeded'}).encode('utf-8')
+            return self.send_body(body, 403, headers)
+
+        repo_prefix = f"/repos/{OWNER}/{REPO}"
+        if not path.startswith(repo_prefix):
+            return self.not_found(headers)
+        rest = path[len(repo_prefix):]
+        if rest in ('', '/'):
+            github.count('repo')
+            return self.send_json({'default_branch': BRANCH, 'full_name': f"{OWNER}/{REPO}"}, headers)
+        if rest.startswith('/commits/'):
+            github.count('commits')
+            return self.send_json({'sha': github.commit_sha, 'commit': {'tree': {'sha': github.tree_sha}}}, headers)
+        if rest.startswith('/git/trees/'):
+            github.count('trees')
+            return self.send_json(github.tree(), headers)
+        if rest.startswith('/contents'):
+            github.count('contents')
+            listing = github.listing(rest[len('/contents'):].strip('/'))
+            if listing is None:
+                return self.not_found(headers)
+            return self.send_json(listing, headers)
+        if rest.startswith('/tarball/'):
+            github.count('tarball')
+            return self.send_body(github.tarball(), headers=headers, content_type='application/x-gzip')
+        return self.not_found(headers)
+
+
+if __name__ == "__main__":
+    fake = FakeGitHub(build_repo()).start()
+    print(f"Serving {len(fake.files)} files at {fake.base} (Ctrl+C to stop)")
+    print(f"Repository URL: https://github.com/{OWNER}/{REPO}/tree/{BRANCH}/{ROOT_FOLDER}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
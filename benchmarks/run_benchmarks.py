@@ -0,0 +1,281 @@
+"""
+Benchmarks WordMaker.py, WordMakerByFolder.py and the web backend's agent
+against a local fake GitHub API (see fake_github.py) serving a synthetic
+repository, and saves the results as JSON so runs can be compared.
+
+For every converter and source mode it reports files per second, the HTTP
+requests the converter issued per file (and what the fake server saw), peak
+memory, and the time spent in each phase:
+
+    discover         listing the files (trees/contents API, or the tarball download)
+    download_render  process_files: downloading, highlighting and rendering
+    save             writing the .docx files
+    other            the rest of run(), e.g. rendering archive members
+
+Each run happens in its own process so peak memory is measured per run.
+
+Examples:
+    python benchmarks/run_benchmarks.py --files 500 --latency 0.02 --out baseline.json
+    python benchmarks/run_benchmarks.py --files 500 --latency 0.02 --out new.json --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+from fake_github import FakeGitHub, build_repo, OWNER, REPO, BRANCH, ROOT_FOLDER
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = {
+    'wordmaker': (ROOT, 'WordMaker'),
+    'byfolder': (ROOT, 'WordMakerByFolder'),
+    'backend': (os.path.join(ROOT, 'github-docx-web', 'backend'), 'app'),
+}
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished children, in MB."""
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+
+def time_phases(agent, target, phases, found):
+    """Wraps the agent's phase methods so the time spent in each is added to phases."""
+    def timed(name, method, materialize=False):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = method(*args, **kwargs)
+            if materialize:
+                result = list(result)  # Generators do their work while being consumed
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+            if name == 'discover':
+                found.append(len(result))
+            return result
+        return wrapper
+
+    agent.discover_files = timed('discover', agent.discover_files)
+    agent.fetch_archive_files = timed('discover', agent.fetch_archive_files, materialize=True)
+    agent.process_files = timed('download_render', agent.process_files)
+    if target == 'wordmaker':
+        agent.doc.save = timed('save', agent.doc.save)
+    else:
+        agent.save_all_documents = timed('save', agent.save_all_documents)
+
+
+def run_child(spec):
+    """Runs one converter once (in this process) and prints its measurements."""
+    directory, module_name = TARGETS[spec['target']]
+    sys.path[:0] = [directory, ROOT]  # The backend imports the github_docx package from this checkout
+    record = {'target': spec['target'], 'source_mode': spec['source_mode']}
+    try:
+        module = __import__(module_name)
+    except ImportError as e:
+        record['error'] = f"cannot import {module_name}: {e}"
+        print(RESULT_PREFIX + json.dumps(record))
+        return
+
+    options = {'source_mode': spec['source_mode'], 'max_workers': spec['max_workers'],
+               'highlight_theme': spec['highlight'], 'cache_dir': spec['cache_dir']}
+    if spec['source_mode'] == 'graphql':
+        options['github_token'] = 'benchmark'  # GraphQL needs a token; the fake server accepts any
+    if spec['target'] == 'wordmaker':
+        agent = module.GitHubFolderAgent(os.path.join(spec['output_dir'], 'Report.docx'), **options)
+    else:
+        if spec['target'] == 'byfolder':
+            options['render_workers'] = spec['render_workers']
+        agent = module.GitHubFolderAgent(output_directory=spec['output_dir'], **options)
+    agent.api_base = spec['base']
+    agent.raw_base = spec['base'] + '/raw'
+
+    phases, found = {}, []
+    time_phases(agent, spec['target'], phases, found)
+    url = f"https://github.com/{OWNER}/{REPO}/tree/{BRANCH}/{ROOT_FOLDER}"
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        agent.run(url, spec['extensions'])
+    total = time.perf_counter() - started
+
+    errors = [line for line in log.getvalue().splitlines() if line.startswith('[Fatal Error]')]
+    if getattr(agent, 'error', None):
+        errors.append(agent.error)
+    files = found[0] if found else 0
+    phases['other'] = max(0.0, total - sum(phases.values()))
+    output_bytes = sum(os.path.getsize(os.path.join(folder, name))
+                       for folder, _, names in os.walk(spec['output_dir']) for name in names)
+    record.update({
+        'seconds': round(total, 3),
+        'files': files,
+        'files_per_second': round(files / total, 1) if total else None,
+        'failed_files': len(agent.failed_files),
+        'http_requests': agent.http_stats['requests'],
+        'requests_per_file': round(agent.http_stats['requests'] / files, 3) if files else None,
+        'http_retries': agent.http_stats['retries'],
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+        'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+    })
+    if errors:
+        record['error'] = errors[0]
+    print(RESULT_PREFIX + json.dumps(record))
+
+
+def run_once(fake, spec):
+    """Runs one converter in a fresh process and returns its record, plus what the server saw."""
+    fake.reset_counts()
+    output_dir = tempfile.mkdtemp(prefix='docx-bench-')
+    try:
+        spec = dict(spec, output_dir=output_dir, base=fake.base)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(spec)],
+                              capture_output=True, text=True, cwd=output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if not lines:
+        return {'target': spec['target'], 'source_mode': spec['source_mode'],
+                'error': (proc.stderr.strip().splitlines() or ['no result'])[-1]}
+    record = json.loads(lines[-1][len(RESULT_PREFIX):])
+    record['server_requests'] = dict(fake.counts)
+    return record
+
+
+def summarize(runs):
+    """Median of each measurement over repeated runs of the same converter and mode."""
+    good = [run for run in runs if 'error' not in run]
+    if not good:
+        return runs[-1]
+    summary = dict(good[0])
+    for key in ('seconds', 'files_per_second', 'http_requests', 'requests_per_file', 'peak_rss_mb'):
+        values = [run[key] for run in good if run.get(key) is not None]
+        summary[key] = statistics.median_low(values) if values else None
+    summary['phases'] = {name: round(statistics.median(run['phases'].get(name, 0.0) for run in good), 3)
+                         for name in good[0]['phases']}
+    summary['runs'] = [run['seconds'] for run in good]
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Prints changes against a baseline file; returns True if anything got worse than tolerance."""
+    previous = {(r['target'], r['source_mode']): r for r in baseline['results'] if 'error' not in r}
+    regressed = False
+    print(f"\nCompared with baseline from {baseline.get('created', '?')}:")
+    for result in results:
+        before = previous.get((result['target'], result['source_mode']))
+        if before is None or 'error' in result:
+            continue
+        changes = []
+        for key, higher_is_better in (('files_per_second', True), ('http_requests', False), ('peak_rss_mb', False)):
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = ' REGRESSION'
+                regressed = True
+            changes.append(f"{key} {old} -> {new} ({change:+.0%}){flag}")
+        print(f"  {result['target']:10} {result['source_mode']:8} " + '; '.join(changes))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--targets', default='wordmaker,byfolder,backend', help="Comma-separated: wordmaker, byfolder, backend")
+    parser.add_argument('--modes', default='api,archive', help="Comma-separated source modes: api, graphql, archive")
+    parser.add_argument('--files', type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument('--depth', type=int, default=2, help="Folder levels below the converted folder")
+    parser.add_argument('--fanout', type=int, default=4, help="Subfolders per folder")
+    parser.add_argument('--median-size', type=int, default=4000, help="Median file size in bytes")
+    parser.add_argument('--size-sigma', type=float, default=1.0, help="Spread of the log-normal file size distribution")
+    parser.add_argument('--extensions', default='.cpp,.h,.py')
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument('--rate-limit', type=int, default=None, help="API requests allowed per --rate-window")
+    parser.add_argument('--rate-window', type=float, default=60.0)
+    parser.add_argument('--tree-limit', type=int, default=100000,
+                        help="Trees larger than this are truncated; 0 forces the contents API walk")
+    parser.add_argument('--graphql-max-bytes', type=int, default=4 * 1024 * 1024,
+                        help="Larger GraphQL responses fail with a 502, so batches have to be split")
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--render-workers', type=int, default=1, help="WordMakerByFolder render processes")
+    parser.add_argument('--highlight', default=None, help="Pygments theme, e.g. friendly")
+    parser.add_argument('--cache-dir', default=None, help="Blob cache folder (runs after the first are warm)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per converter and mode; the median is reported")
+    parser.add_argument('--out', default='benchmark_results.json', help="Where to save the results")
+    parser.add_argument('--compare', default=None, help="Earlier results file to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed slowdown before --compare fails")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    extensions = args.extensions.split(',')
+    files = build_repo(args.files, args.depth, args.fanout, args.median_size, args.size_sigma, extensions)
+    fake = FakeGitHub(files, latency=args.latency, rate_limit=args.rate_limit,
+                      rate_window=args.rate_window, tree_limit=args.tree_limit,
+                      graphql_max_bytes=args.graphql_max_bytes).start()
+    print(f"Fake GitHub at {fake.base}: {len(files)} files, {sum(map(len, files.values())) / 1e6:.1f} MB, "
+          f"{args.latency * 1000:.0f} ms latency")
+
+    cache_dir = os.path.abspath(args.cache_dir) if args.cache_dir else None
+    results = []
+    try:
+        for target in args.targets.split(','):
+            for mode in args.modes.split(','):
+                spec = {'target': target, 'source_mode': mode, 'extensions': extensions,
+                        'max_workers': args.max_workers, 'render_workers': args.render_workers,
+                        'highlight': args.highlight, 'cache_dir': cache_dir}
+                result = summarize([run_once(fake, spec) for _ in range(args.repeat)])
+                results.append(result)
+                if 'error' in result:
+                    print(f"{target:10} {mode:8} failed: {result['error']}")
+                    continue
+                phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in result['phases'].items())
+                print(f"{target:10} {mode:8} {result['files_per_second']:8.1f} files/s  {result['seconds']:6.2f}s  "
+                      f"{result['http_requests']:5} requests ({result['requests_per_file']}/file)  {result['peak_rss_mb']} MB peak  ({phases})")
+    finally:
+        fake.stop()
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('child', 'out', 'compare')},
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
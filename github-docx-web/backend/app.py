@@ -3,500 +3,1497 @@ GitHub to DOCX Web API - Backend Server
 Flask-based REST API for converting GitHub repositories to Word documents
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import os
 import requests
-import re
 import datetime
+import tarfile
+import hashlib
+import json
+import zipfile
+import math
+import multiprocessing
+import gc
+import sys
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import uuid
-import shutil
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-from urllib.parse import urlparse
 import threading
 import time
+import shutil
+from urllib.parse import urlparse
+from werkzeug.serving import is_running_from_reloader
+from werkzeug.utils import secure_filename
+
+from github_docx import by_folder, core
+from github_docx.core import BaseAgent, is_rate_limited
 
 app = Flask(__name__)
 CORS(app)
 
+# Generated documents, one folder per job
+OUTPUT_DIR = 'output'
+
+# GitHub itself, unless GITHUB_API_URL / GITHUB_RAW_URL point the server (and its
+# workers) at a stand-in such as benchmarks/fake_github.py
+GITHUB_API = os.environ.get('GITHUB_API_URL', core.GITHUB_API)
+GITHUB_RAW = os.environ.get('GITHUB_RAW_URL', core.GITHUB_RAW)
+
+# File contents shared by all jobs, keyed by git blob SHA
+BLOB_CACHE_DIR = os.path.join('cache', 'blobs')
+BLOB_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Conditional-request cache for GitHub API listings, shared by all jobs
+API_CACHE_DIR = os.path.join('cache', 'api')
+
+# Server folders that "local" and "git" conversions may read; empty disables both sources
+LOCAL_SOURCE_ROOTS = []
+
 # Store job status
 jobs = {}
 
-class GitHubFolderAgent:
-    def __init__(self, output_directory="Output_Reports", github_token=None, job_id=None):
-        self.output_directory = output_directory
-        self.github_token = github_token
-        self.folder_documents = {}
-        self.source_url = ""
+# /api/convert resolves a branch to its commit before answering, with at most one
+# GitHub request of RESOLVE_TIMEOUT seconds per step
+RESOLVE_TIMEOUT = 3
+
+# Every /api/convert call gets its own request id. Requests that would produce
+# identical documents share one job, and its files on disk (single-flight)
+job_requests = {}  # request id -> {'job': job id, 'cancelled': bool}
+results = {}  # result key -> id of the job producing those documents
+
+# Jobs run in worker processes, so downloading and rendering never hold
+# the GIL of the process that answers API requests
+JOB_PROCESSES = os.cpu_count() or 1
+PROGRESS_INTERVAL = 0.25  # Seconds between progress reports from a running job
+JOB_TASKS_PER_WORKER = 20  # Jobs a worker runs before it is replaced, returning its memory to the OS (Python 3.11+)
+job_pool = None
+progress_queue = None
+worker_pids = set()  # Job workers that reported in when they started, for /api/health
+_job_pool_lock = threading.Lock()
+
+# Admission control: jobs wait in one queue per client (token or IP) and
+# the queues take turns, so one client's burst cannot starve the others
+MAX_QUEUED_JOBS = 500  # Waiting jobs in total, batches included, before /api/convert answers 429
+MAX_QUEUED_PER_CLIENT = 10
+JOB_RESUMES = 3  # Times a job is queued again after its worker died or GitHub's rate limit ran out
+job_queues = OrderedDict()  # client -> deque of waiting job ids; the first client goes next
+running_jobs = set()
+average_job_seconds = 30.0  # Moving average of finished jobs, used for Retry-After
+_scheduler_lock = threading.RLock()
+
+# All jobs of a client draw on one GitHub rate limit. Its last known state
+# comes from their progress reports; while fewer than RATE_LIMIT_RESERVE API
+# requests are left, the client's queued jobs wait for the reset to start
+RATE_LIMIT_RESERVE = 10
+client_rate_limits = {}  # client -> (requests remaining, reset as Unix time)
+dispatch_timer = None
+
+# /api/convert/batch queues up to MAX_BATCH_REPOS jobs in one request, if they
+# fit under MAX_QUEUED_JOBS and leave each client at most MAX_BATCH_QUEUED_PER_CLIENT
+# waiting jobs. Their branches are resolved afterwards, BATCH_RESOLVE_WORKERS at a time
+MAX_BATCH_REPOS = 250
+MAX_BATCH_QUEUED_PER_CLIENT = 250
+BATCH_RESOLVE_WORKERS = 8
+batches = {}  # batch id -> {'created_at': Unix time, 'repos': [{'url', 'job_id', 'error'}]}
+
+# Server-Sent Events: streams wait on job_events and wake up whenever any
+# job changes (job_events_version is bumped), then send what changed
+SSE_KEEPALIVE = 15  # Seconds between keep-alive comments on an idle stream
+job_events = threading.Condition()
+job_events_version = 0
+
+# Janitor: a background thread deletes finished jobs, their files and their
+# records, once unused for OUTPUT_TTL seconds, and the least recently used
+# ones while the job folders hold more than OUTPUT_MAX_BYTES
+OUTPUT_TTL = 24 * 3600
+OUTPUT_MAX_BYTES = 5 * 1024 ** 3
+JANITOR_INTERVAL = 60  # Seconds between sweeps
+janitor_stats = {'last_sweep': None, 'output_bytes': None, 'jobs_removed': 0, 'bytes_freed': 0}
+janitor_thread = None
+
+# /api/bundle zips a job's documents while sending them; .docx files are
+# already deflated, so they are stored rather than compressed again
+BUNDLE_CHUNK_BYTES = 64 * 1024
+
+# /api/metrics in the Prometheus text format. Job workers count on their
+# agent, and the totals come back with the job's result
+METRICS_HELP = {
+    'docx_conversion_requests_total': ('counter', 'Conversion requests, by whether they started a job, shared one or were rejected'),
+    'docx_jobs_finished_total': ('counter', 'Jobs that finished, by final status'),
+    'docx_github_requests_total': ('counter', 'Responses from GitHub, by status code'),
+    'docx_github_retries_total': ('counter', 'GitHub requests that were retried'),
+    'docx_downloaded_bytes_total': ('counter', 'Bytes downloaded from GitHub'),
+    'docx_files_total': ('counter', 'Files handled by finished jobs, by outcome'),
+    'docx_jobs': ('gauge', 'Jobs known to the server, by status'),
+    'docx_queue_depth': ('gauge', 'Jobs waiting for a worker'),
+    'docx_github_rate_limit_remaining': ('gauge', 'GitHub API requests left, as last reported'),
+    'docx_job_duration_seconds': ('histogram', 'Time from a job starting to finishing'),
+    'docx_phase_seconds': ('histogram', 'Time a job spent per phase; fetching and rendering are summed over threads'),
+    'docx_document_bytes': ('histogram', 'Size of generated documents'),
+}
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+metric_counters = {}  # (name, labels) -> value
+metric_histograms = {}  # (name, labels) -> [buckets, cumulative bucket counts, sum, count]
+metric_gauges = {}  # Gauges reported by jobs; job and queue gauges are read from the scheduler
+_metrics_lock = threading.Lock()
+
+
+try:
+    from pygments.styles import get_style_by_name
+    from pygments.util import ClassNotFound
+except ImportError:
+    get_style_by_name = None
+
+
+class JobCancelled(Exception):
+    """Raised inside a running agent once its job has been cancelled."""
+
+
+def failure_message(error):
+    """What a job reports for the exception that ended its run."""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 404:
+            return "Repository or folder not found. Please check the URL."
+        if status == 403:
+            return "Access forbidden. Rate limit exceeded or private repo requires token."
+        if status == 401:
+            return "Authentication failed. Please check your GitHub token."
+        try:
+            return f"GitHub API Error: {error.response.json()['message']}"
+        except (ValueError, KeyError, TypeError):
+            return f"GitHub API Error: {error}"
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Network error while talking to GitHub: {error}"
+    if isinstance(error, tarfile.TarError):
+        return f"Failed to download repository archive: {error}"
+    if isinstance(error, ValueError):
+        return f"Invalid URL format: {error}"
+    return str(error)
+
+
+class GitHubFolderAgent(by_folder.GitHubFolderAgent):
+    """
+    The folder-wise converter of the github_docx package as a job worker runs
+    it. On top of it, the agent reports its progress for /api/status, stops
+    between files once cancelled, converts the commit /api/convert pinned,
+    keeps its file list in checkpoint_path for a resumed attempt and times
+    its phases for /api/metrics. Documents are streamed to disk by default.
+    """
+
+    def __init__(self, output_directory="Output_Reports", job_id=None, streaming=True, **options):
+        super().__init__(output_directory, streaming=streaming, **options)
+        self.api_base = GITHUB_API
+        self.raw_base = GITHUB_RAW
         self.job_id = job_id
         self.processed_files = 0
-        self.total_files = 0
         self.current_file = ""
         self.status = "initializing"
-        self.error = None
-        
-        if not os.path.exists(self.output_directory):
-            os.makedirs(self.output_directory)
-
-    def _setup_document_style(self, doc):
-        """Sets up a professional visual style for the Word document."""
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Segoe UI'
-        font.size = Pt(10.5)
-        
-        h1 = doc.styles['Heading 1']
-        h1.font.name = 'Segoe UI'
-        h1.font.size = Pt(14)
-        h1.font.color.rgb = RGBColor(31, 78, 121)
-        h1.font.bold = True
-        h1.paragraph_format.space_before = Pt(12)
-        h1.paragraph_format.space_after = Pt(3)
-
-    def _set_paragraph_shading(self, paragraph, color_hex):
-        """Adds background color/shading to a paragraph."""
-        shd = OxmlElement('w:shd')
-        shd.set(qn('w:val'), 'clear')
-        shd.set(qn('w:color'), 'auto')
-        shd.set(qn('w:fill'), color_hex)
-        paragraph.paragraph_format.element.get_or_add_pPr().append(shd)
-
-    def get_headers(self):
-        """Returns headers for GitHub API requests."""
-        headers = {'Accept': 'application/vnd.github.v3+json'}
-        if self.github_token:
-            headers['Authorization'] = f'token {self.github_token}'
-        return headers
+        self.cancelled = False  # Set from the job's reporter thread; checked between files
+        self.stopped_by_rate_limit = False  # The run failed on a rate limit it did not wait out; resume at rate_limited_until
+        self.pinned_ref = None  # (commit, tree) SHAs resolved by /api/convert, so the job converts exactly that commit
+        self.checkpoint_path = None  # File list kept here lets a resumed job skip listing the repository again
+        # For /api/metrics; fetching and rendering are summed over the download threads
+        self.phase_seconds = {'counting': 0.0, 'fetching': 0.0, 'rendering': 0.0, 'saving': 0.0}
 
-    def parse_github_url(self, url):
-        """Converts a browser URL to a GitHub API URL."""
-        parsed = urlparse(url)
-        path_parts = parsed.path.strip('/').split('/')
-        
-        if len(path_parts) < 2:
-            raise ValueError("Invalid GitHub URL")
+    def resolve_ref(self, owner, repo, ref=None):
+        if self.pinned_ref:
+            return self.pinned_ref
+        return super().resolve_ref(owner, repo, ref)
 
-        owner = path_parts[0]
-        repo = path_parts[1]
-        
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents"
-        params = {}
-
-        if len(path_parts) > 3 and path_parts[2] == 'tree':
-            branch = path_parts[3]
-            subpath = "/".join(path_parts[4:])
-            api_url = f"{api_url}/{subpath}"
-            params['ref'] = branch
-            
+    def parse_github_url(self, url):
+        api_url, params = super().parse_github_url(url)
+        if self.pinned_ref:
+            params['ref'] = self.pinned_ref[0]
         return api_url, params
 
-    def natural_key(self, string_):
-        """Returns a key for natural sorting."""
-        return [int(s) if s.isdigit() else s.lower() for s in re.split(r'(\d+)', string_)]
-
-    def sanitize_filename(self, name):
-        """Sanitizes folder name to be used as a valid filename."""
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            name = name.replace(char, '_')
-        return name.strip()
-
-    def get_or_create_document(self, folder_name):
-        """Gets existing document for folder or creates a new one."""
-        if folder_name not in self.folder_documents:
-            doc = Document()
-            self._setup_document_style(doc)
-            
-            title = doc.add_heading(f'{folder_name}', 0)
-            title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            title.runs[0].font.name = 'Segoe UI'
-            title.runs[0].font.color.rgb = RGBColor(16, 54, 92)
-
-            p = doc.add_paragraph()
-            p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            p.add_run(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n").bold = True
-            p.add_run(f"Source: {self.source_url}")
-            doc.add_page_break()
-            
-            self.folder_documents[folder_name] = doc
-            
-        return self.folder_documents[folder_name]
-
-    def get_folder_name_from_path(self, file_path):
-        """Extracts the immediate parent folder name from a file path."""
-        path_parts = file_path.split('/')
-        if len(path_parts) > 1:
-            return path_parts[-2]
-        return "Root"
-
-    def count_files_recursive(self, api_url, params, target_extensions):
-        """Counts total files to process for progress tracking."""
-        count = 0
-        try:
-            response = requests.get(api_url, headers=self.get_headers(), params=params)
-            print(f"[DEBUG] Count API Response Status: {response.status_code} for {api_url}")
-            
-            if response.status_code == 404:
-                self.error = f"Repository or folder not found. Please check the URL."
-                return 0
-            elif response.status_code == 403:
-                self.error = f"Access forbidden. Rate limit exceeded or private repo requires token."
-                return 0
-            elif response.status_code == 401:
-                self.error = f"Authentication failed. Please check your GitHub token."
-                return 0
-                
-            response.raise_for_status()
-            items = response.json()
-            
-            # Check if response is an error message
-            if isinstance(items, dict) and 'message' in items:
-                self.error = f"GitHub API Error: {items['message']}"
-                print(f"[DEBUG] GitHub API Error: {items['message']}")
-                return 0
-                
-        except requests.exceptions.RequestException as e:
-            self.error = f"Network error while counting files: {str(e)}"
-            print(f"[DEBUG] Network Error: {e}")
-            return 0
-        except Exception as e:
-            self.error = f"Error counting files: {str(e)}"
-            print(f"[DEBUG] Exception: {e}")
-            return 0
+    def manifest_path(self):
+        """Checkpoints are kept in checkpoint_path (jobs are never regenerated incrementally)."""
+        return self.checkpoint_path
 
-        if isinstance(items, dict):
-            items = [items]
-        
-        for item in items:
-            if item['type'] == 'file':
-                if any(item['name'].endswith(ext) for ext in target_extensions):
-                    count += 1
-                    print(f"[DEBUG] Found matching file: {item['name']}")
-            elif item['type'] == 'dir':
-                count += self.count_files_recursive(item['url'], params, target_extensions)
-        
-        return count
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
 
-    def fetch_files_recursive(self, api_url, params, target_extensions, current_folder="Root"):
-        """Recursively fetches files from the GitHub API."""
-        self.status = f"Scanning: {api_url.split('/')[-1]}"
-        try:
-            response = requests.get(api_url, headers=self.get_headers(), params=params)
-            print(f"[DEBUG] Fetch API Response Status: {response.status_code} for {api_url}")
-            
-            if response.status_code == 404:
-                self.error = f"Repository or folder not found: {api_url.split('/')[-1]}"
-                return
-            elif response.status_code == 403:
-                self.error = f"Access forbidden. Rate limit exceeded or private repo requires token."
-                return
-            elif response.status_code == 401:
-                self.error = f"Authentication failed. Please check your GitHub token."
-                return
-                
-            response.raise_for_status()
-            items = response.json()
-            
-            # Check if response is an error message
-            if isinstance(items, dict) and 'message' in items:
-                self.error = f"GitHub API Error: {items['message']}"
-                print(f"[DEBUG] GitHub API Error: {items['message']}")
-                return
-                
-        except requests.exceptions.RequestException as e:
-            self.error = f"Network error while fetching files: {str(e)}"
-            print(f"[DEBUG] Network Error: {e}")
-            return
-        except Exception as e:
-            self.error = f"Failed to fetch folder contents: {e}"
-            print(f"[DEBUG] Exception: {e}")
-            return
+    def _timed_download(self, file_item):
+        """Also adds the time spent downloading and highlighting to the job's phases."""
+        started = time.perf_counter()
+        code_content = self.download_file(file_item)
+        fetched = time.perf_counter()
+        runs = self.highlight(file_item, code_content)
+        finished = time.perf_counter()
+        with self._http_lock:
+            self.phase_seconds['fetching'] += fetched - started
+            self.phase_seconds['rendering'] += finished - fetched
+        return code_content, runs, finished - started
 
-        if isinstance(items, dict):
-            items = [items]
-        
-        if isinstance(items, list):
-            items.sort(key=lambda x: self.natural_key(x['name']))
-            print(f"[DEBUG] Found {len(items)} items in folder")
-
-        for item in items:
-            if item['type'] == 'file':
-                if any(item['name'].endswith(ext) for ext in target_extensions):
-                    folder_name = self.get_folder_name_from_path(item['path'])
-                    self.process_file(item, folder_name)
-            
-            elif item['type'] == 'dir':
-                self.fetch_files_recursive(item['url'], params, target_extensions, item['name'])
-
-    def process_file(self, file_item, folder_name):
-        """Downloads raw content and formats it beautifully in Word."""
-        name = file_item['name']
-        download_url = file_item['download_url']
-        path = file_item['path']
-
-        self.current_file = name
-        self.status = f"Processing: {name}"
-        
-        try:
-            content_resp = requests.get(download_url, headers=self.get_headers())
-            content_resp.raise_for_status()
-            code_content = content_resp.text
-            
-            doc = self.get_or_create_document(folder_name)
-            
-            doc.add_heading(name, level=1)
-            
-            p_path = doc.add_paragraph()
-            p_path.paragraph_format.space_after = Pt(6)
-            run_path = p_path.add_run(f"Full Path: {path}")
-            run_path.italic = True
-            run_path.font.name = 'Segoe UI'
-            run_path.font.size = Pt(8)
-            run_path.font.color.rgb = RGBColor(128, 128, 128)
-
-            code_paragraph = doc.add_paragraph(code_content)
-            
-            code_paragraph.style = 'No Spacing'
-            for run in code_paragraph.runs:
-                run.font.name = 'Consolas'
-                run.font.size = Pt(9.5)
-                run.font.color.rgb = RGBColor(0, 0, 0)
-            
-            self._set_paragraph_shading(code_paragraph, "F2F2F2")
-            
-            code_paragraph.paragraph_format.left_indent = Inches(0.1)
-            code_paragraph.paragraph_format.space_before = Pt(6)
-            code_paragraph.paragraph_format.space_after = Pt(12)
-
-            doc.add_page_break()
-            self.processed_files += 1
-            
-        except Exception as e:
-            self.error = f"Could not download file {name}: {e}"
+    def emit_file(self, file_item, folder_name, code_content, seconds=0.0, runs=None):
+        """Renders one file unless the job was cancelled, and counts it towards the job's progress."""
+        self.check_cancelled()
+        self.current_file = file_item['name']
+        self.status = f"Processing: {file_item['name']}"
+        started = time.perf_counter()
+        super().emit_file(file_item, folder_name, code_content, seconds, runs)
+        self.processed_files += 1
+        with self._http_lock:
+            self.phase_seconds['rendering'] += time.perf_counter() - started
 
     def save_all_documents(self):
-        """Saves all folder documents to separate files."""
-        saved_files = []
-        if not self.folder_documents:
-            return saved_files
-            
-        for folder_name, doc in self.folder_documents.items():
-            safe_filename = self.sanitize_filename(folder_name)
-            output_path = os.path.join(self.output_directory, f"{safe_filename}.docx")
-            doc.save(output_path)
-            saved_files.append({
-                'folder': folder_name,
-                'filename': f"{safe_filename}.docx",
-                'path': output_path
-            })
-        
-        return saved_files
+        """Saves the folder documents and returns {'folder', 'filename', 'path'} for each."""
+        paths = super().save_all_documents()
+        folders = {self.get_output_path(folder_name): folder_name for folder_name in self.folder_documents}
+        return [{'folder': folders[path], 'filename': os.path.basename(path), 'path': path} for path in paths]
+
+    def release(self):
+        """Drops the documents, pending batches and connections of a finished run."""
+        self.folder_documents.clear()
+        self.folder_writers.clear()
+        self.graphql_futures.clear()
+        self.close_session()
+
+    def discard_documents(self):
+        """Drops partially streamed documents after a failed run."""
+        for writer in self.folder_writers.values():
+            writer.abort()
+        self.folder_writers.clear()
 
     def run(self, folder_url, target_extensions=['.cpp', '.h', '.hpp']):
-        """Main execution function."""
+        """Converts the folder and returns the saved documents; on failure sets error and status and returns []."""
         try:
             self.source_url = folder_url
-            self.status = "parsing_url"
             print(f"[DEBUG] Starting conversion for URL: {folder_url}")
             print(f"[DEBUG] Target extensions: {target_extensions}")
-            
-            api_url, params = self.parse_github_url(folder_url)
-            print(f"[DEBUG] Parsed API URL: {api_url}")
-            print(f"[DEBUG] Params: {params}")
-            
-            self.status = "counting_files"
-            self.total_files = self.count_files_recursive(api_url, params, target_extensions)
+
+            started = time.perf_counter()
+            if self.source_mode == "archive":
+                # Listing, downloading and rendering overlap; rendering is timed in emit_file
+                self.status = "downloading_archive"
+                rendering = self.phase_seconds['rendering']
+                self.process_archive(folder_url, target_extensions)
+                self.phase_seconds['fetching'] += (time.perf_counter() - started
+                                                   - (self.phase_seconds['rendering'] - rendering))
+            else:
+                self.status = "counting_files"
+                manifest = self.load_checkpoint(folder_url, target_extensions) if self.checkpoint_path else None
+                if manifest is not None:
+                    print(f"[DEBUG] Resuming from checkpoint: {len(manifest)} file(s)")
+                else:
+                    manifest = self.discover_files(folder_url, target_extensions)
+                self.total_files = len(manifest)
+                self.phase_seconds['counting'] += time.perf_counter() - started
+                if manifest and self.checkpoint_path:
+                    self.checkpoint = {'target_extensions': list(target_extensions), 'manifest': manifest}
+                    self.save_checkpoint()
+                self.check_cancelled()
+                self.status = "processing"
+                self.process_files(manifest)
             print(f"[DEBUG] Total files found: {self.total_files}")
-            
-            # Check if any error occurred during counting
-            if self.error:
-                self.status = "error"
-                return []
-            
-            # Check if no files were found
+
             if self.total_files == 0:
                 self.error = f"No files found with extensions {', '.join(target_extensions)}. Please check the URL and ensure the repository contains files with those extensions."
                 self.status = "error"
                 return []
-            
-            self.status = "processing"
-            self.fetch_files_recursive(api_url, params, target_extensions)
-            
-            # Check if any error occurred during fetching
-            if self.error:
-                self.status = "error"
-                return []
-            
+
+            self.evict_caches()
             self.status = "saving"
+            started = time.perf_counter()
             saved_files = self.save_all_documents()
-            
-            # Check if no documents were created
-            if len(saved_files) == 0:
+            self.phase_seconds['saving'] += time.perf_counter() - started
+            if not saved_files:
                 self.error = "No documents were generated. Files may have failed to download."
                 self.status = "error"
                 return []
-            
+
             self.status = "completed"
+            if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
             print(f"[DEBUG] Conversion completed. Generated {len(saved_files)} document(s).")
             return saved_files
-            
-        except ValueError as e:
-            self.error = f"Invalid URL format: {str(e)}"
-            self.status = "error"
-            print(f"[DEBUG] ValueError: {e}")
+
+        except JobCancelled:
+            self.error = "Conversion was cancelled"
+            self.status = "cancelled"
+            print("[DEBUG] Conversion cancelled")
             return []
         except Exception as e:
-            self.error = str(e)
+            self.error = failure_message(e)
             self.status = "error"
+            self.stopped_by_rate_limit = is_rate_limited(e)
             print(f"[DEBUG] Exception: {e}")
             return []
+        finally:
+            self.close_highlight_pool()
+            self.close_render_pool()
+            self.close_git()
 
 
-def process_job(job_id, url, token, extensions, output_dir):
-    """Background job processor."""
-    jobs[job_id]['status'] = 'processing'
+def agent_progress(agent):
+    """Progress of a running agent, as reported by /api/status."""
+    # A copy all the way down, taken while the download threads cannot change it:
+    # the queue pickles it later, and the next report is compared with it
+    with agent._http_lock:
+        http = dict(agent.http_stats, status_codes=dict(agent.http_stats['status_codes']),
+                    rate_limit_remaining=agent.rate_limit_remaining, rate_limit_reset=agent.rate_limit_reset)
+    return {
+        'processed': agent.processed_files,
+        'total': agent.total_files,
+        'current_file': agent.current_file,
+        'detail_status': agent.status,
+        'http': http,
+        'graphql': dict(agent.graphql_stats),
+        'cache': dict(agent.cache_stats, api_not_modified=agent.api_cache_stats['not_modified'])
+    }
+
+
+def _init_job_worker(queue):
+    """Runs first in every job worker: keeps the progress channel and tells the server the worker's pid."""
+    global progress_queue
+    progress_queue = queue
+    queue.put((None, os.getpid()))
+
+
+def cancel_marker_path(job_id):
+    """File whose existence tells a running job's worker to stop (it sits beside the job's output folder)."""
+    return os.path.join(OUTPUT_DIR, f'{job_id}.cancel')
+
+
+def _report_progress(job_id, agent, stop):
+    """
+    Sends the agent's progress to the API process whenever it changes, and
+    notices cancellation requests (runs in a job worker).
+    """
+    last = None
+    while True:
+        if os.path.exists(cancel_marker_path(job_id)):
+            agent.cancelled = True
+        progress = agent_progress(agent)
+        if progress != last:
+            progress_queue.put((job_id, progress))
+            last = progress
+        if stop.wait(PROGRESS_INTERVAL):
+            return
+
+
+def job_metrics(agent, saved_files):
+    """What a finished job adds to /api/metrics, as plain data that can leave the worker process."""
+    return {
+        'github_requests': agent.http_stats['status_codes'],
+        'github_retries': agent.http_stats['retries'],
+        'rate_limit_remaining': agent.rate_limit_remaining,
+        'downloaded_bytes': agent.downloaded_bytes,
+        'files': {'rendered': agent.processed_files, 'failed': len(agent.failed_files),
+                  'skipped': len(agent.skipped_files)},
+        'phase_seconds': agent.phase_seconds,
+        'document_bytes': [os.path.getsize(saved['path']) for saved in saved_files if os.path.exists(saved['path'])]
+    }
+
+
+def process_job(job_id, url, token, extensions, output_dir, source_mode="api", max_workers=8,
+                highlight_theme=None, pinned_ref=None, git_ref="HEAD"):
+    """Background job processor. Runs in a job worker process and returns the job's final state."""
     print(f"[JOB {job_id}] Starting processing...")
     
     agent = GitHubFolderAgent(
         output_directory=output_dir,
         github_token=token,
-        job_id=job_id
+        job_id=job_id,
+        source_mode=source_mode,
+        max_workers=max_workers,
+        cache_dir=BLOB_CACHE_DIR,
+        cache_max_bytes=BLOB_CACHE_MAX_BYTES,
+        api_cache_dir=API_CACHE_DIR,
+        highlight_theme=highlight_theme,
+        git_ref=git_ref
     )
+    agent.pinned_ref = pinned_ref
+    agent.checkpoint_path = os.path.join(output_dir, '.checkpoint.json')
     
-    jobs[job_id]['agent'] = agent
+    stop = threading.Event()
+    reporter = threading.Thread(target=_report_progress, args=(job_id, agent, stop), daemon=True)
+    reporter.start()
+    result = {'status': 'error', 'files': [], 'failed_files': [], 'skipped_files': [], 'error': None}
     
     try:
         saved_files = agent.run(url, extensions)
-        jobs[job_id]['files'] = saved_files
+        result['files'] = saved_files
+        result['failed_files'] = [{'path': path, 'error': error} for path, error in agent.failed_files]
+        result['skipped_files'] = [{'path': path, 'reason': reason} for path, reason in agent.skipped_files]
         
         # Check if agent encountered an error
-        if agent.error:
-            jobs[job_id]['status'] = 'error'
-            jobs[job_id]['error'] = agent.error
+        if agent.status == 'cancelled':
+            agent.discard_documents()
+            result['status'] = 'cancelled'
+            result['error'] = agent.error
+            print(f"[JOB {job_id}] Cancelled")
+        elif agent.error and agent.stopped_by_rate_limit:
+            agent.discard_documents()
+            result['status'] = 'rate_limited'
+            result['error'] = agent.error
+            result['resume_at'] = agent.rate_limited_until
+            print(f"[JOB {job_id}] Rate limit exhausted")
+        elif agent.error:
+            agent.discard_documents()
+            result['error'] = agent.error
             print(f"[JOB {job_id}] Error: {agent.error}")
         elif len(saved_files) == 0:
-            jobs[job_id]['status'] = 'error'
-            jobs[job_id]['error'] = 'No documents were generated. Please check the URL and file extensions.'
+            result['error'] = 'No documents were generated. Please check the URL and file extensions.'
             print(f"[JOB {job_id}] No files generated")
         else:
-            jobs[job_id]['status'] = 'completed'
+            result['status'] = 'completed'
             print(f"[JOB {job_id}] Completed with {len(saved_files)} file(s)")
     except Exception as e:
-        jobs[job_id]['status'] = 'error'
-        jobs[job_id]['error'] = str(e)
+        agent.discard_documents()
+        result['error'] = str(e)
         print(f"[JOB {job_id}] Exception: {e}")
+    finally:
+        stop.set()
+        reporter.join()
+    
+    result['progress'] = agent_progress(agent)
+    result['metrics'] = job_metrics(agent, result['files'])
+    agent.release()
+    del agent
+    gc.collect()  # python-docx trees are full of reference cycles; free them before the worker idles
+    return result
+
+
+def get_job_pool():
+    """Starts the job worker processes, and the thread collecting their progress, on first use."""
+    global job_pool, progress_queue
+    with _job_pool_lock:
+        if job_pool is None:
+            # Forking a multi-threaded server is unsafe, so workers are spawned fresh
+            context = multiprocessing.get_context('spawn')
+            if progress_queue is None:
+                progress_queue = context.Queue()
+                threading.Thread(target=_collect_progress, daemon=True).start()
+            options = {'max_tasks_per_child': JOB_TASKS_PER_WORKER} if sys.version_info >= (3, 11) else {}
+            job_pool = ProcessPoolExecutor(max_workers=JOB_PROCESSES, mp_context=context,
+                                           initializer=_init_job_worker, initargs=(progress_queue,), **options)
+        return job_pool
+
+
+def notify_job_watchers():
+    """Wakes the event streams after a job's status, progress or queue position changed."""
+    global job_events_version
+    with job_events:
+        job_events_version += 1
+        job_events.notify_all()
+
+
+def submit_job(job_id, *args):
+    """Hands a job to the worker processes, replacing the pool if a worker has died."""
+    global job_pool
+    try:
+        future = get_job_pool().submit(process_job, job_id, *args)
+    except BrokenProcessPool:
+        with _job_pool_lock:
+            job_pool = None
+        future = get_job_pool().submit(process_job, job_id, *args)
+    future.add_done_callback(lambda done: finish_job(job_id, done))
+
+
+def client_key(token):
+    """Identifies who submitted a job: their GitHub token if given, else their IP address."""
+    if token:
+        return 'token:' + hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+    return 'ip:' + (request.remote_addr or 'unknown')
+
+
+def enqueue_job(job_id, client, args, admit=True):
+    """
+    Adds a job to its client's queue and starts it if a worker is free.
+    Returns None, or the Retry-After seconds when the queue is full
+    (never with admit=False, used for the jobs of a batch).
+    """
+    with _scheduler_lock:
+        queued = sum(len(queue) for queue in job_queues.values())
+        if admit and (queued >= MAX_QUEUED_JOBS or len(job_queues.get(client, ())) >= MAX_QUEUED_PER_CLIENT):
+            return queue_retry_after()
+        jobs[job_id]['args'] = args
+        jobs[job_id]['client'] = client
+        job_queues.setdefault(client, deque()).append(job_id)
+        dispatch_jobs()
+        notify_job_watchers()
+        return None
+
+
+def queue_retry_after(places=1):
+    """Seconds until roughly this many queue places have freed up, for Retry-After."""
+    # A place frees up roughly whenever one of the running jobs finishes
+    return max(1, math.ceil(average_job_seconds * places / JOB_PROCESSES))
+
+
+def dispatch_jobs():
+    """
+    Starts queued jobs, taking one from each client in turn, until every
+    worker is busy. Clients whose rate limit is used up are skipped until it resets.
+    """
+    with _scheduler_lock:
+        while job_queues and len(running_jobs) < JOB_PROCESSES:
+            client = next((client for client in job_queues if not rate_limit_exhausted(client)), None)
+            if client is None:
+                schedule_dispatch(min(client_rate_limits[client][1] for client in job_queues))
+                return
+            queue = job_queues[client]
+            job_id = queue.popleft()
+            if queue:
+                job_queues.move_to_end(client)
+            else:
+                del job_queues[client]
+            job = jobs[job_id]
+            job['status'] = 'processing'
+            job['started_at'] = time.time()
+            job.pop('finished_at', None)  # Of an earlier attempt, if the job was resumed
+            running_jobs.add(job_id)
+            submit_job(job_id, *job['args'])  # Kept in case the job has to be resumed
+            notify_job_watchers()
+
+
+def record_rate_limit(client, remaining, reset):
+    """Remembers the rate limit GitHub last reported for a client's requests."""
+    if remaining is not None:
+        client_rate_limits[client] = (remaining, reset)
+
+
+def rate_limit_exhausted(client):
+    """Whether a client has too few API requests left to start a job before the reset."""
+    remaining, reset = client_rate_limits.get(client, (None, 0))
+    return remaining is not None and remaining < RATE_LIMIT_RESERVE and reset > time.time()
+
+
+def schedule_dispatch(at):
+    """Runs dispatch_jobs again at a Unix time, when held jobs may start."""
+    global dispatch_timer
+    if dispatch_timer is not None and dispatch_timer.is_alive():
+        return
+    dispatch_timer = threading.Timer(max(0, at - time.time()) + 1, dispatch_jobs)
+    dispatch_timer.daemon = True
+    dispatch_timer.start()
+
+
+def queue_positions():
+    """1-based position of every waiting job, in the order dispatch_jobs will start them."""
+    with _scheduler_lock:
+        waiting = [list(queue) for queue in job_queues.values()]
+    positions = {}
+    for turn in range(max(map(len, waiting), default=0)):
+        for queue in waiting:
+            if turn < len(queue):
+                positions[queue[turn]] = len(positions) + 1
+    return positions
+
+
+def remove_queued_job(job_id):
+    """Takes a job out of its client's queue; returns False if it was not waiting."""
+    with _scheduler_lock:
+        client = jobs[job_id].get('client')
+        queue = job_queues.get(client)
+        if not queue or job_id not in queue:
+            return False
+        queue.remove(job_id)
+        if not queue:
+            del job_queues[client]
+        jobs[job_id].pop('args', None)
+        notify_job_watchers()
+        return True
+
+
+def schedule_resume(job_id, resume_at):
+    """
+    Puts a job that stopped part-way in the 'waiting' state and queues it again
+    at resume_at (a Unix time), to continue from its checkpoint. Returns False
+    once the job has been resumed JOB_RESUMES times, or if it is being cancelled.
+    """
+    job = jobs[job_id]
+    if job.get('resumes', 0) >= JOB_RESUMES or job.get('cancel_requested'):
+        return False
+    job['resumes'] = job.get('resumes', 0) + 1
+    job['status'] = 'waiting'
+    job['resume_at'] = resume_at
+    timer = threading.Timer(max(0, resume_at - time.time()), resume_job, args=(job_id,))
+    timer.daemon = True
+    timer.start()
+    print(f"[JOB {job_id}] Resuming at {datetime.datetime.fromtimestamp(resume_at):%H:%M:%S}")
+    return True
+
+
+def resume_job(job_id):
+    """Queues a waiting job again, unless it was cancelled or cleaned up meanwhile."""
+    with _scheduler_lock:
+        job = jobs.get(job_id)
+        if job is None or job['status'] != 'waiting':
+            return
+        job['status'] = 'queued'
+        job['error'] = None
+        job.pop('resume_at', None)
+        job_queues.setdefault(job['client'], deque()).append(job_id)
+        dispatch_jobs()
+    notify_job_watchers()
+
+
+def _collect_progress():
+    """Copies progress reports from the job workers into the jobs dict."""
+    while True:
+        job_id, progress = progress_queue.get()
+        if job_id is None:
+            with _job_pool_lock:
+                worker_pids.add(progress)  # A worker that just started
+            continue
+        job = jobs.get(job_id)
+        if job is None or job['status'] != 'processing':
+            continue  # Cleaned up, or a report that arrived after the final state
+        job['progress'] = progress
+        with _scheduler_lock:
+            record_rate_limit(job['client'], progress['http']['rate_limit_remaining'],
+                              progress['http']['rate_limit_reset'])
+        notify_job_watchers()
+
+
+def finish_job(job_id, future):
+    """Stores the final state returned by a job worker and starts the next queued job."""
+    global average_job_seconds
+    with _scheduler_lock:
+        running_jobs.discard(job_id)
+        job = jobs[job_id]
+        result_metrics = None
+        resume_at = None
+        try:
+            result = future.result()
+            result_metrics = result.pop('metrics', None)
+            resume_at = result.pop('resume_at', None)
+            job.update(result)
+        except Exception as e:  # The worker process died
+            job['status'] = 'error'
+            job['error'] = f"Conversion worker failed: {e}"
+            resume_at = time.time()
+            print(f"[JOB {job_id}] Worker failed: {e}")
+        job['last_used'] = job['finished_at'] = time.time()
+        duration = job['last_used'] - job['started_at']
+        average_job_seconds = 0.8 * average_job_seconds + 0.2 * duration
+        record_job_metrics(job['status'], duration, result_metrics)
+        if result_metrics:
+            job['phase_seconds'] = result_metrics['phase_seconds']
+            job['github_requests'] = sum(result_metrics['github_requests'].values())
+        if job.get('progress'):
+            http = job['progress']['http']
+            record_rate_limit(job['client'], http['rate_limit_remaining'], http['rate_limit_reset'])
+        if resume_at is not None and not schedule_resume(job_id, resume_at):
+            job['status'] = 'error'  # Rate limited too often; report GitHub's answer
+        if job['status'] != 'waiting':
+            job.pop('args', None)
+        if os.path.exists(cancel_marker_path(job_id)):
+            os.remove(cancel_marker_path(job_id))
+        if job.get('cleanup_requested'):
+            remove_job(job_id)
+    notify_job_watchers()
+    dispatch_jobs()
+
+
+def count_metric(name, amount=1, **labels):
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _metrics_lock:
+        metric_counters[key] = metric_counters.get(key, 0) + amount
+
+
+def observe_metric(name, value, buckets, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = metric_histograms.setdefault(key, [buckets, [0] * len(buckets), 0, 0])
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[1][i] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def record_github_requests(status_codes, rate_limit_remaining):
+    """Adds an agent's GitHub responses to the metrics."""
+    for status, count in status_codes.items():
+        count_metric('docx_github_requests_total', count, status=status)
+    if rate_limit_remaining is not None:
+        with _metrics_lock:
+            metric_gauges[('docx_github_rate_limit_remaining', ())] = rate_limit_remaining
+
+
+def record_job_metrics(status, duration, result_metrics):
+    """Adds a finished job to the metrics; result_metrics is None if its worker died."""
+    count_metric('docx_jobs_finished_total', status=status)
+    observe_metric('docx_job_duration_seconds', duration, SECONDS_BUCKETS)
+    if result_metrics is None:
+        return
+    record_github_requests(result_metrics['github_requests'], result_metrics['rate_limit_remaining'])
+    count_metric('docx_github_retries_total', result_metrics['github_retries'])
+    count_metric('docx_downloaded_bytes_total', result_metrics['downloaded_bytes'])
+    for outcome, count in result_metrics['files'].items():
+        count_metric('docx_files_total', count, outcome=outcome)
+    for phase, seconds in result_metrics['phase_seconds'].items():
+        observe_metric('docx_phase_seconds', seconds, SECONDS_BUCKETS, phase=phase)
+    for size in result_metrics['document_bytes']:
+        observe_metric('docx_document_bytes', size, BYTES_BUCKETS)
+
+
+def _metric_line(name, labels, value):
+    label_text = ','.join(f'{label}="{value}"' for label, value in labels)
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    with _scheduler_lock:
+        jobs_by_status = {}
+        for job in jobs.values():
+            jobs_by_status[job['status']] = jobs_by_status.get(job['status'], 0) + 1
+        queued = sum(len(queue) for queue in job_queues.values())
+    with _metrics_lock:
+        samples = dict(metric_counters)
+        samples.update(metric_gauges)
+        samples.update({('docx_jobs', (('status', status),)): count for status, count in jobs_by_status.items()})
+        samples[('docx_queue_depth', ())] = queued
+        histograms = {key: (buckets, list(counts), total, n)
+                      for key, (buckets, counts, total, n) in metric_histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != 'histogram':
+            for (metric, labels), value in sorted(samples.items()):
+                if metric == name:
+                    lines.append(_metric_line(name, labels, value))
+            continue
+        for (metric, labels), (buckets, counts, total, n) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, counts):
+                lines.append(_metric_line(f"{name}_bucket", labels + (('le', str(bound)),), count))
+            lines.append(_metric_line(f"{name}_bucket", labels + (('le', '+Inf'),), n))
+            lines.append(_metric_line(f"{name}_sum", labels, round(total, 6)))
+            lines.append(_metric_line(f"{name}_count", labels, n))
+    return '\n'.join(lines) + '\n'
+
+
+def remove_job(job_id):
+    """Deletes a finished job and its files."""
+    job = jobs.pop(job_id)
+    output_dir = job.get('output_dir')
+    if output_dir and os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    for request_id in job.get('requests', ()):
+        job_requests.pop(request_id, None)
+    if results.get(job.get('result_key')) == job_id:
+        del results[job['result_key']]
+
+
+def directory_bytes(path):
+    """Total size of the files under a folder."""
+    total = 0
+    for folder, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass  # Deleted meanwhile
+    return total
+
+
+def sweep_outputs():
+    """
+    Deletes finished jobs unused for OUTPUT_TTL seconds, then the least
+    recently used ones until the job folders fit in OUTPUT_MAX_BYTES, and
+    folders in OUTPUT_DIR no job owns (e.g. left over from a restart).
+    Folders are measured without holding the scheduler lock.
+    """
+    now = time.time()
+    with _scheduler_lock:
+        finished = {job_id: job['last_used'] for job_id, job in jobs.items()
+                    if job['status'] in ('completed', 'error', 'cancelled')}
+        owned = {os.path.basename(job['output_dir']) for job in jobs.values()}
+
+    sizes, orphans = {}, []
+    if os.path.isdir(OUTPUT_DIR):
+        for entry in os.scandir(OUTPUT_DIR):
+            if not entry.is_dir():
+                continue
+            if entry.name in owned:
+                sizes[entry.name] = directory_bytes(entry.path)
+            elif now - entry.stat().st_mtime > JANITOR_INTERVAL:  # Not a job being created right now
+                orphans.append((entry.path, directory_bytes(entry.path)))
+
+    total = sum(sizes.values())
+    expired = set()
+    for job_id, last_used in sorted(finished.items(), key=lambda item: item[1]):
+        if now - last_used > OUTPUT_TTL or total > OUTPUT_MAX_BYTES:
+            expired.add(job_id)
+            total -= sizes.get(job_id, 0)
+
+    removed = []
+    with _scheduler_lock:
+        for job_id in expired:
+            job = jobs.get(job_id)
+            if job is None or job['last_used'] != finished[job_id]:
+                continue  # Cleaned up or used again meanwhile
+            remove_job(job_id)
+            removed.append(job_id)
+            print(f"[JANITOR] Removed job {job_id}")
+        for batch_id in [batch_id for batch_id, batch in batches.items()
+                         if not any(item['job_id'] in job_requests for item in batch['repos'])]:
+            del batches[batch_id]  # Every job of the batch is gone
+    if removed:
+        notify_job_watchers()
+    for path, _ in orphans:
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"[JANITOR] Removed unowned folder {path}")
+
+    removed_bytes = sum(sizes.get(job_id, 0) for job_id in removed)
+    janitor_stats['last_sweep'] = now
+    janitor_stats['output_bytes'] = sum(sizes.values()) - removed_bytes
+    janitor_stats['jobs_removed'] += len(removed)
+    janitor_stats['bytes_freed'] += removed_bytes + sum(size for _, size in orphans)
+
+
+def start_janitor():
+    """Starts the janitor thread, once per server process."""
+    global janitor_thread
+    with _job_pool_lock:
+        if janitor_thread is None:
+            janitor_thread = threading.Thread(target=_run_janitor, daemon=True)
+            janitor_thread.start()
+
+
+@app.before_request
+def _start_janitor_with_server():
+    # Under a WSGI server there is no startup hook; the first request of any kind, e.g. a health check, starts it
+    if janitor_thread is None:
+        start_janitor()
+
+
+def _run_janitor():
+    while True:
+        try:
+            sweep_outputs()
+        except Exception as e:
+            print(f"[JANITOR] Sweep failed: {e}")
+        time.sleep(JANITOR_INTERVAL)
+
+
+def process_rss_bytes(pid='self'):
+    """Resident memory of a process, or None where /proc is not available."""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def allowed_local_path(path):
+    """True if a local source path lies inside one of LOCAL_SOURCE_ROOTS."""
+    path = os.path.realpath(path)
+    for root in LOCAL_SOURCE_ROOTS:
+        root = os.path.realpath(root)
+        if os.path.commonpath([path, root]) == root:
+            return True
+    return False
+
+
+def result_key(repo_info, commit_sha, extensions, highlight_theme, token):
+    """Identifies the documents a conversion produces, so identical requests can share them."""
+    key = {
+        'repo': f"{repo_info['owner']}/{repo_info['repo']}".lower(),
+        'commit': commit_sha,
+        'subpath': repo_info['subpath'].strip('/'),
+        'extensions': sorted(set(extensions)),
+        'highlight': highlight_theme,
+        # Documents from a private repository are only shared with the same token
+        'client': client_key(token) if token else None
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def shared_job(key):
+    """The job already producing, or holding, the documents for a result key, if any."""
+    job = jobs.get(results.get(key))
+    if job is None:
+        return None
+    if job['status'] in ('queued', 'processing', 'waiting') and not job.get('cancel_requested'):
+        return job['id']
+    if job['status'] == 'completed' and os.path.isdir(job['output_dir']):
+        return job['id']
+    return None
+
+
+class ZipStream:
+    """Write-only file object that collects what zipfile writes until the response takes it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        # No seek(), so zipfile writes sizes after each member instead of going back
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(members):
+    """Yields a stored zip of (path on disk, name in zip) pairs, one chunk at a time."""
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for path, name in members:
+            with open(path, 'rb') as source, archive.open(zipfile.ZipInfo.from_file(path, name), 'w') as target:
+                while chunk := source.read(BUNDLE_CHUNK_BYTES):
+                    target.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()  # Central directory
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
-    return jsonify({'status': 'healthy', 'message': 'GitHub to DOCX API is running'})
+    """Health check endpoint, with the server's memory and the disk used by job files."""
+    with _job_pool_lock:
+        pids = sorted(worker_pids)
+    rss = {pid: process_rss_bytes(pid) for pid in pids}
+    if os.path.isdir('/proc'):
+        with _job_pool_lock:
+            worker_pids.difference_update(pid for pid, value in rss.items() if value is None)  # Replaced workers
+    workers = [value for value in rss.values() if value is not None]
+    return jsonify({
+        'status': 'healthy',
+        'message': 'GitHub to DOCX API is running',
+        'memory': {
+            'server_rss_bytes': process_rss_bytes(),
+            'worker_rss_bytes': sum(workers) if workers else None,
+            'workers': len(workers),
+            'jobs': len(jobs)
+        },
+        'disk': dict(janitor_stats, output_max_bytes=OUTPUT_MAX_BYTES, output_ttl_seconds=OUTPUT_TTL)
+    })
 
 
-@app.route('/api/convert', methods=['POST'])
-def start_conversion():
-    """Start a new conversion job."""
-    data = request.json
-    
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Counters, gauges and histograms for Prometheus to scrape."""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ConversionRejected(Exception):
+    """A conversion request that cannot be accepted, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def prepare_conversion(data, client, resolve=True):
+    """
+    Validates a conversion request and, unless resolve is False, pins its
+    branch to a commit (see pin_conversion). Returns the job's settings, or
+    raises ConversionRejected.
+    """
     url = data.get('url', '')
     token = data.get('token', None)
     extensions = data.get('extensions', ['.cpp', '.h', '.hpp', '.py', '.js'])
+    source_mode = data.get('source', 'api')
+    concurrency = data.get('concurrency', 8)
+    highlight = data.get('highlight', None)
+    git_ref = data.get('ref', 'HEAD')
     
     if not url:
-        return jsonify({'error': 'GitHub URL is required'}), 400
+        raise ConversionRejected('GitHub URL is required')
+    
+    if source_mode not in ('api', 'graphql', 'archive', 'local', 'git'):
+        raise ConversionRejected("Source must be 'api', 'graphql', 'archive', 'local' or 'git'")
+    
+    if source_mode == 'graphql' and not token:
+        raise ConversionRejected("The 'graphql' source needs a GitHub token")
     
+    if not isinstance(concurrency, int) or not 1 <= concurrency <= 32:
+        raise ConversionRejected('Concurrency must be an integer between 1 and 32')
+    
+    if highlight:
+        if get_style_by_name is None:
+            raise ConversionRejected('Syntax highlighting is not available on this server')
+        try:
+            get_style_by_name(highlight)
+        except ClassNotFound:
+            raise ConversionRejected(f"Unknown highlight theme '{highlight}'")
+    
+    local_source = source_mode in ('local', 'git')
+    if local_source:
+        # url is a folder on this server
+        if not allowed_local_path(url):
+            raise ConversionRejected('This folder is not available for conversion', 403)
     # Validate URL format
-    if 'github.com' not in url:
-        return jsonify({'error': 'Please provide a valid GitHub URL'}), 400
+    elif 'github.com' not in url:
+        raise ConversionRejected('Please provide a valid GitHub URL')
     
-    job_id = str(uuid.uuid4())
-    output_dir = os.path.join('output', job_id)
-    os.makedirs(output_dir, exist_ok=True)
+    repo_info = None
+    if not local_source:
+        try:
+            repo_info = BaseAgent().parse_repo_url(url)
+        except ValueError:
+            pass
     
-    jobs[job_id] = {
-        'id': job_id,
-        'status': 'queued',
-        'url': url,
-        'files': [],
-        'error': None,
-        'output_dir': output_dir,
-        'created_at': datetime.datetime.now().isoformat()
-    }
+    conversion = {'url': url, 'key': None, 'client': client, 'repo_info': repo_info,
+                  'args': (url, token, extensions, source_mode, concurrency, highlight, None, git_ref)}
+    if resolve:
+        pin_conversion(conversion)
+    return conversion
+
+
+def pin_conversion(conversion):
+    """
+    Pins a prepared conversion's branch to a commit, so identical requests can
+    share one job and its files. /api/convert waits for this, so it gets one
+    short try: no retries, no waiting on rate limits. If it fails, the job runs
+    unshared and reports any error itself.
+    """
+    repo_info, client = conversion['repo_info'], conversion['client']
+    if not repo_info or rate_limit_exhausted(client):
+        return
+    url, token, extensions, source_mode, concurrency, highlight, _, git_ref = conversion['args']
+    resolver = BaseAgent(github_token=token, api_cache_dir=API_CACHE_DIR)
+    resolver.api_base = GITHUB_API
+    resolver.max_retries = 0
+    resolver.max_rate_limit_wait = 0
+    resolver.request_timeout = RESOLVE_TIMEOUT
+    try:
+        commit_sha, tree_sha = resolver.resolve_ref(repo_info['owner'], repo_info['repo'], repo_info['ref'])
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        commit_sha, tree_sha = None, None
+    finally:
+        resolver.close_session()
+    record_github_requests(resolver.http_stats['status_codes'], resolver.rate_limit_remaining)
+    with _scheduler_lock:
+        record_rate_limit(client, resolver.rate_limit_remaining, resolver.rate_limit_reset)
+    if commit_sha:
+        conversion['key'] = result_key(repo_info, commit_sha, extensions, highlight, token)
+        conversion['args'] = (url, token, extensions, source_mode, concurrency, highlight,
+                              (commit_sha, tree_sha), git_ref)
+
+
+def job_args(conversion, output_dir):
+    """The process_job arguments of a conversion, after the job id."""
+    url, token, extensions, *options = conversion['args']
+    return (url, token, extensions, output_dir, *options)
+
+
+def queue_conversion(conversion, admit=True):
+    """
+    Starts a job for a prepared conversion, or joins the job already producing
+    its documents. Returns the response body, the HTTP status and Retry-After
+    (None unless the queue is full). admit=False skips the queue limits.
+    """
+    key = conversion['key']
+    request_id = str(uuid.uuid4())
+    with _scheduler_lock:
+        job_id = shared_job(key) if key else None
+        if job_id:
+            job = jobs[job_id]
+            job['requests'].add(request_id)
+            job['last_used'] = time.time()
+            job_requests[request_id] = {'job': job_id, 'cancelled': False}
+            print(f"[JOB {job_id}] Shared with request {request_id}")
+            count_metric('docx_conversion_requests_total', outcome='shared')
+            return {'job_id': request_id, 'status': job['status'],
+                    'queue_position': queue_positions().get(job_id)}, 200, None
+        
+        # The first request's id doubles as the job id
+        job_id = request_id
+        output_dir = os.path.join(OUTPUT_DIR, job_id)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        jobs[job_id] = {
+            'id': job_id,
+            'status': 'queued',
+            'url': conversion['url'],
+            'files': [],
+            'error': None,
+            'output_dir': output_dir,
+            'result_key': key,
+            'requests': {request_id},
+            'created_at': datetime.datetime.now().isoformat(),
+            'queued_at': time.time(),
+            'last_used': time.time()  # For the janitor
+        }
+        job_requests[request_id] = {'job': job_id, 'cancelled': False}
+        
+        # Queue the job; it starts in a worker process when one is free
+        retry_after = enqueue_job(job_id, conversion['client'], job_args(conversion, output_dir), admit)
+        if retry_after is not None:
+            del jobs[job_id]
+            del job_requests[request_id]
+            shutil.rmtree(output_dir, ignore_errors=True)
+            count_metric('docx_conversion_requests_total', outcome='rejected')
+            return {'error': 'Too many conversions are waiting. Please try again shortly.'}, 429, retry_after
+        if key:
+            results[key] = job_id
+        count_metric('docx_conversion_requests_total', outcome='started')
+        
+        job = jobs[job_id]
+        return {'job_id': request_id, 'status': job['status'],
+                'queue_position': queue_positions().get(job_id)}, 200, None
+
+
+@app.route('/api/convert', methods=['POST'])
+def start_conversion():
+    """Start a new conversion job."""
+    data = request.json
+    try:
+        conversion = prepare_conversion(data, client_key(data.get('token')))
+    except ConversionRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    body, status, retry_after = queue_conversion(conversion)
+    response = jsonify(body)
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+
+@app.route('/api/convert/batch', methods=['POST'])
+def start_batch():
+    """
+    Start conversions of many repositories at once. Each entry of "repos" is a
+    URL, or an object with the fields of /api/convert; the other fields are
+    defaults for every entry. The jobs share the workers, the caches and
+    their client's rate limit with all other jobs.
+    """
+    data = request.json or {}
+    repos = data.get('repos')
+    if not isinstance(repos, list) or not repos:
+        return jsonify({'error': "'repos' must be a non-empty list"}), 400
+    if len(repos) > MAX_BATCH_REPOS:
+        return jsonify({'error': f'A batch can hold at most {MAX_BATCH_REPOS} repositories'}), 400
+    defaults = {field: value for field, value in data.items() if field != 'repos'}
+    entries = [dict(defaults, **(repo if isinstance(repo, dict) else {'url': repo})) for repo in repos]
+    clients = [client_key(entry.get('token')) for entry in entries]
+    prepared = []
+    for entry, client in zip(entries, clients):
+        try:
+            prepared.append(prepare_conversion(entry, client, resolve=False))
+        except ConversionRejected as e:
+            prepared.append(e)
+    conversions = [conversion for conversion in prepared if not isinstance(conversion, ConversionRejected)]
     
-    # Start processing in background thread
-    thread = threading.Thread(
-        target=process_job,
-        args=(job_id, url, token, extensions, output_dir)
-    )
-    thread.start()
+    with _scheduler_lock:
+        # The whole batch is admitted or none of it: count the places it lacks
+        missing = sum(len(queue) for queue in job_queues.values()) + len(conversions) - MAX_QUEUED_JOBS
+        for client in set(clients):
+            added = sum(1 for conversion in conversions if conversion['client'] == client)
+            missing = max(missing, len(job_queues.get(client, ())) + added - MAX_BATCH_QUEUED_PER_CLIENT)
+        if missing > 0:
+            count_metric('docx_conversion_requests_total', len(conversions), outcome='rejected')
+            response = jsonify({'error': 'Too many conversions are waiting. Please try again shortly.'})
+            response.headers['Retry-After'] = str(queue_retry_after(missing))
+            return response, 429
+        
+        # Queued unpinned in the order they were listed; pin_batch_jobs resolves their branches
+        items, pending = [], []
+        for entry, conversion in zip(entries, prepared):
+            if isinstance(conversion, ConversionRejected):
+                items.append({'url': entry.get('url'), 'job_id': None, 'error': str(conversion)})
+                continue
+            body, _, _ = queue_conversion(conversion, admit=False)
+            items.append({'url': entry.get('url'), 'job_id': body['job_id'], 'error': None})
+            pending.append((body['job_id'], conversion))
+        batch_id = str(uuid.uuid4())
+        batches[batch_id] = {'created_at': time.time(), 'repos': items}
+        summary = batch_summary(batch_id)
     
-    return jsonify({'job_id': job_id, 'status': 'queued'})
+    threading.Thread(target=pin_batch_jobs, args=(pending,), daemon=True).start()
+    print(f"[BATCH {batch_id}] {len(pending)} of {len(items)} repositories queued")
+    return jsonify(summary)
 
 
-@app.route('/api/status/<job_id>', methods=['GET'])
-def get_status(job_id):
-    """Get the status of a conversion job."""
-    if job_id not in jobs:
-        return jsonify({'error': 'Job not found'}), 404
+def pin_batch_jobs(pending):
+    """
+    Pins the branches of a batch's jobs after they were queued, BATCH_RESOLVE_WORKERS
+    at a time (each costs a GitHub round trip), and folds a job into an
+    identical one that is already queued, running or done.
+    """
+    def pin(job_id, conversion):
+        pin_conversion(conversion)
+        if conversion['key']:
+            attach_pinned_job(job_id, conversion)
     
-    job = jobs[job_id]
-    agent = job.get('agent')
+    with ThreadPoolExecutor(max_workers=BATCH_RESOLVE_WORKERS) as executor:
+        for future in [executor.submit(pin, job_id, conversion) for job_id, conversion in pending]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[BATCH] Could not pin a job: {e}")
+
+
+def attach_pinned_job(job_id, conversion):
+    """
+    Gives a queued job the commit its branch was pinned to, or hands its
+    requests to the job already producing the same documents. A job that
+    has started meanwhile resolves its branch itself and is left alone.
+    """
+    key = conversion['key']
+    with _scheduler_lock:
+        job = jobs.get(job_id)
+        if job is None or job_id not in job_queues.get(job.get('client'), ()):
+            return
+        shared_id = shared_job(key)
+        if shared_id is None:
+            job['args'] = job_args(conversion, job['output_dir'])
+            job['result_key'] = key
+            results[key] = job_id
+            return
+        remove_queued_job(job_id)
+        del jobs[job_id]
+        shutil.rmtree(job['output_dir'], ignore_errors=True)
+        shared = jobs[shared_id]
+        for request_id in job['requests']:
+            shared['requests'].add(request_id)
+            job_requests[request_id]['job'] = shared_id
+            print(f"[JOB {shared_id}] Shared with request {request_id}")
+        shared['last_used'] = time.time()
+    notify_job_watchers()
+
+
+def batch_summary(batch_id):
+    """Per-repository status and timings of a batch, as returned by /api/batch."""
+    batch = batches[batch_id]
+    now = time.time()
+    repos, counts, finished_at = [], {}, batch['created_at']
+    for item in batch['repos']:
+        status = job_status(item['job_id']) if item['job_id'] else None
+        job = jobs.get(job_requests[item['job_id']]['job']) if status else None
+        repo = {'url': item['url'], 'job_id': item['job_id'],
+                'status': status['status'] if status else ('rejected' if item['error'] else 'removed'),
+                'error': status['error'] if status else item['error']}
+        if job:
+            started, finished = job.get('started_at'), job.get('finished_at')
+            repo['files'] = len(job.get('files', []))
+            repo['failed_files'] = len(job.get('failed_files', []))
+            repo['queued_seconds'] = round((started or now) - job['queued_at'], 3)
+            repo['run_seconds'] = round((finished or now) - started, 3) if started else None
+            repo['phase_seconds'] = job.get('phase_seconds')
+            repo['github_requests'] = job.get('github_requests')
+            if finished:
+                finished_at = max(finished_at, finished)
+        repos.append(repo)
+        counts[repo['status']] = counts.get(repo['status'], 0) + 1
+    done = all(repo['status'] not in ('queued', 'processing', 'waiting') for repo in repos)
+    return {'batch_id': batch_id, 'counts': counts, 'done': done,
+            'elapsed_seconds': round((finished_at if done else now) - batch['created_at'], 3), 'repos': repos}
+
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Get the status and timings of every repository in a batch."""
+    with _scheduler_lock:
+        if batch_id not in batches:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(batch_summary(batch_id))
+
+
+def job_status(request_id):
+    """Status of a request's job as returned by /api/status, or None if it no longer exists."""
+    job_request = job_requests.get(request_id)
+    job = jobs.get(job_request['job']) if job_request else None
+    if job is None:
+        return None
     
+    job_id = job['id']
     response = {
-        'id': job_id,
+        'id': request_id,
         'status': job['status'],
         'files': job.get('files', []),
-        'error': job.get('error')
+        'failed_files': job.get('failed_files', []),
+        'skipped_files': job.get('skipped_files', []),
+        'error': job.get('error'),
+        'queue_position': queue_positions().get(job_id)
     }
     
-    if agent:
-        response['progress'] = {
-            'processed': agent.processed_files,
-            'total': agent.total_files,
-            'current_file': agent.current_file,
-            'detail_status': agent.status
-        }
+    if job.get('progress'):
+        response['progress'] = job['progress']
+    if job['status'] == 'waiting':
+        response['resume_at'] = job['resume_at']
+    
+    if job_request['cancelled']:
+        # Only this request was cancelled; the job goes on for the others sharing it
+        response['status'] = 'cancelled'
+        response['error'] = 'Conversion was cancelled'
+        response['queue_position'] = None
+    
+    return response
+
+
+def status_delta(previous, current):
+    """Fields of current that differ from previous; progress is compared field by field."""
+    delta = {key: value for key, value in current.items() if previous.get(key) != value}
+    if 'progress' in delta and previous.get('progress'):
+        delta['progress'] = {key: value for key, value in current['progress'].items()
+                             if previous['progress'].get(key) != value}
+    return delta
+
+
+@app.route('/api/status/<job_id>', methods=['GET'])
+def get_status(job_id):
+    """Get the status of a conversion job."""
+    response = job_status(job_id)
+    if response is None:
+        return jsonify({'error': 'Job not found'}), 404
     
     return jsonify(response)
 
 
+@app.route('/api/events/<job_id>', methods=['GET'])
+def stream_status(job_id):
+    """
+    Pushes a job's status as Server-Sent Events until it finishes. The first
+    event is the full status; later ones carry only the fields that changed.
+    """
+    if job_status(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        sent = {}
+        while True:
+            seen_version = job_events_version
+            current = job_status(job_id)
+            if current is None:
+                return  # Cleaned up meanwhile
+            delta = status_delta(sent, current) if sent else current
+            if delta:
+                yield f"data: {json.dumps(delta)}\n\n"
+                sent = current
+            if current['status'] in ('completed', 'error', 'cancelled'):
+                return
+            with job_events:
+                changed = job_events.wait_for(lambda: job_events_version != seen_version, SSE_KEEPALIVE)
+            if not changed:
+                yield ": keep-alive\n\n"
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/download/<job_id>/<filename>', methods=['GET'])
 def download_file(job_id, filename):
     """Download a generated DOCX file."""
-    if job_id not in jobs:
+    job_request = job_requests.get(job_id)
+    if job_request is None or job_request['job'] not in jobs:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = jobs[job_id]
+    job = jobs[job_request['job']]
+    job['last_used'] = time.time()
     file_path = os.path.join(job['output_dir'], filename)
     
     if not os.path.exists(file_path):
         return jsonify({'error': 'File not found'}), 404
     
+    # conditional=True answers Range and If-Range requests, so interrupted downloads can resume
     return send_file(
         file_path,
         as_attachment=True,
         download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        conditional=True
     )
 
 
-@app.route('/api/cleanup/<job_id>', methods=['DELETE'])
-def cleanup_job(job_id):
-    """Clean up a completed job and its files."""
-    if job_id not in jobs:
+@app.route('/api/bundle/<job_id>', methods=['GET'])
+def download_bundle(job_id):
+    """Download all generated DOCX files of a job as one zip, built while it is sent."""
+    job_request = job_requests.get(job_id)
+    if job_request is None or job_request['job'] not in jobs:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = jobs[job_id]
-    output_dir = job.get('output_dir')
+    job = jobs[job_request['job']]
+    if job['status'] != 'completed':
+        return jsonify({'error': 'Job has not completed'}), 409
+    job['last_used'] = time.time()
     
-    if output_dir and os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
+    members = []
+    for saved in job.get('files', []):
+        path = os.path.join(job['output_dir'], saved['filename'])
+        if not os.path.exists(path):
+            return jsonify({'error': 'File not found'}), 404
+        members.append((path, saved['filename']))
     
-    del jobs[job_id]
+    repo_name = secure_filename(urlparse(job['url']).path.strip('/').split('/')[-1]) or 'documents'
+    return Response(stream_zip(members), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{repo_name}.zip"'})
+
+
+@app.route('/api/cancel/<job_id>', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    request_id = job_id
+    with _scheduler_lock:
+        job_request = job_requests.get(request_id)
+        if job_request is None or job_request['job'] not in jobs:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        job_id = job_request['job']
+        job = jobs[job_id]
+        if job_request['cancelled'] or job['status'] not in ('queued', 'processing', 'waiting'):
+            return jsonify({'error': f"Job is already {job_status(request_id)['status']}"}), 409
+        
+        sharing = [other for other in job['requests']
+                   if other != request_id and not job_requests[other]['cancelled']]
+        if sharing:
+            # Other requests still want these documents, so only this one stops following the job
+            job_request['cancelled'] = True
+            notify_job_watchers()
+        elif remove_queued_job(job_id) or job['status'] == 'waiting':
+            job['status'] = 'cancelled'
+            job['error'] = 'Conversion was cancelled'
+            job.pop('args', None)
+            notify_job_watchers()
+        else:
+            # The worker notices the marker within PROGRESS_INTERVAL and stops at the next file
+            job['cancel_requested'] = True
+            open(cancel_marker_path(job_id), 'w').close()
+        
+        return jsonify({'id': request_id, 'status': job_status(request_id)['status']})
+
+
+@app.route('/api/cleanup/<job_id>', methods=['DELETE'])
+def cleanup_job(job_id):
+    """Clean up a completed job and its files."""
+    request_id = job_id
+    with _scheduler_lock:
+        job_request = job_requests.pop(request_id, None)
+        if job_request is None or job_request['job'] not in jobs:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        job_id = job_request['job']
+        job = jobs[job_id]
+        job['requests'].discard(request_id)
+        if job['requests']:
+            # The files stay until the last request sharing them is cleaned up
+            notify_job_watchers()
+            return jsonify({'message': 'Job cleaned up successfully'})
+        
+        remove_queued_job(job_id)
+        if job['status'] == 'processing':
+            # Stop the worker first; its files are removed once it has finished
+            job['cleanup_requested'] = True
+            job['cancel_requested'] = True
+            open(cancel_marker_path(job_id), 'w').close()
+            return jsonify({'message': 'Job cancelled; its files will be removed when it stops'})
+        remove_job(job_id)
     
     return jsonify({'message': 'Job cleaned up successfully'})
 
@@ -506,4 +1503,6 @@ if __name__ == '__main__':
     print("=" * 40)
     print("Server running at http://localhost:5000")
     print("=" * 40)
+    if is_running_from_reloader():
+        start_janitor()  # In the serving process, not the debug reloader watching it
     app.run(debug=True, port=5000)
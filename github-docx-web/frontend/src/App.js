@@ -18,31 +18,71 @@ function App() {
   const [error, setError] = useState(null);
   const [results, setResults] = useState(null);
 
-  // Poll for job status
+  // Follow job status: pushed over Server-Sent Events, with polling as a fallback
   useEffect(() => {
     if (!jobId) return;
 
+    let current = null;
+    let finished = false;
+    let source = null;
+    let interval = null;
+
+    const applyStatus = (data) => {
+      current = data;
+      setStatus(data);
+
+      if (data.status === 'completed') {
+        finished = true;
+        setResults(data.files);
+        setIsLoading(false);
+      } else if (data.status === 'error' || data.status === 'cancelled') {
+        finished = true;
+        setError(data.error);
+        setIsLoading(false);
+      }
+    };
+
     const pollStatus = async () => {
       try {
         const response = await fetch(`${API_BASE}/status/${jobId}`);
         const data = await response.json();
-        setStatus(data);
-
-        if (data.status === 'completed') {
-          setResults(data.files);
-          setIsLoading(false);
-        } else if (data.status === 'error') {
-          setError(data.error);
-          setIsLoading(false);
-        }
+        applyStatus(data);
+        if (finished) clearInterval(interval);
       } catch (err) {
         setError('Failed to fetch status');
         setIsLoading(false);
+        clearInterval(interval);
       }
     };
 
-    const interval = setInterval(pollStatus, 1000);
-    return () => clearInterval(interval);
+    const startPolling = () => {
+      interval = setInterval(pollStatus, 1000);
+    };
+
+    if (window.EventSource) {
+      source = new EventSource(`${API_BASE}/events/${jobId}`);
+      // Each event only carries the fields that changed since the previous one
+      source.onmessage = (event) => {
+        const delta = JSON.parse(event.data);
+        applyStatus({
+          ...current,
+          ...delta,
+          progress: delta.progress ? { ...current?.progress, ...delta.progress } : current?.progress
+        });
+        if (finished) source.close();
+      };
+      source.onerror = () => {
+        source.close();
+        if (!finished) startPolling();
+      };
+    } else {
+      startPolling();
+    }
+
+    return () => {
+      if (source) source.close();
+      clearInterval(interval);
+    };
   }, [jobId]);
 
   const handleConvert = useCallback(async (formData) => {
@@ -71,10 +111,22 @@ function App() {
     }
   }, []);
 
+  const handleCancel = useCallback(async () => {
+    try {
+      await fetch(`${API_BASE}/cancel/${jobId}`, { method: 'POST' });
+    } catch (err) {
+      setError('Failed to cancel conversion');
+    }
+  }, [jobId]);
+
   const handleDownload = useCallback((filename) => {
     window.open(`${API_BASE}/download/${jobId}/${filename}`, '_blank');
   }, [jobId]);
 
+  const handleDownloadAll = useCallback(() => {
+    window.open(`${API_BASE}/bundle/${jobId}`, '_blank');
+  }, [jobId]);
+
   const handleReset = useCallback(() => {
     setJobId(null);
     setStatus(null);
@@ -120,7 +172,7 @@ function App() {
                 exit={{ opacity: 0, scale: 0.95 }}
                 transition={{ duration: 0.3 }}
               >
-                <ProgressPanel status={status} />
+                <ProgressPanel status={status} onCancel={handleCancel} />
               </motion.div>
             )}
 
@@ -135,6 +187,7 @@ function App() {
                 <ResultsPanel
                   files={results}
                   onDownload={handleDownload}
+                  onDownloadAll={handleDownloadAll}
                   onReset={handleReset}
                 />
               </motion.div>
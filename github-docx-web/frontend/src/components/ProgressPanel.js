@@ -1,9 +1,9 @@
 import React from 'react';
 import { motion } from 'framer-motion';
-import { Loader2, FileSearch, Save, Code } from 'lucide-react';
+import { Loader2, FileSearch, Save, Code, X } from 'lucide-react';
 import './ProgressPanel.css';
 
-const ProgressPanel = ({ status }) => {
+const ProgressPanel = ({ status, onCancel }) => {
   const progress = status?.progress || {};
   const percentage = progress.total > 0 
     ? Math.round((progress.processed / progress.total) * 100) 
@@ -21,12 +21,24 @@ const ProgressPanel = ({ status }) => {
   };
 
   const getStatusText = () => {
+    if (status?.status === 'queued') {
+      return status.queue_position
+        ? `Waiting in queue (position ${status.queue_position})...`
+        : 'Waiting in queue...';
+    }
+    if (status?.status === 'waiting') {
+      return status.resume_at
+        ? `GitHub rate limit reached, continuing at ${new Date(status.resume_at * 1000).toLocaleTimeString()}...`
+        : 'Interrupted, continuing shortly...';
+    }
     const detail = progress.detail_status || status?.status;
     switch (detail) {
       case 'parsing_url':
         return 'Parsing GitHub URL...';
       case 'counting_files':
         return 'Counting files to process...';
+      case 'downloading_archive':
+        return 'Downloading repository archive...';
       case 'processing':
         return 'Processing files...';
       case 'saving':
@@ -83,6 +95,18 @@ const ProgressPanel = ({ status }) => {
           <div className="loading-dot" style={{ animationDelay: '0.2s' }} />
           <div className="loading-dot" style={{ animationDelay: '0.4s' }} />
         </div>
+
+        {onCancel && (
+          <motion.button
+            className="cancel-btn"
+            onClick={onCancel}
+            whileHover={{ scale: 1.02 }}
+            whileTap={{ scale: 0.98 }}
+          >
+            <X size={18} />
+            <span>Cancel</span>
+          </motion.button>
+        )}
       </motion.div>
     </div>
   );
@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import { CheckCircle, Download, RefreshCw, FolderOpen, FileText } from 'lucide-react';
 import './ResultsPanel.css';
 
-const ResultsPanel = ({ files, onDownload, onReset }) => {
+const ResultsPanel = ({ files, onDownload, onDownloadAll, onReset }) => {
   return (
     <div className="results-panel-wrapper">
       <motion.div
@@ -58,7 +58,7 @@ const ResultsPanel = ({ files, onDownload, onReset }) => {
             className="download-all-btn"
             whileHover={{ scale: 1.02 }}
             whileTap={{ scale: 0.98 }}
-            onClick={() => files.forEach(f => onDownload(f.filename))}
+            onClick={onDownloadAll}
           >
             <Download size={20} />
             <span>Download All</span>
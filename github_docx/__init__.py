@@ -0,0 +1,13 @@
+"""
+Converts code in a GitHub folder (or a local folder or git repository) into
+formatted Word documents.
+
+    github_docx.single     one document for the whole folder
+    github_docx.by_folder  one document per subfolder
+    github_docx.cli        the github-docx command
+
+Importing the package itself is cheap; python-docx, lxml and requests are
+only loaded by the modules that need them.
+"""
+
+__version__ = "1.0.0"
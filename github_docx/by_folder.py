@@ -0,0 +1,511 @@
+"""
+Converts a GitHub folder (or a local folder or git repository) into one Word
+document per subfolder, written to an output directory. Folder documents can
+be streamed to disk and built in parallel render processes.
+"""
+import io
+import multiprocessing
+import os
+import time
+import re
+import datetime
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from docx.shared import RGBColor
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+
+from . import core
+from .core import BaseAgent, SkippedFile
+
+
+def render_folder_document(settings, source_url, folder_name, entries, skipped):
+    """
+    Builds and saves one folder's document in a render worker process.
+    entries are (file_item, payload) pairs in manifest order; payload is the
+    stored incremental record of an unchanged file, or the downloaded
+    {'content', 'seconds'}. Files are highlighted here rather than in the
+    parent, so tokenizing spreads over the workers too and no run lists
+    have to be pickled. Returns the output path together with the
+    incremental records, counters and truncation notes the parent merges
+    back.
+    """
+    agent = GitHubFolderAgent(**settings)
+    agent.source_url = source_url
+    agent.skipped_files = list(skipped)
+    for file_item, payload in entries:
+        if 'fragment' in payload:
+            agent._reuse_fragment(folder_name, file_item, payload)
+        else:
+            started = time.perf_counter()
+            runs = agent.highlight(file_item, payload['content'])
+            seconds = payload['seconds'] + time.perf_counter() - started
+            agent.emit_file(file_item, folder_name, payload['content'], seconds, runs)
+    output_path = agent.finish_document(folder_name, agent.skipped_files)
+    return output_path, agent.rendered_fragments, agent.incremental_stats, agent.skipped_files[len(skipped):]
+
+
+
+class StreamingDocxWriter:
+    """
+    Writes a .docx whose word/document.xml is streamed into the zip as files
+    are added, instead of keeping a whole python-docx Document in memory.
+
+    The writer owns a scratch Document that already carries the styles and
+    title page. Callers render one file into `document` as usual and then
+    call flush(), which serialises the new body elements, appends them to the
+    zip and removes them from the scratch document again.
+    """
+
+    _NS_DECLARATION = re.compile(r' xmlns:\w+="[^"]*"')
+
+    def __init__(self, output_path, document):
+        self.output_path = output_path
+        self.document = document
+
+        template = io.BytesIO()
+        document.save(template)
+        self._zip = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(template) as template_zip:
+            for info in template_zip.infolist():
+                if info.filename != 'word/document.xml':
+                    self._zip.writestr(info.filename, template_zip.read(info.filename))
+            document_xml = template_zip.read('word/document.xml')
+
+        # Everything up to the final sectPr is the title page; the rest closes the body
+        split_at = document_xml.rindex(b'<w:sectPr')
+        self._suffix = document_xml[split_at:]
+        self._stream = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        self._stream.write(document_xml[:split_at])
+        self._clear_scratch()
+
+    def _clear_scratch(self):
+        body = self.document.element.body
+        for element in list(body):
+            if element is not body.sectPr:
+                body.remove(element)
+
+    def flush(self):
+        """Streams everything rendered into the scratch document since the last flush."""
+        body = self.document.element.body
+        parts = []
+        for element in list(body):
+            if element is body.sectPr:
+                continue
+            xml = etree.tostring(element, encoding='unicode')
+            # Namespaces are declared once on <w:document>; drop the copies lxml repeats
+            tag_end = xml.index('>')
+            parts.append(self._NS_DECLARATION.sub('', xml[:tag_end]) + xml[tag_end:])
+            body.remove(element)
+        fragment = ''.join(parts)
+        self._stream.write(fragment.encode('utf-8'))
+        return fragment
+
+    def write_fragment(self, fragment):
+        """Streams body XML produced by an earlier flush()."""
+        self._stream.write(fragment.encode('utf-8'))
+
+    def abort(self):
+        """Closes the zip without finishing it and removes the partial file."""
+        self._stream.close()
+        self._zip.close()
+        os.remove(self.output_path)
+
+    def close(self):
+        """Writes the section properties, closes the body and finishes the zip."""
+        self._stream.write(self._suffix)
+        self._stream.close()
+        self._zip.close()
+
+
+class GitHubFolderAgent(BaseAgent):
+    def __init__(self, output_directory="Output_Reports", streaming=False, render_workers=1, **options):
+        super().__init__(**options)
+        self.output_directory = output_directory
+        self.folder_documents = {}  # Dictionary to store documents per folder
+        self.streaming = streaming  # Stream each document to disk instead of holding it in memory
+        self.folder_writers = {}  # StreamingDocxWriter per folder when streaming
+
+        # Folder documents are independent, so with render_workers > 1 each one is
+        # built and saved in its own worker process once its last file has arrived
+        self.render_workers = render_workers
+        self._render_pool = None
+        self._folder_jobs = {}  # folder -> queued (file_item, payload) list, then its Future
+        self._folder_pending = {}  # folder -> files not handled yet
+        
+        # Create output directory if it doesn't exist
+        if not os.path.exists(self.output_directory):
+            os.makedirs(self.output_directory)
+
+    def sanitize_filename(self, name):
+        """Sanitizes folder name to be used as a valid filename."""
+        # Remove or replace invalid characters for Windows filenames
+        invalid_chars = '<>:"/\\|?*'
+        for char in invalid_chars:
+            name = name.replace(char, '_')
+        return name.strip()
+
+    def get_or_create_document(self, folder_name):
+        """Gets existing document for folder or creates a new one."""
+        if folder_name not in self.folder_documents:
+            doc = self.new_document()
+            
+            # --- Create a Professional Title Page ---
+            title = doc.add_heading(f'{folder_name}', 0)
+            title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            title.runs[0].font.name = 'Segoe UI'
+            title.runs[0].font.color.rgb = RGBColor(16, 54, 92)  # Dark Blue
+
+            # Add Date and URL info
+            p = doc.add_paragraph()
+            p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            p.add_run(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n").bold = True
+            p.add_run(f"Source: {self.source_url}")
+            doc.add_page_break()
+            
+            if self.streaming:
+                # doc becomes the writer's scratch document; the title page is already on disk
+                self.folder_writers[folder_name] = StreamingDocxWriter(self.get_output_path(folder_name), doc)
+            self.folder_documents[folder_name] = doc
+            print(f"[Agent] Created new document for folder: {folder_name}")
+        
+        return self.folder_documents[folder_name]
+
+    def get_output_path(self, folder_name):
+        """Path of the .docx generated for a folder."""
+        return os.path.join(self.output_directory, f"{self.sanitize_filename(folder_name)}.docx")
+
+    def get_folder_name_from_path(self, file_path):
+        """Extracts the immediate parent folder name from a file path."""
+        path_parts = file_path.split('/')
+        if len(path_parts) > 1:
+            return path_parts[-2]  # Return the parent folder name
+        return "Root"  # If file is in root directory
+
+    def render_file(self, file_item, folder_name, code_content, runs=None):
+        """Formats one file's content beautifully in Word."""
+        name = file_item['name']
+        path = file_item['path']
+
+        # Get or create the document for this folder
+        doc = self.get_or_create_document(folder_name)
+
+        # --- STYLING IMPROVEMENTS HERE ---
+
+        # 1. Filename Heading
+        self._add_styled_paragraph(doc, name, 'Heading1')
+
+        # 2. File Path (Subtle, gray, italic)
+        self._add_styled_paragraph(doc, f"Full Path: {path}", 'FilePath')
+        if file_item.get('truncated'):
+            note = self.truncation_note(file_item)
+            self._add_styled_paragraph(doc, f"Note: {note}", 'FilePath')
+            self.skipped_files.append((path, note))
+
+        # 3. The Code Block (The "Pretty" Part)
+        # Font, shading and spacing all come from the 'Code Block' style
+        if runs:
+            for chunk in self.split_runs(runs):
+                self._add_highlighted_paragraph(doc, chunk, 'CodeBlock')
+        else:
+            for chunk in self.split_code(code_content):
+                self._add_styled_paragraph(doc, chunk, 'CodeBlock')
+
+        doc.add_page_break()
+
+    def manifest_path(self):
+        """Incremental manifest kept next to the generated documents."""
+        return os.path.join(self.output_directory, '.manifest.json')
+
+    def checkpoint_fragments(self):
+        """Also keeps the records of folders the render workers have finished."""
+        files = super().checkpoint_fragments()
+        for future in self._folder_jobs.values():
+            # Folders finished by the render workers are only merged at the end of the run
+            if isinstance(future, Future) and future.done() and not future.cancelled() and not future.exception():
+                files.update(future.result()[1])
+        return files
+
+    def _capture_fragment(self, doc, start):
+        """Serialises the body elements appended since index start."""
+        elements = list(doc.element.body)[start:self._body_end(doc)]
+        return ''.join(etree.tostring(el, encoding='unicode') for el in elements)
+
+    def _reuse_fragment(self, folder_name, file_item, record):
+        """Appends a fragment stored by a previous run instead of downloading and rendering."""
+        if self._render_pool is not None:
+            self._folder_jobs.setdefault(folder_name, []).append((file_item, record))
+            return
+        doc = self.get_or_create_document(folder_name)
+        if self.streaming:
+            self.folder_writers[folder_name].write_fragment(record['fragment'])
+        else:
+            self._append_fragment(doc, record['fragment'])
+        self.rendered_fragments[file_item['path']] = record
+        self.incremental_stats['reused'] += 1
+        self.incremental_stats['seconds_saved'] += record.get('seconds', 0)
+
+    def _append_fragment(self, doc, fragment):
+        body = doc.element.body
+        for el in list(parse_xml(f"<w:body {nsdecls('w')}>{fragment}</w:body>")):
+            if body.sectPr is not None:
+                body.sectPr.addprevious(el)
+            else:
+                body.append(el)
+
+    def highlight(self, file_item, code_content):
+        """Leaves highlighting to the render workers when there are any."""
+        if self._render_pool is not None:
+            return None  # Render workers highlight the files of their own folder
+        return super().highlight(file_item, code_content)
+
+    def _render_next(self, pending):
+        file_item = pending[0][0]
+        self._render_download(*pending.popleft())
+        if self._render_pool is not None:
+            self._file_done(self.get_folder_name_from_path(file_item['path']))
+        self.maybe_checkpoint()
+
+    def _render_download(self, file_item, future, record=None):
+        """Waits for one download and renders it, recording failures instead of aborting."""
+        folder_name = self.get_folder_name_from_path(file_item['path'])
+        if future is None:
+            self._reuse_fragment(folder_name, file_item, record)
+            return
+        try:
+            code_content, runs, seconds = future.result()
+        except SkippedFile as e:
+            print(f"[Agent] Skipped {file_item['name']}: {e}")
+            self.skipped_files.append((file_item['path'], str(e)))
+            return
+        except Exception as e:
+            print(f"[Error] Could not download file {file_item['name']}: {e}")
+            self.failed_files.append((file_item['path'], str(e)))
+            return
+        print(f"[Agent] Rendering: {file_item['name']} -> Folder: {folder_name}")
+        self.emit_file(file_item, folder_name, code_content, seconds, runs)
+
+    def emit_file(self, file_item, folder_name, code_content, seconds=0.0, runs=None):
+        """Renders one file into its folder's document and streams/records the result."""
+        if self._render_pool is not None:
+            payload = {'content': code_content, 'seconds': seconds}
+            self._folder_jobs.setdefault(folder_name, []).append((file_item, payload))
+            return
+        doc = self.get_or_create_document(folder_name)
+        start, started = self._body_end(doc), time.perf_counter()
+        self.render_file(file_item, folder_name, code_content, runs)
+        self.incremental_stats['rendered'] += 1
+        # Truncated files are re-fetched every run so their appendix entry is never lost
+        record = self.incremental and self.source_mode != "archive" and not file_item.get('truncated')
+        if self.streaming:
+            fragment = self.folder_writers[folder_name].flush()
+        elif record:
+            fragment = self._capture_fragment(doc, start)
+        if record:
+            self.rendered_fragments[file_item['path']] = {
+                'sha': file_item.get('sha'),
+                'seconds': seconds + time.perf_counter() - started,
+                'fragment': fragment
+            }
+
+    def render_settings(self):
+        """Constructor arguments a render worker needs to build documents exactly like this agent."""
+        return {'output_directory': self.output_directory, 'source_mode': self.source_mode,
+                'incremental': self.incremental, 'streaming': self.streaming,
+                'max_file_bytes': self.max_file_bytes, 'large_file_mode': self.large_file_mode,
+                'highlight_theme': self.highlight_theme, 'highlight_workers': 1, 'cache_dir': self.cache_dir}
+
+    def start_render_pool(self, file_items):
+        """Starts the render workers and counts each folder's files, so a folder can be handed off once complete."""
+        # Spawned, not forked: a fork would copy the download threads' locks in whatever state they are
+        self._render_pool = ProcessPoolExecutor(max_workers=self.render_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        self._folder_jobs = {}
+        self._folder_pending = {}
+        for file_item in file_items:
+            folder_name = self.get_folder_name_from_path(file_item['path'])
+            self._folder_pending[folder_name] = self._folder_pending.get(folder_name, 0) + 1
+
+    def _file_done(self, folder_name):
+        """Submits a folder's document to the render workers after its last file was downloaded (or failed)."""
+        self._folder_pending[folder_name] -= 1
+        if self._folder_pending[folder_name] == 0 and folder_name in self._folder_jobs:
+            self._submit_folder(folder_name)
+
+    def _submit_folder(self, folder_name, skipped_by_folder=None):
+        if skipped_by_folder is None:
+            skipped_by_folder = self._skipped_by_folder()
+        entries = self._folder_jobs.get(folder_name, [])
+        self._folder_jobs[folder_name] = self._render_pool.submit(
+            render_folder_document, self.render_settings(), self.source_url,
+            folder_name, entries, skipped_by_folder.get(folder_name, [])
+        )
+
+    def close_render_pool(self):
+        """Stops the render workers, dropping queued folders if the run failed part-way."""
+        if self._render_pool is not None:
+            self._render_pool.shutdown(cancel_futures=True)
+            self._render_pool = None
+
+    def _skipped_by_folder(self):
+        skipped_by_folder = {}
+        for path, reason in self.skipped_files:
+            skipped_by_folder.setdefault(self.get_folder_name_from_path(path), []).append((path, reason))
+        return skipped_by_folder
+
+    def finish_document(self, folder_name, skipped=None):
+        """Adds the skipped-files appendix, if any, and writes one folder's document to disk."""
+        doc = self.get_or_create_document(folder_name)
+        if skipped:
+            self.add_skipped_appendix(doc, skipped)
+        output_path = self.get_output_path(folder_name)
+        if self.streaming:
+            writer = self.folder_writers[folder_name]
+            writer.flush()
+            writer.close()
+        else:
+            doc.save(output_path)
+        return output_path
+
+    def collect_rendered_folders(self):
+        """Waits for the render workers and merges their results; returns the saved paths in folder order."""
+        # Each folder's skipped/truncated files are listed at the end of its own document
+        skipped_by_folder = self._skipped_by_folder()
+        for folder_name in list(self._folder_jobs) + list(skipped_by_folder):
+            if not isinstance(self._folder_jobs.get(folder_name), Future):
+                self._submit_folder(folder_name, skipped_by_folder)
+
+        saved = []
+        for future in self._folder_jobs.values():
+            output_path, fragments, stats, notes = future.result()
+            self.rendered_fragments.update(fragments)
+            for key in ('reused', 'rendered', 'seconds_saved'):
+                self.incremental_stats[key] += stats[key]
+            self.skipped_files.extend(notes)
+            print(f"[Success] Saved: {output_path}")
+            saved.append(output_path)
+        return saved
+
+    def save_all_documents(self):
+        """Saves all folder documents to separate files and returns their paths."""
+        if self._render_pool is not None:
+            saved = self.collect_rendered_folders()
+        else:
+            # Each folder's skipped/truncated files are listed at the end of its own document
+            skipped_by_folder = self._skipped_by_folder()
+            for folder_name in skipped_by_folder:
+                self.get_or_create_document(folder_name)
+
+            saved = []
+            for folder_name in self.folder_documents:
+                output_path = self.finish_document(folder_name, skipped_by_folder.get(folder_name))
+                print(f"[Success] Saved: {output_path}")
+                saved.append(output_path)
+
+        if not saved:
+            print("[Warning] No documents to save!")
+            return saved
+
+        print(f"\n[Complete] Total {len(saved)} document(s) saved in '{self.output_directory}' folder.")
+        return saved
+
+    def process_archive(self, folder_url, target_extensions):
+        """Renders the matching files of the repository tarball in manifest order as they stream in."""
+        manifest = self.fetch_tree_manifest(self.parse_repo_url(folder_url), target_extensions)
+        if manifest is None:
+            # Without a listing the archive has to be read to the end before it can be ordered
+            print("[Agent] Tree listing truncated, ordering the archive by path")
+        else:
+            print(f"[Agent] Found {len(manifest)} matching file(s)")
+            self.total_files = len(manifest)
+            if self.render_workers > 1:
+                self.start_render_pool(manifest)
+
+        members = self.fetch_archive_files(folder_url, target_extensions, manifest)
+        for file_item, code_content, runs in self.highlight_ahead(members):
+            folder_name = self.get_folder_name_from_path(file_item['path'])
+            if code_content is not None:
+                if manifest is None:
+                    self.total_files += 1
+                self.emit_file(file_item, folder_name, code_content, runs=runs)
+            if self._render_pool is not None:
+                self._file_done(folder_name)
+
+    def run(self, folder_url, target_extensions=['.cpp', '.h', '.hpp']):
+        """Main execution function."""
+        try:
+            self.source_url = folder_url
+            
+            # --- Start Processing ---
+            if self.source_mode == "archive":
+                self.process_archive(folder_url, target_extensions)
+            else:
+                manifest = self.load_checkpoint(folder_url, target_extensions) if self.incremental else None
+                if manifest is not None:
+                    print(f"[Agent] Resuming an interrupted run ({len(manifest)} file(s))")
+                else:
+                    manifest = self.discover_files(folder_url, target_extensions)
+                    print(f"[Agent] Found {len(manifest)} matching file(s)")
+                self.total_files = len(manifest)
+
+                if self.incremental:
+                    self.previous_fragments = self.load_previous_manifest()
+                    current_paths = {file_item['path'] for file_item in manifest}
+                    self.incremental_stats['removed'] = len(set(self.previous_fragments) - current_paths)
+                    if manifest:
+                        self.checkpoint = {'target_extensions': list(target_extensions), 'manifest': manifest}
+                        self.save_checkpoint()
+                if self.render_workers > 1:
+                    self.start_render_pool(manifest)
+                self.process_files(manifest)
+
+            self.evict_caches()
+            
+            # Save all documents
+            self.save_all_documents()
+            if self.incremental and self.source_mode != "archive":
+                self.save_manifest()
+                self.checkpoint = None
+                inc = self.incremental_stats
+                print(f"[Agent] Incremental: {inc['reused']} reused, {inc['rendered']} re-rendered, "
+                      f"{inc['removed']} removed, ~{inc['seconds_saved']:.1f}s of download/render work skipped")
+
+            stats = self.http_stats
+            print(f"[Agent] HTTP: {stats['requests']} request(s), {stats['retries']} retries, "
+                  f"{stats['wait_seconds']:.1f}s waiting on limits/backoff")
+            if self.source_mode == "graphql":
+                gql = self.graphql_stats
+                print(f"[Agent] GraphQL: {gql['files']} file(s) in {gql['queries']} queries ({gql['splits']} split), "
+                      f"{gql['fallbacks']} downloaded raw; {stats['requests'] / max(1, len(manifest)):.2f} requests per file")
+            if self.cache_dir:
+                cache = self.cache_stats
+                print(f"[Agent] Blob cache: {cache['hits']} hit(s), {cache['misses']} miss(es), "
+                      f"{cache['bytes_saved']} bytes not downloaded")
+            if self.api_cache_dir:
+                print(f"[Agent] API cache: {self.api_cache_stats['not_modified']} listing(s) unchanged (304)")
+            if self.failed_files:
+                print(f"[Warning] {len(self.failed_files)} file(s) could not be downloaded:")
+                for path, error in self.failed_files:
+                    print(f"  - {path}: {error}")
+            if self.skipped_files:
+                print(f"[Warning] {len(self.skipped_files)} file(s) skipped or truncated (see the appendix):")
+                for path, reason in self.skipped_files:
+                    print(f"  - {path}: {reason}")
+            
+        except Exception as e:
+            self.error = str(e)
+            print(f"[Fatal Error] {e}")
+        finally:
+            if self.checkpoint:
+                self.save_checkpoint()
+                print(f"[Agent] Run interrupted; progress saved to {self.manifest_path()}, run again to resume")
+            self.close_highlight_pool()
+            self.close_render_pool()
+            self.close_git()
+
+
+def run_batch(targets, target_extensions=['.cpp', '.h', '.hpp'], output_directory="Output_Reports", **options):
+    """Converts many repositories, each into its own folder under output_directory (see core.run_batch)."""
+    return core.run_batch(GitHubFolderAgent, targets, target_extensions, output_directory, **options)
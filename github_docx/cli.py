@@ -0,0 +1,226 @@
+"""
+The github-docx command (also python -m github_docx).
+
+Only argparse and a few standard modules are imported up front. Arguments
+are checked first, and the converters, and with them python-docx, lxml and
+requests, are imported only once there is something to convert, so --help,
+mistakes and --dry-run of a local folder come back almost at once.
+"""
+import argparse
+import json
+import os
+from urllib.parse import urlparse
+
+from . import __version__
+
+DEFAULT_EXTENSIONS = ['.cpp', '.h', '.hpp', '.py', '.js']
+REMOTE_SOURCES = ('api', 'graphql', 'archive')
+DEFAULT_OUTPUT = {  # (single run, batch) per mode
+    'single': ("Formatted_Code_Report.docx", "Batch_Reports"),
+    'by-folder': ("Output_Reports", "Output_Reports"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='github-docx',
+        description="Convert the code in a GitHub folder, a local folder or a git repository into Word documents.",
+        epilog="Example: github-docx https://github.com/owner/repo/tree/main/src -e .py,.js -o Report.docx"
+    )
+    parser.add_argument('url', nargs='?',
+                        help="GitHub folder URL, e.g. https://github.com/owner/repo/tree/main/src "
+                             "(a path with --source local or git)")
+    parser.add_argument('-e', '--ext', action='append', metavar='EXT',
+                        help="Extensions to include, comma-separated or repeated (default: %s)" % ','.join(DEFAULT_EXTENSIONS))
+    parser.add_argument('-m', '--mode', choices=('single', 'by-folder'), default='single',
+                        help="One document, or one document per folder (default: single)")
+    parser.add_argument('-o', '--output',
+                        help="Document to write, or folder for --mode by-folder and --batch "
+                             "(default: Formatted_Code_Report.docx, Output_Reports or Batch_Reports)")
+    parser.add_argument('--source', choices=('api', 'graphql', 'archive', 'local', 'git'), default='api',
+                        help="api downloads files one by one, graphql fetches them in batches (needs a token), "
+                             "archive streams the repository tarball, local reads a folder on disk and git reads "
+                             "--ref from a local repository (default: api)")
+    parser.add_argument('--ref', default='HEAD', help="Branch, tag or commit read with --source git (default: HEAD)")
+    parser.add_argument('--token', help="GitHub token for private repositories and higher rate limits (default: $GITHUB_TOKEN)")
+    parser.add_argument('-j', '--workers', type=int, default=8, help="Parallel downloads (default: 8)")
+    parser.add_argument('--cache-dir', default='.blob_cache',
+                        help="Cache of file contents reused across runs, '' to disable (default: .blob_cache)")
+    parser.add_argument('--api-cache-dir', default='.api_cache',
+                        help="Cache of API listings revalidated with ETags, '' to disable (default: .api_cache)")
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=True,
+                        help="Reuse unchanged files from the previous run and resume interrupted runs")
+    parser.add_argument('--max-file-bytes', type=int, default=1024 * 1024,
+                        help="Largest file to include in full (default: 1 MB)")
+    parser.add_argument('--large-files', choices=('truncate', 'skip'), default='truncate',
+                        help="What to do with larger files (default: truncate)")
+    parser.add_argument('--highlight', metavar='THEME', help="Pygments theme for syntax highlighting, e.g. friendly")
+    parser.add_argument('--wait-for-rate-limit', action=argparse.BooleanOptionalAction, default=True,
+                        help="Wait for an exhausted GitHub rate limit to reset instead of stopping")
+
+    folders = parser.add_argument_group("--mode by-folder")
+    folders.add_argument('--streaming', action=argparse.BooleanOptionalAction, default=True,
+                         help="Write documents to disk while they are built")
+    folders.add_argument('--render-workers', type=int, default=os.cpu_count() or 1,
+                         help="Processes building folder documents side by side (default: %(default)s)")
+
+    batch = parser.add_argument_group("many repositories")
+    batch.add_argument('--batch', metavar='FILE',
+                       help="Convert the targets in FILE instead of URL: one per line, or a JSON list of "
+                            "URLs and {\"url\", \"output\", \"ref\"} objects")
+    batch.add_argument('--parallel-repos', type=int, default=4, help="Repositories converted at a time (default: 4)")
+    batch.add_argument('--summary', metavar='FILE', help="Save the per-repository results as JSON")
+
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help="List the files that would be converted, without writing anything")
+    parser.add_argument('--version', action='version', version=f"%(prog)s {__version__}")
+    return parser
+
+
+def parse_extensions(values):
+    """Flattens -e .py,.js -e h into ['.py', '.js', '.h']."""
+    extensions = []
+    for value in values or [','.join(DEFAULT_EXTENSIONS)]:
+        for ext in value.split(','):
+            ext = ext.strip()
+            if ext:
+                extensions.append(ext if ext.startswith('.') else '.' + ext)
+    return extensions
+
+
+def read_batch_file(parser, path):
+    """Batch targets from a file of URLs (one per line, # comments) or a JSON list."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError as e:
+        parser.error(f"cannot read --batch file: {e}")
+    if text.lstrip().startswith('['):
+        try:
+            entries = json.loads(text)
+        except ValueError as e:
+            parser.error(f"{path} is not valid JSON: {e}")
+    else:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+    targets = [entry if isinstance(entry, dict) else {'url': entry} for entry in entries]
+    for target in targets:
+        if not isinstance(target.get('url'), str):
+            parser.error(f"{path}: every entry needs a url: {target!r}")
+    if not targets:
+        parser.error(f"{path} lists no targets")
+    return targets
+
+
+def check_target(parser, url, source):
+    """Rejects a target the chosen source cannot read, before anything is imported or downloaded."""
+    if source in REMOTE_SOURCES:
+        parsed = urlparse(url)
+        parts = [part for part in parsed.path.split('/') if part]
+        if parsed.scheme not in ('http', 'https') or parsed.netloc not in ('github.com', 'www.github.com') or len(parts) < 2:
+            parser.error(f"not a GitHub repository or folder URL: {url} "
+                         "(use --source local or git for a path on disk)")
+    elif not os.path.isdir(url):
+        parser.error(f"no such folder: {url}")
+
+
+def validate(parser, args):
+    """Checks the arguments and returns the targets and extensions to convert."""
+    if args.url and args.batch:
+        parser.error("give either a URL or --batch, not both")
+    if not args.url and not args.batch:
+        parser.error("a URL (or --batch FILE) is required")
+    targets = read_batch_file(parser, args.batch) if args.batch else [{'url': args.url}]
+    for target in targets:
+        check_target(parser, target['url'], args.source)
+
+    args.token = args.token or os.environ.get('GITHUB_TOKEN') or None
+    if args.source == 'graphql' and not args.token:
+        parser.error("--source graphql needs a token (--token or $GITHUB_TOKEN)")
+    for name in ('workers', 'render_workers', 'parallel_repos', 'max_file_bytes'):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    if args.highlight:
+        try:
+            from pygments.styles import get_style_by_name
+            from pygments.util import ClassNotFound
+        except ImportError:
+            parser.error("--highlight needs pygments (pip install pygments)")
+        try:
+            get_style_by_name(args.highlight)
+        except ClassNotFound:
+            parser.error(f"unknown highlight theme: {args.highlight}")
+
+    extensions = parse_extensions(args.ext)
+    if not extensions:
+        parser.error("no extensions given")
+    return targets, extensions
+
+
+def agent_options(args):
+    """GitHubFolderAgent keyword arguments for the parsed command line."""
+    options = dict(github_token=args.token, source_mode=args.source, git_ref=args.ref,
+                   cache_dir=args.cache_dir or None, api_cache_dir=args.api_cache_dir or None,
+                   incremental=args.incremental, max_file_bytes=args.max_file_bytes,
+                   large_file_mode=args.large_files, highlight_theme=args.highlight,
+                   wait_for_rate_limit=args.wait_for_rate_limit)
+    if args.mode == 'by-folder':
+        options.update(streaming=args.streaming, render_workers=args.render_workers)
+    return options
+
+
+def dry_run(targets, extensions, args):
+    """
+    Lists what each target would contribute. Only the shared core is loaded
+    (no python-docx), and local and git sources do not load requests either.
+    Archive and GraphQL runs are listed through the trees API.
+    """
+    from .core import BaseAgent
+
+    source = 'api' if args.source in REMOTE_SOURCES else args.source
+    agent = BaseAgent(github_token=args.token, source_mode=source, git_ref=args.ref,
+                      api_cache_dir=args.api_cache_dir or None, max_file_bytes=args.max_file_bytes,
+                      large_file_mode=args.large_files, wait_for_rate_limit=args.wait_for_rate_limit)
+    failed = 0
+    for target in targets:
+        agent.git_ref = target.get('ref') or args.ref
+        try:
+            manifest = agent.discover_files(target['url'], extensions)
+        except Exception as e:
+            print(f"[Fatal Error] {target['url']}: {e}")
+            failed += 1
+            continue
+        total = sum(file_item.get('size', 0) for file_item in manifest)
+        print(f"[Dry run] {target['url']}: {len(manifest)} file(s), {agent.format_size(total)}")
+        for file_item in manifest:
+            size = file_item.get('size', 0)
+            note = f"  ({args.large_files})" if size > args.max_file_bytes else ""
+            print(f"  {file_item['path']}  {agent.format_size(size)}{note}")
+    stats = agent.http_stats
+    if stats['requests']:
+        print(f"[Dry run] HTTP: {stats['requests']} request(s)")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    targets, extensions = validate(parser, args)
+    if args.dry_run:
+        return dry_run(targets, extensions, args)
+
+    if args.mode == 'single':
+        from .single import GitHubFolderAgent, run_batch
+    else:
+        from .by_folder import GitHubFolderAgent, run_batch
+    options = agent_options(args)
+    single_output, batch_output = DEFAULT_OUTPUT[args.mode]
+
+    if args.batch:
+        summary = run_batch(targets, extensions, output_directory=args.output or batch_output,
+                            parallel_repos=args.parallel_repos, max_workers=args.workers,
+                            summary_path=args.summary, **options)
+        return 1 if any(repo['status'] == 'failed' for repo in summary) else 0
+
+    agent = GitHubFolderAgent(args.output or single_output, max_workers=args.workers, **options)
+    agent.run(args.url, extensions)
+    return 1 if agent.error else 0
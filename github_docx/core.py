@@ -0,0 +1,1537 @@
+"""
+Shared core of the converters: sources (GitHub API, GraphQL, archive, local
+folder, git), the HTTP transport with its rate-limit handling, the blob and
+API caches, incremental manifests and checkpoints, and the code rendering
+both report layouts use. python-docx, requests and pygments are imported
+where they are first needed, so listing files or checking arguments does
+not pay for loading them.
+"""
+import copy
+import io
+import os
+import random
+import threading
+import time
+import re
+import tarfile
+import hashlib
+import json
+import tempfile
+import zlib
+import subprocess
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from html import escape as html_escape  # Same as xml.sax.saxutils.escape, which would import urllib.request
+from urllib.parse import urlparse, quote
+
+GITHUB_API = "https://api.github.com"
+GITHUB_RAW = "https://raw.githubusercontent.com"
+
+_LEXERS = {}  # Per-process lexer cache, keyed by file extension
+
+def tokenize_code(filename, code_content, theme):
+    """
+    Splits code into (text, [color, bold, italic]) runs with the Pygments
+    lexer for the file's extension and the given theme. Neighbouring tokens
+    that look the same are merged, and so is whitespace (it has no visible
+    colour), to keep the number of Word runs low. Lives at module level so
+    it can run in worker processes. Returns None for unknown file types.
+    """
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.styles import get_style_by_name
+    from pygments.util import ClassNotFound
+
+    ext = os.path.splitext(filename)[1].lower() or filename
+    if ext not in _LEXERS:
+        try:
+            _LEXERS[ext] = get_lexer_for_filename(filename, stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            _LEXERS[ext] = None
+    lexer = _LEXERS[ext]
+    if lexer is None:
+        return None
+    style = get_style_by_name(theme)
+    runs, parts, current = [], [], None
+    for token_type, text in lexer.get_tokens(code_content):
+        if not text.isspace():
+            token_style = style.style_for_token(token_type)
+            look = [token_style['color'], token_style['bold'], token_style['italic']]
+            if look != current:
+                if parts:
+                    runs.append((''.join(parts), current))
+                parts, current = [], look
+        parts.append(text)
+    if parts:
+        runs.append((''.join(parts), current))
+    return runs
+
+
+class SkippedFile(Exception):
+    """Raised for a file that is deliberately left out of the report (binary or too large)."""
+
+
+def is_rate_limited(error):
+    """True for the HTTPError of a request GitHub refused for a rate limit that was not waited out."""
+    return getattr(getattr(error, 'response', None), 'rate_limited', False)
+
+
+class HeldBackMembers:
+    """
+    Archive members that arrived before their turn, by path. Their text is
+    kept in memory up to limit characters and written to a temporary file past it.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.members = {}  # path -> (file_item, content, spill offset, spill length)
+        self.memory_chars = 0
+        self.spill = None
+
+    def __contains__(self, path):
+        return path in self.members
+
+    def put(self, file_item, content):
+        if content is not None and self.memory_chars + len(content) > self.limit:
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile()
+            data = content.encode('utf-8', 'surrogatepass')
+            self.spill.seek(0, os.SEEK_END)
+            self.members[file_item['path']] = (file_item, None, self.spill.tell(), len(data))
+            self.spill.write(data)
+        else:
+            self.members[file_item['path']] = (file_item, content, None, 0)
+            self.memory_chars += len(content or '')
+
+    def pop(self, path):
+        """Removes a held member and returns its (file_item, content)."""
+        file_item, content, offset, length = self.members.pop(path)
+        if offset is not None:
+            self.spill.seek(offset)
+            content = self.spill.read(length).decode('utf-8', 'surrogatepass')
+        else:
+            self.memory_chars -= len(content or '')
+        return file_item, content
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+
+class BaseAgent:
+    """
+    Everything the single-document and folder-wise converters share: finding
+    and downloading files, caching, rate limits, incremental state and code
+    rendering. Subclasses decide how rendered files are laid out in documents
+    (render_file, _render_download, run).
+    """
+    _template = None  # Serialised, pre-styled empty document shared by all agents
+    _TEXT_BREAKS = re.compile(r'(\t|\r\n|\r|\n)')  # Characters Word stores as elements, not text
+    _XML_ILLEGAL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+    def __init__(self, github_token=None, source_mode="api",
+                 max_workers=8, cache_dir=None, cache_max_bytes=512 * 1024 * 1024,
+                 api_cache_dir=None, incremental=False,
+                 max_file_bytes=1024 * 1024, large_file_mode="truncate",
+                 highlight_theme=None, highlight_workers=None, wait_for_rate_limit=False, git_ref="HEAD"):
+        self.github_token = github_token
+        self.source_url = ""
+        self.error = None  # Why the last run failed, if it did
+        self.download_pool = None  # Thread pool shared by the agents of a batch (see run_batch)
+        # "api", "graphql" (batched contents, needs a token), "archive" (one tarball),
+        # "local" (a folder on disk) or "git" (a local repo)
+        self.source_mode = source_mode
+        self.git_ref = git_ref  # Branch, tag or commit read in "git" mode
+        self.git_dir = None
+        self._git_batch = None  # git cat-file --batch process, started on the first read
+        self._git_lock = threading.Lock()
+        self.max_workers = max_workers  # Parallel downloads in "api" mode
+        self.failed_files = []  # (path, error) for files that could not be downloaded
+        self.total_files = 0  # Matching files found by the last run
+        self.max_file_bytes = max_file_bytes  # Larger files are truncated (or skipped) before rendering
+        self.large_file_mode = large_file_mode  # "truncate" or "skip"
+        self.chunk_chars = 64 * 1024  # Longest single code paragraph; bigger files are split
+        self.skipped_files = []  # (path, reason) for binary, skipped or truncated files
+        self.archive_holdback_chars = 32 * 1024 * 1024  # Early archive members kept in memory; more go to disk
+
+        # Syntax highlighting: a Pygments theme name such as "friendly", or None for plain code
+        if highlight_theme:
+            try:
+                from pygments.styles import get_style_by_name
+            except ImportError:
+                print("[Warning] pygments is not installed, code will not be highlighted")
+                highlight_theme = None
+            else:
+                get_style_by_name(highlight_theme)  # Fail early on a misspelt theme
+        self.highlight_theme = highlight_theme
+        self.highlight_workers = highlight_workers or os.cpu_count() or 1  # Tokenizer processes
+        self._highlight_pool = None
+        self._highlight_lock = threading.Lock()
+        self.api_base = GITHUB_API
+        self.raw_base = GITHUB_RAW
+        self.resolved_refs = {}  # (owner, repo, ref) -> (commit SHA, tree SHA), so one run reads one commit
+
+        # HTTP transport: pooled session plus rate-limit bookkeeping
+        self.max_retries = 5
+        self.request_timeout = 30  # Seconds to connect, and between bytes of a response
+        self.max_rate_limit_wait = 600  # Longest pause (seconds) before giving up on a limit
+        self.wait_for_rate_limit = wait_for_rate_limit  # Wait out an exhausted rate limit however long it takes
+        self.rate_limited_until = None  # Set when a limit was not waited out; the run can be resumed then
+        self.rate_limit_reserve = 10  # Start pacing when this few API requests remain
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = 0
+        self.budget = self  # Agent whose rate limit this one draws on; the agents of a batch share one
+        self.http_stats = {'requests': 0, 'retries': 0, 'wait_seconds': 0.0, 'status_codes': {}}
+        self.downloaded_bytes = 0  # Bodies of file contents, archives and GraphQL batches
+        self._http_lock = threading.Lock()
+        self._session = None  # Created on first use, see session
+
+        # "graphql" mode: file contents come in batches, many blobs per GraphQL query
+        self.graphql_batch_files = 100  # Blobs per query
+        self.graphql_batch_bytes = 2 * 1024 * 1024  # Blob bytes per query; bigger files use raw downloads
+        self.graphql_stats = {'queries': 0, 'files': 0, 'fallbacks': 0, 'splits': 0}
+        self.graphql_futures = {}  # path -> Future of the batch fetching it
+        self.graphql_disabled = False  # Set when GitHub refuses GraphQL, e.g. for a token without access
+        self.repository = None  # (owner, name) of the repository being converted
+
+        # Content-addressed blob cache (disabled when cache_dir is None)
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_compress = True
+        self.cache_stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+        self._cache_lock = threading.Lock()
+
+        # Conditional-request cache for API metadata (ETag / Last-Modified)
+        self.api_cache_dir = api_cache_dir
+        self.api_cache_ttl = 7 * 24 * 3600  # Entries older than this are fetched afresh
+        self.api_cache_max_bytes = 64 * 1024 * 1024
+        self.api_cache_stats = {'not_modified': 0, 'stored': 0}
+
+        # Incremental regeneration: reuse fragments of files whose blob SHA is unchanged
+        self.incremental = incremental
+        self.previous_fragments = {}
+        self.rendered_fragments = {}
+        self.incremental_stats = {'reused': 0, 'rendered': 0, 'removed': 0, 'seconds_saved': 0.0}
+        self.checkpoint = None  # File list of the run in progress, saved with its fragments so far
+        self.checkpoint_interval = 30  # Seconds between checkpoints
+        self.last_checkpoint = 0.0
+
+    def _setup_document_style(self, doc):
+        """Sets up a professional visual style for the Word document."""
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.oxml import OxmlElement
+        from docx.shared import Inches, Pt, RGBColor
+
+        # 1. Configure Normal Text
+        style = doc.styles['Normal']
+        font = style.font
+        font.name = 'Segoe UI'  # Clean, modern sans-serif
+        font.size = Pt(10.5)
+        
+        # 2. Configure Heading 1 (For File Names)
+        h1 = doc.styles['Heading 1']
+        h1.font.name = 'Segoe UI'
+        h1.font.size = Pt(14)
+        h1.font.color.rgb = RGBColor(31, 78, 121)  # Professional Dark Blue
+        h1.font.bold = True
+        h1.paragraph_format.space_before = Pt(12)
+        h1.paragraph_format.space_after = Pt(3)
+
+        # 3. File Path line under each heading (subtle, gray, italic)
+        path_style = doc.styles.add_style('File Path', WD_STYLE_TYPE.PARAGRAPH)
+        path_style.base_style = doc.styles['Normal']
+        path_style.font.name = 'Segoe UI'
+        path_style.font.size = Pt(8)
+        path_style.font.italic = True
+        path_style.font.color.rgb = RGBColor(128, 128, 128)  # Grey
+        path_style.paragraph_format.space_after = Pt(6)
+
+        # 4. Code Block (monospace on a light gray box, #F2F2F2)
+        code_style = doc.styles.add_style('Code Block', WD_STYLE_TYPE.PARAGRAPH)
+        code_style.base_style = doc.styles['No Spacing']
+        self._set_style_shading(code_style, "F2F2F2")
+        code_style.font.name = 'Consolas'  # Best font for code
+        code_style.font.size = Pt(9.5)
+        code_style.font.color.rgb = RGBColor(0, 0, 0)
+        code_style.paragraph_format.left_indent = Inches(0.1)
+        code_style.paragraph_format.space_before = Pt(6)
+        code_style.paragraph_format.space_after = Pt(12)
+        # Chunks of one long file sit flush against each other
+        code_style.element.get_or_add_pPr().append(OxmlElement('w:contextualSpacing'))
+
+    def new_document(self):
+        """Returns a new Document cloned from the styled template, which is built only once."""
+        from docx import Document
+
+        if BaseAgent._template is None:
+            template = Document()
+            self._setup_document_style(template)
+            buffer = io.BytesIO()
+            template.save(buffer)
+            BaseAgent._template = buffer.getvalue()
+        return Document(io.BytesIO(BaseAgent._template))
+
+    def _set_style_shading(self, style, color_hex):
+        """
+        Directly manipulates OXML to add background color/shading to a paragraph style.
+        This creates the 'Code Block' gray box effect.
+        """
+        from docx.oxml import OxmlElement
+        from docx.oxml.ns import qn
+
+        shd = OxmlElement('w:shd')
+        shd.set(qn('w:val'), 'clear')
+        shd.set(qn('w:color'), 'auto')
+        shd.set(qn('w:fill'), color_hex)  # Hex Color
+        style.element.get_or_add_pPr().append(shd)
+
+    def get_headers(self):
+        """Returns headers for GitHub API requests."""
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if self.github_token:
+            headers['Authorization'] = f'token {self.github_token}'
+        return headers
+
+    @property
+    def session(self):
+        """Keep-alive HTTP session, created on first use so local runs never load requests."""
+        if self._session is None:
+            with self._http_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _create_session(self):
+        """Creates a keep-alive session whose connection pool fits the download workers."""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, self.max_workers))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close_session(self):
+        """Closes the keep-alive connections, if any were opened."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def join_batch(self, lead, download_pool):
+        """
+        Makes this agent use lead's HTTP session, rate-limit budget and tokenizer
+        processes, and download on the batch's thread pool (see run_batch).
+        """
+        self.session = lead.session
+        self.budget = lead
+        self._get_highlight_pool = lead._get_highlight_pool  # So close_highlight_pool leaves it running
+        self.download_pool = download_pool
+
+    def http_get(self, url, params=None, stream=False):
+        """
+        GETs a URL through the pooled session. API metadata calls are answered
+        from the conditional-request cache when GitHub replies 304.
+        """
+        if stream or not self.api_cache_dir or not url.startswith(self.api_base):
+            return self._send_request(url, params, stream)
+        return self._conditional_get(url, params)
+
+    def _send_request(self, url, params=None, stream=False, extra_headers=None, json_body=None, max_retries=None):
+        """
+        Sends one logical GET, or a POST of json_body. Requests are paced on
+        GitHub's rate-limit headers, and 5xx / secondary rate-limit responses
+        are retried with jittered exponential backoff. Returns the last response.
+        """
+        import requests
+
+        headers = self.get_headers()
+        if extra_headers:
+            headers.update(extra_headers)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        method = 'GET' if json_body is None else 'POST'
+        for attempt in range(max_retries + 1):
+            self._pace_requests(url)
+            with self._http_lock:
+                self.http_stats['requests'] += 1
+            try:
+                response = self.session.request(method, url, headers=headers, params=params,
+                                                json=json_body, stream=stream, timeout=self.request_timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._count_response('error')
+                if attempt == max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                self._count_response(response.status_code)
+                self._record_rate_limit(response)
+                delay = self._retry_delay(response, attempt)
+                if delay is None or attempt == max_retries:
+                    return response
+                response.close()
+
+            with self._http_lock:
+                self.http_stats['retries'] += 1
+            print(f"[Agent] Retrying {url} in {delay:.1f}s")
+            self._wait(delay)
+
+    def _conditional_get(self, url, params):
+        """Revalidates a cached API response with If-None-Match / If-Modified-Since."""
+        import requests
+
+        key = self._api_cache_key(url, params)
+        entry = self._read_api_cache(key)
+        extra_headers = {}
+        if entry and entry.get('etag'):
+            extra_headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            extra_headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self._send_request(url, params, extra_headers=extra_headers)
+        if response.status_code == 304 and entry:
+            with self._cache_lock:
+                self.api_cache_stats['not_modified'] += 1
+            try:
+                os.utime(self._api_cache_path(key))  # Still fresh: keep it for LRU eviction
+            except OSError:
+                pass  # Evicted by another run since it was read; the body in hand is still good
+            cached = requests.Response()
+            cached.status_code = 200
+            cached.url = response.url
+            cached.headers.update(response.headers)
+            cached.encoding = 'utf-8'
+            cached._content = entry['body'].encode('utf-8')
+            return cached
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            with self._cache_lock:
+                self.api_cache_stats['stored'] += 1
+            self._write_api_cache(key, {
+                'url': response.url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'stored_at': time.time(),
+                'body': response.text
+            })
+        return response
+
+    def _api_cache_key(self, url, params):
+        """Cache key for a request; includes the token so private data is never shared."""
+        query = json.dumps(params or {}, sort_keys=True)
+        return hashlib.sha256(f"{self.github_token or ''}\n{url}\n{query}".encode('utf-8')).hexdigest()
+
+    def _api_cache_path(self, key):
+        return os.path.join(self.api_cache_dir, key + '.json')
+
+    def _read_api_cache(self, key):
+        """Returns a cached API entry, or None when missing or older than api_cache_ttl."""
+        try:
+            with open(self._api_cache_path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.api_cache_ttl:
+            return None
+        return entry
+
+    def _write_api_cache(self, key, entry):
+        os.makedirs(self.api_cache_dir, exist_ok=True)
+        self._atomic_write(self._api_cache_path(key), json.dumps(entry).encode('utf-8'))
+
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff: uniform(0, min(60, 2 ** attempt)) seconds."""
+        return random.uniform(0, min(60, 2 ** attempt))
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before retrying a response, or None to hand it back as is."""
+        if response.status_code >= 500:
+            return self._backoff_delay(attempt)
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = self._retry_after(response)
+        if retry_after is not None:
+            delay = retry_after
+        elif response.headers.get('X-RateLimit-Remaining') == '0':
+            delay = max(0, float(response.headers.get('X-RateLimit-Reset', 0)) - time.time()) + 1
+        elif response.status_code == 429 or 'secondary rate limit' in response.text.lower():
+            delay = self._backoff_delay(attempt)
+        else:
+            return None  # A real permission problem, not a limit
+
+        if delay > self.max_rate_limit_wait:
+            if not self.wait_for_rate_limit:
+                # Reported as an error instead; the run can be resumed once the limit resets
+                with self._http_lock:
+                    self.rate_limited_until = time.time() + delay
+                response.rate_limited = True  # See is_rate_limited
+                return None
+            resume = time.strftime('%H:%M:%S', time.localtime(time.time() + delay))
+            print(f"[Agent] Rate limit used up, continuing at {resume}")
+        return delay
+
+    def _retry_after(self, response):
+        """
+        Seconds asked for by a Retry-After header, which holds either a number
+        of seconds or an HTTP date. None if absent or unreadable, so the other
+        rate-limit headers or plain backoff decide instead.
+        """
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        from datetime import timezone
+        from email.utils import parsedate_to_datetime
+
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)  # HTTP dates are always GMT
+        return max(0.0, when.timestamp() - time.time())
+
+    def _count_response(self, status):
+        """Counts a GitHub response by status code ('error' when none arrived)."""
+        with self._http_lock:
+            codes = self.http_stats['status_codes']
+            codes[status] = codes.get(status, 0) + 1
+
+    def _record_rate_limit(self, response):
+        """Remembers the latest rate-limit budget reported by GitHub."""
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        budget = self.budget
+        with budget._http_lock:
+            budget.rate_limit_remaining = int(remaining)
+            budget.rate_limit_reset = float(reset)
+
+    def _pace_requests(self, url):
+        """Spreads the remaining API budget evenly until the reset time once it runs low."""
+        if not url.startswith(self.api_base):
+            return  # Raw downloads do not count against the API rate limit
+        budget = self.budget
+        with budget._http_lock:
+            remaining, reset = budget.rate_limit_remaining, budget.rate_limit_reset
+            if remaining is None or remaining > self.rate_limit_reserve:
+                return
+            # Claim a request from the budget so concurrent workers space out too
+            budget.rate_limit_remaining = max(0, remaining - 1)
+        until_reset = reset - time.time()
+        if until_reset <= 0:
+            return
+        delay = until_reset if remaining <= 0 else until_reset / remaining
+        if delay > self.max_rate_limit_wait and not self.wait_for_rate_limit:
+            return  # Let GitHub answer; the 403 is reported to the caller
+        print(f"[Agent] Rate limit low ({remaining} left), waiting {delay:.1f}s")
+        self._wait(delay)
+
+    def _wait(self, seconds):
+        """Sleeps and accounts the time in http_stats."""
+        time.sleep(seconds)
+        with self._http_lock:
+            self.http_stats['wait_seconds'] += seconds
+
+    def parse_repo_url(self, url):
+        """Splits a browser URL into owner, repo, ref and subpath."""
+        parsed = urlparse(url)
+        path_parts = parsed.path.strip('/').split('/')
+
+        if len(path_parts) < 2:
+            raise ValueError("Invalid GitHub URL")
+
+        repo_info = {'owner': path_parts[0], 'repo': path_parts[1], 'ref': None, 'subpath': ""}
+        if len(path_parts) > 3 and path_parts[2] == 'tree':
+            repo_info['ref'] = path_parts[3]
+            repo_info['subpath'] = "/".join(path_parts[4:])
+        return repo_info
+
+    def parse_github_url(self, url):
+        """Converts a browser URL to a GitHub API URL."""
+        repo_info = self.parse_repo_url(url)
+        api_url = f"{self.api_base}/repos/{repo_info['owner']}/{repo_info['repo']}/contents"
+        params = {}
+
+        if repo_info['ref']:
+            api_url = f"{api_url}/{repo_info['subpath']}"
+            params['ref'] = repo_info['ref']
+
+        return api_url, params
+
+    def natural_key(self, string_):
+        """Returns a key for natural sorting."""
+        return [int(s) if s.isdigit() else s.lower() for s in re.split(r'(\d+)', string_)]
+
+    def path_sort_key(self, path):
+        """Natural-sort key for a full path, matching the order of a depth-first walk."""
+        return [self.natural_key(part) for part in path.split('/')]
+
+    def resolve_ref(self, owner, repo, ref=None):
+        """
+        Resolves a branch/tag (or the default branch) to its commit and tree
+        SHAs. The answer is kept, so the listing and the files of a run agree.
+        """
+        key = (owner, repo, ref)
+        if key in self.resolved_refs:
+            return self.resolved_refs[key]
+        repo_api = f"{self.api_base}/repos/{owner}/{repo}"
+        if not ref:
+            response = self.http_get(repo_api)
+            response.raise_for_status()
+            ref = response.json()['default_branch']
+
+        response = self.http_get(f"{repo_api}/commits/{ref}")
+        response.raise_for_status()
+        commit = response.json()
+        self.resolved_refs[key] = commit['sha'], commit['commit']['tree']['sha']
+        return self.resolved_refs[key]
+
+    def matches_target(self, path, subpath, target_extensions):
+        """True if a repository path lies under subpath and has a wanted extension."""
+        if subpath and path != subpath and not path.startswith(subpath + '/'):
+            return False
+        return any(path.endswith(ext) for ext in target_extensions)
+
+    def fetch_tree_manifest(self, repo_info, target_extensions):
+        """
+        Lists the whole repository with a single recursive trees request and
+        filters it locally. Returns None if GitHub truncated the listing.
+        """
+        owner, repo, subpath = repo_info['owner'], repo_info['repo'], repo_info['subpath']
+        commit_sha, tree_sha = self.resolve_ref(owner, repo, repo_info['ref'])
+
+        tree_url = f"{self.api_base}/repos/{owner}/{repo}/git/trees/{tree_sha}"
+        print(f"[Agent] Fetching tree: {tree_url}")
+        response = self.http_get(tree_url, params={'recursive': 1})
+        response.raise_for_status()
+        tree = response.json()
+        if tree.get('truncated'):
+            return None
+
+        manifest = []
+        for entry in tree['tree']:
+            path = entry['path']
+            if entry['type'] != 'blob' or not self.matches_target(path, subpath, target_extensions):
+                continue
+            manifest.append({
+                'type': 'file',
+                'name': path.rsplit('/', 1)[-1],
+                'path': path,
+                'sha': entry['sha'],
+                'size': entry.get('size', 0),
+                'download_url': f"{self.raw_base}/{owner}/{repo}/{commit_sha}/{quote(path)}"
+            })
+
+        manifest.sort(key=lambda item: self.path_sort_key(item['path']))
+        return manifest
+
+    def discover_files(self, folder_url, target_extensions):
+        """Builds the list of files to process, preferring the trees API over a directory walk."""
+        if self.source_mode == "local":
+            return self.scan_local_files(folder_url, target_extensions)
+        if self.source_mode == "git":
+            return self.list_git_files(folder_url, target_extensions)
+        manifest = self.fetch_tree_manifest(self.parse_repo_url(folder_url), target_extensions)
+        if manifest is None:
+            print("[Agent] Tree listing truncated, falling back to directory walk")
+            api_url, params = self.parse_github_url(folder_url)
+            manifest = self.fetch_files_recursive(api_url, params, target_extensions)
+        return manifest
+
+    def fetch_archive_files(self, folder_url, target_extensions, manifest=None):
+        """
+        Streams the repository tarball once and yields (file_item, content) for
+        every matching member; nothing is extracted to disk. Given manifest (the
+        fetch_tree_manifest listing of the same ref), members come in its order,
+        with content None for the ones left out, and only members that arrive
+        before their turn are held back. Without one, they come in path order
+        once the whole archive is read. Held members past archive_holdback_chars
+        wait in a temporary file.
+        """
+        repo_info = self.parse_repo_url(folder_url)
+        owner, repo, subpath = repo_info['owner'], repo_info['repo'], repo_info['subpath']
+        commit_sha, _ = self.resolve_ref(owner, repo, repo_info['ref'])
+        manifest = manifest or []
+        listed = {file_item['path'] for file_item in manifest}
+        held = HeldBackMembers(self.archive_holdback_chars)
+        position = 0  # Next manifest entry to yield
+
+        tarball_url = f"{self.api_base}/repos/{owner}/{repo}/tarball/{commit_sha}"
+        print(f"[Agent] Streaming archive: {tarball_url}")
+        try:
+            with self.http_get(tarball_url, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+                    for member in archive:
+                        # Members live under a "<owner>-<repo>-<sha>/" top-level directory
+                        path = member.name.split('/', 1)[-1]
+                        if not self.matches_target(path, subpath, target_extensions):
+                            continue
+                        if not member.isfile() and path not in listed:
+                            continue
+                        file_item = {'type': 'file', 'name': path.rsplit('/', 1)[-1], 'path': path, 'size': member.size}
+                        content = None  # A symlink the listing counts as a blob is left out
+                        if member.isfile():
+                            try:
+                                self.check_size(file_item)
+                                raw = archive.extractfile(member).read(self.max_file_bytes + 1)
+                                content = self.decode_content(file_item, raw)
+                            except SkippedFile as e:
+                                self.skipped_files.append((path, str(e)))
+
+                        if position < len(manifest) and path == manifest[position]['path']:
+                            yield file_item, content
+                            position += 1
+                            while position < len(manifest) and manifest[position]['path'] in held:
+                                yield held.pop(manifest[position]['path'])
+                                position += 1
+                        else:
+                            held.put(file_item, content)
+                with self._http_lock:
+                    self.downloaded_bytes += response.raw.tell()
+
+            for file_item in manifest[position:]:
+                if file_item['path'] in held:
+                    yield held.pop(file_item['path'])
+                else:
+                    self.skipped_files.append((file_item['path'], "not in the repository archive"))
+                    yield file_item, None
+            for path in sorted(held.members, key=self.path_sort_key):
+                yield held.pop(path)
+        finally:
+            held.close()
+
+    def highlight_ahead(self, members):
+        """
+        Yields (file_item, content, runs) for (file_item, content) pairs in the
+        same order, highlighting up to 2 * max_workers of them ahead on worker
+        threads (which feed the tokenizer processes). runs is None without content.
+        """
+        window = max(1, self.max_workers) * 2
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            pending = deque()
+            for file_item, content in members:
+                future = executor.submit(self.highlight, file_item, content) if content is not None else None
+                pending.append((file_item, content, future))
+                if len(pending) >= window:
+                    file_item, content, future = pending.popleft()
+                    yield file_item, content, future and future.result()
+            while pending:
+                file_item, content, future = pending.popleft()
+                yield file_item, content, future and future.result()
+
+    def fetch_files_recursive(self, api_url, params, target_extensions, manifest=None):
+        """Recursively lists matching files through the contents API."""
+        if manifest is None:
+            manifest = []
+        print(f"[Agent] Checking: {api_url}")
+        try:
+            response = self.http_get(api_url, params)
+            response.raise_for_status()
+            items = response.json()
+        except Exception as e:
+            print(f"[Error] Failed to fetch folder contents: {e}")
+            return manifest
+
+        if isinstance(items, dict):
+            items = [items]
+        
+        if isinstance(items, list):
+            items.sort(key=lambda x: self.natural_key(x['name']))
+
+        for item in items:
+            if item['type'] == 'file':
+                if any(item['name'].endswith(ext) for ext in target_extensions):
+                    manifest.append(item)
+            
+            elif item['type'] == 'dir':
+                self.fetch_files_recursive(item['url'], params, target_extensions, manifest)
+
+        return manifest
+
+    def scan_local_files(self, folder, target_extensions):
+        """
+        Lists matching files under a local directory with os.scandir. Paths are
+        relative to the enclosing git work tree when there is one, so they read
+        the same as in the GitHub listing.
+        """
+        folder = os.path.abspath(folder)
+        if not os.path.isdir(folder):
+            raise ValueError(f"Not a directory: {folder}")
+        root = folder
+        while not os.path.exists(os.path.join(root, '.git')):
+            parent = os.path.dirname(root)
+            if parent == root:
+                root = folder  # Not inside a work tree
+                break
+            root = parent
+
+        manifest = []
+        pending = [folder]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != '.git':
+                            pending.append(entry.path)
+                    elif entry.is_file() and any(entry.name.endswith(ext) for ext in target_extensions):
+                        manifest.append({
+                            'type': 'file',
+                            'name': entry.name,
+                            'path': os.path.relpath(entry.path, root).replace(os.sep, '/'),
+                            'size': entry.stat().st_size,
+                            'local_path': entry.path
+                        })
+
+        manifest.sort(key=lambda item: self.path_sort_key(item['path']))
+        return manifest
+
+    def _git(self, repo_dir, *args):
+        """Runs a git command in repo_dir and returns its output."""
+        result = subprocess.run(['git', '-C', repo_dir, *args], capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"git {args[0]} failed")
+        return result.stdout.decode('utf-8', 'surrogateescape')
+
+    def list_git_files(self, target, target_extensions):
+        """
+        Lists the matching blobs of git_ref in a local repository with a single
+        ls-tree call; nothing is checked out. target is the repository or a
+        folder inside it, which only needs to exist at git_ref.
+        """
+        repo_dir, missing = os.path.abspath(target), []
+        while not os.path.isdir(repo_dir):
+            repo_dir, name = os.path.split(repo_dir)
+            missing.insert(0, name)
+        prefix = self._git(repo_dir, 'rev-parse', '--show-prefix').strip()
+        subpath = (prefix + '/'.join(missing)).strip('/')
+        try:
+            commit_sha = self._git(repo_dir, 'rev-parse', '--verify', f"{self.git_ref}^{{commit}}").strip()
+        except RuntimeError:
+            raise RuntimeError(f"'{self.git_ref}' is not a branch, tag or commit of {repo_dir}") from None
+        self.git_dir = repo_dir
+        print(f"[Agent] Reading {self.git_ref} ({commit_sha[:12]}) from {repo_dir}")
+
+        manifest = []
+        for line in self._git(repo_dir, 'ls-tree', '-r', '-l', '-z', '--full-tree', commit_sha).split('\0'):
+            if not line:
+                continue
+            meta, path = line.split('\t', 1)
+            _, kind, sha, size = meta.split()
+            if kind != 'blob' or not self.matches_target(path, subpath, target_extensions):
+                continue
+            manifest.append({
+                'type': 'file',
+                'name': path.rsplit('/', 1)[-1],
+                'path': path,
+                'sha': sha,
+                'size': int(size)
+            })
+
+        manifest.sort(key=lambda item: self.path_sort_key(item['path']))
+        return manifest
+
+    def read_git_blob(self, sha):
+        """
+        Reads a blob from the object store through one long-running
+        git cat-file --batch, keeping at most max_file_bytes + 1 bytes.
+        """
+        with self._git_lock:
+            if self._git_batch is None:
+                self._git_batch = subprocess.Popen(['git', '-C', self.git_dir, 'cat-file', '--batch'],
+                                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            batch = self._git_batch
+            try:
+                batch.stdin.write(sha.encode('ascii') + b'\n')
+                batch.stdin.flush()
+            except OSError:
+                self._drop_git_batch(sha)
+            line = batch.stdout.readline()
+            if not line:
+                self._drop_git_batch(sha)
+            header = line.split()
+            if len(header) != 3:
+                raise RuntimeError(f"blob {sha} is missing from the repository")
+            size = int(header[2])
+            wanted = min(size, self.max_file_bytes + 1)
+            raw = batch.stdout.read(wanted)
+            if len(raw) < wanted:
+                self._drop_git_batch(sha)
+            remaining = size - len(raw) + 1  # The rest of the blob, then a newline
+            while remaining:
+                chunk = batch.stdout.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    self._drop_git_batch(sha)
+                remaining -= len(chunk)
+        return raw
+
+    def _drop_git_batch(self, sha):
+        """
+        Stops a git cat-file process whose pipe closed mid-answer and raises;
+        the next read starts a new one. Called with _git_lock held.
+        """
+        batch, self._git_batch = self._git_batch, None
+        batch.kill()
+        batch.wait()
+        batch.stdout.close()
+        try:
+            batch.stdin.close()
+        except OSError:
+            pass  # Unflushed bytes for a process that is gone
+        raise RuntimeError(f"git cat-file stopped while reading blob {sha}")
+
+    def close_git(self):
+        """Stops the git cat-file process, if one was started."""
+        with self._git_lock:
+            if self._git_batch is not None:
+                self._git_batch.stdin.close()
+                self._git_batch.wait()
+                self._git_batch = None
+
+    def read_local_file(self, file_item):
+        """Raw bytes of a file from a local source, at most max_file_bytes + 1 of them."""
+        if self.source_mode == "git":
+            return self.read_git_blob(file_item['sha'])
+        with open(file_item['local_path'], 'rb') as f:
+            return f.read(self.max_file_bytes + 1)
+
+    def _add_styled_paragraph(self, doc, text, style_id):
+        """
+        Same result as doc.add_paragraph(text, style), without python-docx's
+        slow style lookup by name and its character-by-character text handling.
+        """
+        paragraph = doc.add_paragraph()
+        p = paragraph.paragraph_format.element
+        p.style = style_id
+        if text:
+            self._append_text(p.add_r(), text)
+        return paragraph
+
+    def _add_highlighted_paragraph(self, doc, runs, style_id):
+        """
+        Adds a paragraph with one run per (text, [color, bold, italic]) entry.
+        The XML is built as a string and parsed in one go, which is several
+        times faster than creating every run through python-docx.
+        """
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+
+        xml = [f'<w:body {nsdecls("w")}><w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>']
+        for text, look in runs:
+            xml.append('<w:r>')
+            if look and any(look):
+                color, bold, italic = look
+                xml.append('<w:rPr>')
+                if bold:
+                    xml.append('<w:b/>')
+                if italic:
+                    xml.append('<w:i/>')
+                if color:
+                    xml.append(f'<w:color w:val="{color.upper()}"/>')
+                xml.append('</w:rPr>')
+            xml.append(self._text_xml(text))
+            xml.append('</w:r>')
+        xml.append('</w:p></w:body>')
+        # Copying detaches the paragraph from the parser's scratch document;
+        # moving it across documents directly costs ~50 us per run in lxml.
+        p = copy.deepcopy(parse_xml(''.join(xml))[0])
+        body = doc.element.body
+        if body.sectPr is not None:
+            body.sectPr.addprevious(p)
+        else:
+            body.append(p)
+
+    def _text_xml(self, text):
+        """WordprocessingML for a run's text: w:t pieces separated by w:tab / w:br."""
+        xml = []
+        for piece in self._TEXT_BREAKS.split(text):
+            if piece == '\t':
+                xml.append('<w:tab/>')
+            elif piece in ('\r\n', '\r', '\n'):
+                xml.append('<w:br/>')
+            elif piece:
+                space = ' xml:space="preserve"' if piece.strip() != piece else ''
+                xml.append(f'<w:t{space}>{html_escape(piece, quote=False)}</w:t>')
+        return ''.join(xml)
+
+    def _append_text(self, r, text):
+        """Adds text to a w:r element, turning tabs and line breaks into their own elements."""
+        for piece in self._TEXT_BREAKS.split(text):
+            if piece == '\t':
+                r.add_tab()
+            elif piece in ('\r\n', '\r', '\n'):  # One break per line, whatever the line endings
+                r.add_br()
+            elif piece:
+                r.add_t(piece)
+
+    def _blob_cache_path(self, sha):
+        """Location of a cached blob: <cache_dir>/<sha[:2]>/<sha[2:]>[.z]."""
+        suffix = '.z' if self.cache_compress else ''
+        return os.path.join(self.cache_dir, sha[:2], sha[2:] + suffix)
+
+    def read_cached_blob(self, sha):
+        """Returns the cached text for a blob SHA, or None on a miss."""
+        if not self.cache_dir or not sha:
+            return None
+        path = self._blob_cache_path(sha)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for LRU eviction
+        except OSError:
+            return None  # Missing, or evicted by another job meanwhile
+        try:
+            if self.cache_compress:
+                data = zlib.decompress(data)
+            return data.decode('utf-8')
+        except (zlib.error, UnicodeDecodeError):
+            # Corrupt, e.g. cut short by a full disk: drop it so the download replaces it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def store_blob(self, sha, raw_bytes, text):
+        """
+        Writes a downloaded blob to the cache. The body is only stored if it
+        hashes to the expected git blob SHA, and lands atomically via rename
+        so concurrent jobs never see a partial file.
+        """
+        if not self.cache_dir or not sha:
+            return
+        git_sha = hashlib.sha1(b"blob %d\0" % len(raw_bytes) + raw_bytes).hexdigest()
+        if git_sha != sha:
+            return
+        data = text.encode('utf-8')
+        if self.cache_compress:
+            data = zlib.compress(data, 6)
+        path = self._blob_cache_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._atomic_write(path, data)
+
+    def _atomic_write(self, path, data):
+        """Writes to a temp file and renames it into place so readers never see partial data."""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict_caches(self):
+        """Trims the blob and API caches to their size limits."""
+        if self.cache_dir:
+            self._evict_lru(self.cache_dir, self.cache_max_bytes)
+        if self.api_cache_dir:
+            self._evict_lru(self.api_cache_dir, self.api_cache_max_bytes)
+
+    def _evict_lru(self, directory, max_bytes):
+        """Deletes least recently used files until the directory fits max_bytes."""
+        if not os.path.isdir(directory):
+            return
+        entries = []
+        total = 0
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue  # Another job is still writing this one
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def render_options(self):
+        """Settings that change how a file is rendered; stored fragments are only reused if they match."""
+        return {'format': 3, 'max_file_bytes': self.max_file_bytes, 'chunk_chars': self.chunk_chars,
+                'highlight': self.highlight_theme}
+
+    def load_previous_manifest(self):
+        """Loads the per-file fragments saved by the last run, or {} if unusable."""
+        try:
+            with open(self.manifest_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('render_options') != self.render_options():
+            return {}
+        return data.get('files', {})
+
+    def save_manifest(self):
+        """Stores path -> blob SHA and rendered fragment for the next incremental run."""
+        data = {
+            'source_url': self.source_url,
+            'render_options': self.render_options(),
+            'files': self.rendered_fragments
+        }
+        self._atomic_write(self.manifest_path(), json.dumps(data).encode('utf-8'))
+
+    def save_checkpoint(self):
+        """
+        Saves the file list and every fragment rendered so far, so an interrupted
+        run (crash, lost connection, exhausted rate limit) continues where it stopped
+        when started again. Fragments of the last completed run are kept until replaced.
+        """
+        data = {
+            'source_url': self.source_url,
+            'render_options': self.render_options(),
+            'files': self.checkpoint_fragments(),
+            'resume': self.checkpoint
+        }
+        self._atomic_write(self.manifest_path(), json.dumps(data).encode('utf-8'))
+        self.last_checkpoint = time.monotonic()
+
+    def checkpoint_fragments(self):
+        """Incremental records a checkpoint keeps: last run's, overridden by this run's so far."""
+        return dict(self.previous_fragments, **self.rendered_fragments)
+
+    def maybe_checkpoint(self):
+        """Saves a checkpoint if the last one is more than checkpoint_interval seconds old."""
+        if self.checkpoint and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def load_checkpoint(self, folder_url, target_extensions):
+        """The file list of an interrupted run of the same conversion, or None."""
+        try:
+            with open(self.manifest_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        resume = data.get('resume')
+        if (not resume or data.get('source_url') != folder_url
+                or resume.get('target_extensions') != list(target_extensions)):
+            return None
+        return resume['manifest']
+
+    def _body_end(self, doc):
+        """Index at which new body content is inserted (just before the final sectPr)."""
+        body = doc.element.body
+        return len(body) - (1 if body.sectPr is not None else 0)
+
+    def format_size(self, num_bytes):
+        """Human-readable size, e.g. 1.5 MB."""
+        for unit in ('bytes', 'KB', 'MB'):
+            if num_bytes < 1024 or unit == 'MB':
+                return f"{num_bytes} {unit}" if unit == 'bytes' else f"{num_bytes:.1f} {unit}"
+            num_bytes /= 1024
+
+    def check_size(self, file_item):
+        """Raises SkippedFile for an oversized file when large files are skipped rather than truncated."""
+        size = file_item.get('size', 0)
+        if size > self.max_file_bytes and self.large_file_mode == "skip":
+            raise SkippedFile(f"{self.format_size(size)}, over the {self.format_size(self.max_file_bytes)} limit")
+
+    def truncation_note(self, file_item):
+        """Describes how much of a truncated file made it into the report."""
+        note = f"truncated to the first {self.format_size(self.max_file_bytes)}"
+        if file_item.get('size'):
+            note += f" of {self.format_size(file_item['size'])}"
+        return note
+
+    def read_capped(self, response, limit):
+        """Reads a streamed body, stopping once more than limit bytes have arrived."""
+        chunks, total = [], 0
+        for chunk in response.iter_content(64 * 1024):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total > limit:
+                break
+        return b''.join(chunks)
+
+    def decode_content(self, file_item, raw):
+        """
+        Turns file bytes into text that is safe to put in a document: cuts
+        oversized files at a line end, rejects binary data, falls back to
+        Windows-1252 for non-UTF-8 files and strips characters XML cannot hold.
+        """
+        truncated = len(raw) > self.max_file_bytes
+        if truncated:
+            cut = raw.rfind(b'\n', 0, self.max_file_bytes)
+            raw = raw[:cut + 1] if cut > 0 else raw[:self.max_file_bytes]
+            file_item['truncated'] = True
+        if b'\0' in raw[:8000]:  # Same heuristic git uses
+            raise SkippedFile("binary file")
+        try:
+            text = raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if truncated and e.reason == 'unexpected end of data':  # Cut inside a multi-byte character
+                text = raw[:e.start].decode('utf-8', errors='replace')
+            else:
+                text = raw.decode('cp1252', errors='replace')
+        return self._XML_ILLEGAL.sub('', text)
+
+    def chunk_spans(self, code_content):
+        """Yields (start, end) offsets of pieces of at most chunk_chars characters, breaking at line ends."""
+        start = 0
+        while len(code_content) - start > self.chunk_chars:
+            end = code_content.rfind('\n', start, start + self.chunk_chars)
+            if end <= start:
+                end = start + self.chunk_chars
+                yield start, end
+                start = end
+            else:
+                yield start, end
+                start = end + 1
+        yield start, len(code_content)
+
+    def split_code(self, code_content):
+        """Yields the code in pieces of at most chunk_chars characters, breaking at line ends."""
+        for start, end in self.chunk_spans(code_content):
+            yield code_content[start:end]
+
+    def split_runs(self, runs):
+        """Groups highlighted runs into the same pieces split_code makes of the plain text."""
+        spans = self.chunk_spans(''.join(text for text, _ in runs))
+        start, end = next(spans)
+        chunk, pos = [], 0
+        for text, look in runs:
+            run_start, pos = pos, pos + len(text)
+            while True:
+                lo, hi = max(run_start, start), min(pos, end)
+                if hi > lo:
+                    chunk.append((text[lo - run_start:hi - run_start], look))
+                if pos <= end:
+                    break
+                yield chunk
+                chunk = []
+                start, end = next(spans)
+        yield chunk
+
+    def _runs_cache_path(self, file_item):
+        """Location of cached runs: <cache_dir>/runs/<theme>/<sha[:2]>/<sha[2:]>-<ext>.z"""
+        sha = file_item['sha']
+        ext = os.path.splitext(file_item['name'])[1].lower().lstrip('.') or file_item['name']
+        return os.path.join(self.cache_dir, 'runs', self.highlight_theme, sha[:2], f"{sha[2:]}-{ext}.z")
+
+    def highlight(self, file_item, code_content):
+        """
+        Returns the highlighted runs for one file, or None when highlighting is
+        off or the file type is unknown. Runs are cached by blob SHA and theme,
+        and tokenizing happens in a process pool so it scales across cores.
+        """
+        if not self.highlight_theme:
+            return None
+        cacheable = self.cache_dir and file_item.get('sha') and not file_item.get('truncated')
+        if cacheable:
+            path = self._runs_cache_path(file_item)
+            try:
+                with open(path, 'rb') as f:
+                    return json.loads(zlib.decompress(f.read()))
+            except (OSError, ValueError, zlib.error):
+                pass
+        if self.highlight_workers > 1:
+            future = self._get_highlight_pool().submit(tokenize_code, file_item['name'], code_content, self.highlight_theme)
+            runs = future.result()
+        else:
+            runs = tokenize_code(file_item['name'], code_content, self.highlight_theme)
+        if cacheable:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._atomic_write(path, zlib.compress(json.dumps(runs).encode('utf-8'), 6))
+        return runs
+
+    def _get_highlight_pool(self):
+        with self._highlight_lock:
+            if self._highlight_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Download threads are running by now; a forked child could inherit one of their locks held
+                self._highlight_pool = ProcessPoolExecutor(max_workers=self.highlight_workers,
+                                                           mp_context=multiprocessing.get_context('spawn'))
+            return self._highlight_pool
+
+    def close_highlight_pool(self):
+        """Stops the tokenizer processes, if any were started."""
+        with self._highlight_lock:
+            if self._highlight_pool is not None:
+                self._highlight_pool.shutdown()
+                self._highlight_pool = None
+
+    def graphql_batches(self, manifest):
+        """
+        Groups the files of a "graphql" run into queries of at most
+        graphql_batch_files blobs and graphql_batch_bytes bytes, in manifest
+        order. Returns a deque of (position of the first file, batch). Files
+        that are too large or already cached are left to raw downloads.
+        """
+        batches = deque()
+        if self.source_mode != "graphql":
+            return batches
+        if not self.github_token:
+            print("[Agent] GraphQL needs a token, downloading files one by one")
+            return batches
+        repo_info = self.parse_repo_url(self.source_url)
+        self.repository = (repo_info['owner'], repo_info['repo'])
+        batch, batch_bytes, first = [], 0, 0
+        for position, file_item in enumerate(manifest):
+            size = file_item.get('size', 0)
+            if not file_item.get('sha') or size > min(self.max_file_bytes, self.graphql_batch_bytes):
+                continue  # Oversized files are truncated from a streamed raw download
+            if self.cache_dir and os.path.exists(self._blob_cache_path(file_item['sha'])):
+                continue
+            if self.reusable_fragment(file_item):
+                continue
+            if batch and (len(batch) == self.graphql_batch_files or batch_bytes + size > self.graphql_batch_bytes):
+                batches.append((first, batch))
+                batch, batch_bytes = [], 0
+            if not batch:
+                first = position
+            batch.append(file_item)
+            batch_bytes += size
+        if batch:
+            batches.append((first, batch))
+        return batches
+
+    def submit_graphql_batches(self, executor, batches, position):
+        """
+        Starts the batches whose first file is coming up. A batch is always
+        submitted before the downloads of its files, so the pool (which starts
+        tasks in order) never has every worker waiting on a batch not yet running.
+        """
+        lookahead = max(1, self.max_workers) * 2 + self.graphql_batch_files
+        while batches and batches[0][0] <= position + lookahead:
+            batch = batches.popleft()[1]
+            future = executor.submit(self.fetch_graphql_batch, batch)
+            for file_item in batch:
+                self.graphql_futures[file_item['path']] = future
+
+    def fetch_graphql_batch(self, batch):
+        """
+        Fetches the blobs of a batch with one GraphQL query and returns
+        {sha: bytes} for the ones it got exactly. Binary blobs and text that
+        does not encode back to byteSize bytes are left out and downloaded raw.
+        A batch that fails as a whole, as large responses do when GitHub times
+        out, is split in half and retried.
+        """
+        import requests
+
+        if self.graphql_disabled:
+            return {}
+        shas = list(dict.fromkeys(file_item['sha'] for file_item in batch))
+        fields = ' '.join(f'b{i}: object(oid: "{sha}") {{ ... on Blob {{ text byteSize isBinary }} }}'
+                          for i, sha in enumerate(shas))
+        owner, name = self.repository
+        query = {
+            'query': f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}",
+            'variables': {'owner': owner, 'name': name}
+        }
+        with self._http_lock:
+            self.graphql_stats['queries'] += 1
+        try:
+            response = self._send_request(f"{self.api_base}/graphql", json_body=query, max_retries=1)
+            result = response.json() if response.status_code == 200 else {}
+        except (requests.exceptions.RequestException, ValueError):
+            response, result = None, {}
+        if response is not None:
+            with self._http_lock:
+                self.downloaded_bytes += len(response.content)
+
+        repository = (result.get('data') or {}).get('repository')
+        if repository is None:
+            error_types = {error.get('type') for error in result.get('errors', [])}
+            if response is not None and (response.status_code in (401, 403, 404)
+                                         or error_types & {'NOT_FOUND', 'FORBIDDEN', 'INSUFFICIENT_SCOPES'}):
+                if not self.graphql_disabled:
+                    self.graphql_disabled = True
+                    print(f"[Agent] GraphQL unavailable (HTTP {response.status_code}), downloading files one by one")
+                return {}
+            if len(batch) == 1:
+                return {}
+            with self._http_lock:
+                self.graphql_stats['splits'] += 1
+            print(f"[Agent] GraphQL query for {len(batch)} files failed, splitting it")
+            half = len(batch) // 2
+            blobs = self.fetch_graphql_batch(batch[:half])
+            blobs.update(self.fetch_graphql_batch(batch[half:]))
+            return blobs
+
+        blobs = {}
+        for i, sha in enumerate(shas):
+            blob = repository.get(f'b{i}')
+            if not blob or blob.get('isBinary') or blob.get('text') is None:
+                continue
+            raw = blob['text'].encode('utf-8')
+            if len(raw) == blob.get('byteSize'):
+                blobs[sha] = raw
+        with self._http_lock:
+            self.graphql_stats['files'] += sum(1 for file_item in batch if file_item['sha'] in blobs)
+        return blobs
+
+    def batched_blob(self, file_item):
+        """The bytes of a file fetched by its GraphQL batch, or None to download it raw."""
+        future = self.graphql_futures.pop(file_item['path'], None)
+        if future is None:
+            return None
+        raw = future.result().get(file_item['sha'])
+        if raw is None:
+            with self._http_lock:
+                self.graphql_stats['fallbacks'] += 1
+        return raw
+
+    def download_file(self, file_item):
+        """Returns the content of one file, from the blob cache when possible."""
+        self.check_size(file_item)
+        if self.source_mode in ("local", "git"):
+            # Already on disk, and cheaper to read than the blob cache
+            return self.decode_content(file_item, self.read_local_file(file_item))
+        sha = file_item.get('sha')
+        # The cache only holds complete files, so oversized ones always go to the network
+        cached = self.read_cached_blob(sha) if file_item.get('size', 0) <= self.max_file_bytes else None
+        if cached is not None:
+            with self._cache_lock:
+                self.cache_stats['hits'] += 1
+                self.cache_stats['bytes_saved'] += file_item.get('size', 0)
+            return cached
+
+        raw = self.batched_blob(file_item)
+        if raw is None:
+            print(f"[Agent] Downloading: {file_item['name']}...")
+            with self.http_get(file_item['download_url'], stream=True) as content_resp:
+                content_resp.raise_for_status()
+                raw = self.read_capped(content_resp, self.max_file_bytes)
+            with self._http_lock:
+                self.downloaded_bytes += len(raw)
+        code_content = self.decode_content(file_item, raw)
+        if self.cache_dir:
+            with self._cache_lock:
+                self.cache_stats['misses'] += 1
+            self.store_blob(sha, raw, code_content)
+        return code_content
+
+    def process_files(self, manifest):
+        """
+        Downloads files on a bounded thread pool while rendering them one by one
+        in manifest order, so the output is identical to a sequential run.
+        """
+        window = max(1, self.max_workers) * 2
+        batches = self.graphql_batches(manifest)
+        pool = self.download_pool or ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+        with nullcontext(pool) if self.download_pool else pool as executor:
+            pending = deque()
+            for position, file_item in enumerate(manifest):
+                record = self.reusable_fragment(file_item)
+                if record:
+                    future = None  # Unchanged since the last run: reuse its fragment
+                else:
+                    self.submit_graphql_batches(executor, batches, position)
+                    future = executor.submit(self._timed_download, file_item)
+                pending.append((file_item, future, record))
+                if len(pending) >= window:
+                    self._render_next(pending)
+            while pending:
+                self._render_next(pending)
+        self.graphql_futures.clear()
+
+    def reusable_fragment(self, file_item):
+        """The previous run's fragment of a file whose blob SHA has not changed, or None."""
+        record = self.previous_fragments.get(file_item['path'])
+        if record and record['sha'] and record['sha'] == file_item.get('sha'):
+            return record
+        return None
+
+    def _render_next(self, pending):
+        """Renders the oldest pending download, waiting for it if need be."""
+        self._render_download(*pending.popleft())
+        self.maybe_checkpoint()
+
+    def _timed_download(self, file_item):
+        """Downloads and highlights one file and reports how long it took."""
+        started = time.perf_counter()
+        code_content = self.download_file(file_item)
+        runs = self.highlight(file_item, code_content)
+        return code_content, runs, time.perf_counter() - started
+
+    def add_skipped_appendix(self, doc, entries):
+        """Lists the files that were skipped or truncated at the end of a document."""
+        self._add_styled_paragraph(doc, "Appendix: Skipped and Truncated Files", 'Heading1')
+        for path, reason in sorted(entries, key=lambda entry: self.path_sort_key(entry[0])):
+            doc.add_paragraph(f"{path}: {reason}", style='List Bullet')
+
+
+def batch_output_name(url):
+    """File-system friendly name for one repository of a batch, e.g. owner_repo_main_src."""
+    parts = [part for part in urlparse(url).path.strip('/').split('/') if part != 'tree']
+    return re.sub(r'[^\w.-]+', '_', '_'.join(parts)).strip('_') or 'report'
+
+
+def run_batch(agent_class, targets, target_extensions, output_directory, output_suffix="",
+              parallel_repos=4, max_workers=8, summary_path=None, **options):
+    """
+    Converts many repositories in one go. parallel_repos of them are listed
+    and rendered at a time, while all downloads share one pool of max_workers
+    threads, one HTTP session and one GitHub rate-limit budget (the caches on
+    disk are shared anyway). A target is a URL or local path, or a dict with
+    'url' and optionally 'output' and 'ref' (the git_ref of source_mode "git").
+    options are agent_class arguments for every repository, and each one is
+    written to output_directory under its batch_output_name plus output_suffix. Prints a
+    summary per repository, saves it to summary_path as JSON if given, and
+    returns it.
+    """
+    entries = [target if isinstance(target, dict) else {'url': target} for target in targets]
+    os.makedirs(output_directory, exist_ok=True)
+    lead = agent_class(output_directory, max_workers=max_workers + parallel_repos, **options)  # Holds the shared session and budget; never runs
+    summary = [None] * len(entries)
+    started = time.perf_counter()
+
+    def convert(index):
+        entry = entries[index]
+        output = entry.get('output') or os.path.join(output_directory, batch_output_name(entry['url']) + output_suffix)
+        agent_options = dict(options, git_ref=entry['ref']) if entry.get('ref') else options
+        agent = agent_class(output, max_workers=max_workers, **agent_options)
+        agent.join_batch(lead, download_pool)
+        began = time.perf_counter()
+        print(f"[Batch] ({index + 1}/{len(entries)}) {entry['url']}")
+        agent.run(entry['url'], target_extensions)
+        summary[index] = {
+            'url': entry['url'], 'output': output,
+            'status': 'failed' if agent.error else 'completed', 'error': agent.error,
+            'files': agent.total_files, 'failed_files': len(agent.failed_files),
+            'skipped_files': len(agent.skipped_files), 'requests': agent.http_stats['requests'],
+            'wait_seconds': round(agent.http_stats['wait_seconds'], 3),
+            'queued_seconds': round(began - started, 3), 'seconds': round(time.perf_counter() - began, 3)
+        }
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as download_pool:
+            with ThreadPoolExecutor(max_workers=max(1, parallel_repos)) as repo_pool:
+                list(repo_pool.map(convert, range(len(entries))))
+    finally:
+        lead.close_highlight_pool()
+
+    elapsed = time.perf_counter() - started
+    failed = [repo for repo in summary if repo['status'] == 'failed']
+    print(f"\n[Batch] {len(summary)} repositories in {elapsed:.1f}s: {len(summary) - len(failed)} converted, "
+          f"{len(failed)} failed; {sum(repo['requests'] for repo in summary)} request(s), "
+          f"{sum(repo['wait_seconds'] for repo in summary):.1f}s waiting on limits/backoff")
+    for repo in summary:
+        result = f"-> {repo['output']}" if repo['status'] == 'completed' else f"FAILED: {repo['error']}"
+        print(f"  {repo['seconds']:7.1f}s {repo['files']:5} file(s) {repo['requests']:5} request(s)  {repo['url']} {result}")
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 3), 'repos': summary}, f, indent=2)
+    return summary
@@ -0,0 +1,198 @@
+"""
+Converts a GitHub folder (or a local folder or git repository) into a single
+Word document, with every matching file under its own heading.
+"""
+import datetime
+import time
+from docx.shared import RGBColor
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+
+from . import core
+from .core import BaseAgent, SkippedFile
+
+
+class GitHubFolderAgent(BaseAgent):
+    def __init__(self, output_filename="Cpp_Subfolder_Report.docx", **options):
+        super().__init__(**options)
+        self.output_filename = output_filename
+        self.doc = self.new_document()
+
+    def render_file(self, file_item, code_content, runs=None):
+        """Formats one file's content beautifully in Word."""
+        name = file_item['name']
+        path = file_item['path']
+
+        # --- STYLING IMPROVEMENTS HERE ---
+
+        # 1. Filename Heading
+        self._add_styled_paragraph(self.doc, name, 'Heading1')
+
+        # 2. File Path (Subtle, gray, italic)
+        self._add_styled_paragraph(self.doc, f"Full Path: {path}", 'FilePath')
+        if file_item.get('truncated'):
+            note = self.truncation_note(file_item)
+            self._add_styled_paragraph(self.doc, f"Note: {note}", 'FilePath')
+            self.skipped_files.append((path, note))
+
+        # 3. The Code Block (The "Pretty" Part)
+        # Font, shading and spacing all come from the 'Code Block' style
+        if runs:
+            for chunk in self.split_runs(runs):
+                self._add_highlighted_paragraph(self.doc, chunk, 'CodeBlock')
+        else:
+            for chunk in self.split_code(code_content):
+                self._add_styled_paragraph(self.doc, chunk, 'CodeBlock')
+
+        self.doc.add_page_break()
+
+    def manifest_path(self):
+        """Incremental manifest kept next to the generated document."""
+        return self.output_filename + '.manifest.json'
+
+    def _capture_fragment(self, doc, file_item, start, seconds):
+        """Serialises the body elements a file produced so a later run can reuse them."""
+        elements = list(doc.element.body)[start:self._body_end(doc)]
+        self.rendered_fragments[file_item['path']] = {
+            'sha': file_item.get('sha'),
+            'seconds': seconds,
+            'fragment': ''.join(etree.tostring(el, encoding='unicode') for el in elements)
+        }
+
+    def _reuse_fragment(self, doc, file_item, record):
+        """Appends a fragment stored by a previous run instead of downloading and rendering."""
+        body = doc.element.body
+        for el in list(parse_xml(f"<w:body {nsdecls('w')}>{record['fragment']}</w:body>")):
+            if body.sectPr is not None:
+                body.sectPr.addprevious(el)
+            else:
+                body.append(el)
+        self.rendered_fragments[file_item['path']] = record
+        self.incremental_stats['reused'] += 1
+        self.incremental_stats['seconds_saved'] += record.get('seconds', 0)
+
+    def _render_download(self, file_item, future, record=None):
+        """Waits for one download and renders it, recording failures instead of aborting."""
+        doc = self.doc
+        if future is None:
+            self._reuse_fragment(doc, file_item, record)
+            return
+        try:
+            code_content, runs, seconds = future.result()
+        except SkippedFile as e:
+            print(f"[Agent] Skipped {file_item['name']}: {e}")
+            self.skipped_files.append((file_item['path'], str(e)))
+            return
+        except Exception as e:
+            print(f"[Error] Could not download file {file_item['name']}: {e}")
+            self.failed_files.append((file_item['path'], str(e)))
+            return
+        start, started = self._body_end(doc), time.perf_counter()
+        self.render_file(file_item, code_content, runs)
+        self.incremental_stats['rendered'] += 1
+        # Truncated files are re-fetched every run so their appendix entry is never lost
+        if self.incremental and not file_item.get('truncated'):
+            self._capture_fragment(doc, file_item, start, seconds + time.perf_counter() - started)
+
+    def run(self, folder_url, target_extensions=['.cpp', '.h', '.hpp']):
+        """Main execution function."""
+        try:
+            self.source_url = folder_url
+
+            # --- 1. Create a Professional Title Page ---
+            title = self.doc.add_heading('Codebase Report', 0)
+            title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            title.runs[0].font.name = 'Segoe UI'
+            title.runs[0].font.color.rgb = RGBColor(16, 54, 92) # Dark Blue
+
+            # Add Date and URL info
+            p = self.doc.add_paragraph()
+            p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            p.add_run(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n").bold = True
+            p.add_run(f"Source: {folder_url}")
+            self.doc.add_page_break()
+
+            # --- 2. Start Processing ---
+            if self.source_mode == "archive":
+                manifest = self.fetch_tree_manifest(self.parse_repo_url(folder_url), target_extensions)
+                if manifest is None:
+                    print("[Agent] Tree listing truncated, ordering the archive by path")
+                else:
+                    print(f"[Agent] Found {len(manifest)} matching file(s)")
+                    self.total_files = len(manifest)
+
+                members = self.fetch_archive_files(folder_url, target_extensions, manifest)
+                for file_item, code_content, runs in self.highlight_ahead(members):
+                    if code_content is not None:
+                        if manifest is None:
+                            self.total_files += 1
+                        self.render_file(file_item, code_content, runs)
+            else:
+                manifest = self.load_checkpoint(folder_url, target_extensions) if self.incremental else None
+                if manifest is not None:
+                    print(f"[Agent] Resuming an interrupted run ({len(manifest)} file(s))")
+                else:
+                    manifest = self.discover_files(folder_url, target_extensions)
+                    print(f"[Agent] Found {len(manifest)} matching file(s)")
+                self.total_files = len(manifest)
+
+                if self.incremental:
+                    self.previous_fragments = self.load_previous_manifest()
+                    current_paths = {file_item['path'] for file_item in manifest}
+                    self.incremental_stats['removed'] = len(set(self.previous_fragments) - current_paths)
+                    if manifest:
+                        self.checkpoint = {'target_extensions': list(target_extensions), 'manifest': manifest}
+                        self.save_checkpoint()
+                self.process_files(manifest)
+
+            self.evict_caches()
+            if self.skipped_files:
+                self.add_skipped_appendix(self.doc, self.skipped_files)
+            
+            self.doc.save(self.output_filename)
+            print(f"\n[Success] Document saved as: {self.output_filename}")
+            if self.incremental and self.source_mode != "archive":
+                self.save_manifest()
+                self.checkpoint = None
+                inc = self.incremental_stats
+                print(f"[Agent] Incremental: {inc['reused']} reused, {inc['rendered']} re-rendered, "
+                      f"{inc['removed']} removed, ~{inc['seconds_saved']:.1f}s of download/render work skipped")
+            stats = self.http_stats
+            print(f"[Agent] HTTP: {stats['requests']} request(s), {stats['retries']} retries, "
+                  f"{stats['wait_seconds']:.1f}s waiting on limits/backoff")
+            if self.source_mode == "graphql":
+                gql = self.graphql_stats
+                print(f"[Agent] GraphQL: {gql['files']} file(s) in {gql['queries']} queries ({gql['splits']} split), "
+                      f"{gql['fallbacks']} downloaded raw; {stats['requests'] / max(1, len(manifest)):.2f} requests per file")
+            if self.cache_dir:
+                cache = self.cache_stats
+                print(f"[Agent] Blob cache: {cache['hits']} hit(s), {cache['misses']} miss(es), "
+                      f"{cache['bytes_saved']} bytes not downloaded")
+            if self.api_cache_dir:
+                print(f"[Agent] API cache: {self.api_cache_stats['not_modified']} listing(s) unchanged (304)")
+            if self.failed_files:
+                print(f"[Warning] {len(self.failed_files)} file(s) could not be downloaded:")
+                for path, error in self.failed_files:
+                    print(f"  - {path}: {error}")
+            if self.skipped_files:
+                print(f"[Warning] {len(self.skipped_files)} file(s) skipped or truncated (see the appendix):")
+                for path, reason in self.skipped_files:
+                    print(f"  - {path}: {reason}")
+            
+        except Exception as e:
+            self.error = str(e)
+            print(f"[Fatal Error] {e}")
+        finally:
+            if self.checkpoint:
+                self.save_checkpoint()
+                print(f"[Agent] Run interrupted; progress saved to {self.manifest_path()}, run again to resume")
+            self.close_highlight_pool()
+            self.close_git()
+
+
+def run_batch(targets, target_extensions=['.cpp', '.h', '.hpp'], output_directory=".", **options):
+    """Converts many repositories, each into one document in output_directory (see core.run_batch)."""
+    return core.run_batch(GitHubFolderAgent, targets, target_extensions, output_directory,
+                          output_suffix='.docx', **options)
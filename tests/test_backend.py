@@ -0,0 +1,266 @@
+"""Tests of the web backend (github-docx-web/backend/app.py) against stand-in GitHub servers."""
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'github-docx-web', 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+app = pytest.importorskip('app')
+from fake_github import FakeGitHub, OWNER, REPO, BRANCH, ROOT_FOLDER, build_repo
+
+URL = f"https://github.com/{OWNER}/{REPO}/tree/{BRANCH}/{ROOT_FOLDER}"
+dispatch_jobs = app.dispatch_jobs  # The backend fixture replaces it
+
+# /api/status under load: jobs converting files of the fake repository at once
+STATUS_LOAD_JOBS = 3
+STATUS_LOAD_FILES = 150
+STATUS_P99_SECONDS = 0.15
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """The app with empty job records, working in tmp_path; queued jobs are never started."""
+    monkeypatch.chdir(tmp_path)
+    for name, value in [('jobs', {}), ('job_requests', {}), ('results', {}), ('batches', {}),
+                        ('job_queues', OrderedDict()), ('running_jobs', set()), ('client_rate_limits', {})]:
+        monkeypatch.setattr(app, name, value)
+    monkeypatch.setattr(app, 'dispatch_jobs', lambda: None)
+    monkeypatch.setattr(app, 'janitor_thread', threading.Thread())  # Kept from sweeping the test folders
+    return app.app.test_client()
+
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    fake = FakeGitHub(build_repo(file_count=20)).start()
+    monkeypatch.setattr(app, 'GITHUB_API', fake.base)
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def failing_github(monkeypatch):
+    """A GitHub API that answers every request with 502; yields the list of requested paths."""
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            self.send_response(502)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, 'GITHUB_API', f'http://127.0.0.1:{server.server_port}')
+    yield requested
+    server.shutdown()
+    server.server_close()
+
+
+def test_convert_answers_without_retrying_github(backend, failing_github):
+    started = time.perf_counter()
+    response = backend.post('/api/convert', json={'url': 'https://github.com/o/r/tree/main/src'})
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2
+    assert failing_github == ['/repos/o/r/commits/main']  # One try, no backoff
+    job = app.jobs[app.job_requests[response.json['job_id']]['job']]
+    assert job['result_key'] is None  # Runs unshared and reports GitHub's error itself
+    assert job['args'][7] is None  # No pinned ref
+
+
+def test_clients_share_the_workers_in_turn(backend, failing_github, monkeypatch):
+    monkeypatch.setattr(app, 'MAX_QUEUED_PER_CLIENT', 3)
+    monkeypatch.setattr(app, 'JOB_PROCESSES', 2)
+    monkeypatch.setattr(app, 'average_job_seconds', 40.0)
+
+    def convert(token):
+        return backend.post('/api/convert', json={'url': 'https://github.com/o/r/tree/main/src', 'token': token})
+
+    first_client = [app.job_requests[convert('a').json['job_id']]['job'] for _ in range(3)]
+    response = convert('a')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '20'  # One job of 40 s on each of 2 workers
+    second_client = app.job_requests[convert('b').json['job_id']]['job']
+
+    started = []
+    monkeypatch.setattr(app, 'submit_job', lambda job_id, *args: started.append(job_id))
+    monkeypatch.setattr(app, 'dispatch_jobs', dispatch_jobs)
+    app.dispatch_jobs()
+    assert started == [first_client[0], second_client]  # Ahead of the rest of the first client's jobs
+    assert [list(queue) for queue in app.job_queues.values()] == [first_client[1:]]
+
+
+def test_batch_must_fit_in_the_queue(backend, monkeypatch):
+    monkeypatch.setattr(app, 'MAX_QUEUED_JOBS', 3)
+    monkeypatch.setattr(app, 'pin_batch_jobs', lambda pending: None)
+    assert backend.post('/api/convert/batch', json={'repos': [URL, URL]}).status_code == 200
+    response = backend.post('/api/convert/batch', json={'repos': [URL, URL]})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert len(app.jobs) == 2  # Nothing of the rejected batch was queued
+
+
+def test_batch_leaves_room_for_other_clients(backend, monkeypatch):
+    monkeypatch.setattr(app, 'MAX_BATCH_QUEUED_PER_CLIENT', 2)
+    monkeypatch.setattr(app, 'pin_batch_jobs', lambda pending: None)
+    assert backend.post('/api/convert/batch', json={'repos': [URL, URL], 'token': 'a'}).status_code == 200
+    assert backend.post('/api/convert/batch', json={'repos': [URL], 'token': 'a'}).status_code == 429
+    assert backend.post('/api/convert/batch', json={'repos': [URL], 'token': 'b'}).status_code == 200
+
+
+def test_batch_duplicates_share_one_job_once_pinned(backend, fake_github):
+    response = backend.post('/api/convert/batch', json={'repos': [URL, URL, URL]})
+    request_ids = [repo['job_id'] for repo in response.json['repos']]
+    deadline = time.time() + 10
+    while len({app.job_requests[request_id]['job'] for request_id in request_ids}) > 1 and time.time() < deadline:
+        time.sleep(0.05)  # Branches are pinned on a background thread
+    job_ids = {app.job_requests[request_id]['job'] for request_id in request_ids}
+    assert len(job_ids) == 1
+    job = app.jobs[job_ids.pop()]
+    assert job['requests'] == set(request_ids)
+    assert job['args'][7] == (fake_github.commit_sha, fake_github.tree_sha)
+    assert sum(len(queue) for queue in app.job_queues.values()) == 1
+
+
+@pytest.fixture
+def job_worker(monkeypatch, tmp_path):
+    """Runs process_job in this process, as a job worker would; returns a function taking a fake GitHub."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, 'progress_queue', queue.Queue())
+
+    def run(fake, source_mode='api', token=None):
+        monkeypatch.setattr(app, 'GITHUB_API', fake.base)
+        monkeypatch.setattr(app, 'GITHUB_RAW', fake.base + '/raw')
+        output_dir = str(tmp_path / 'output' / source_mode)
+        os.makedirs(output_dir, exist_ok=True)
+        return app.process_job('job', URL, token, ['.cpp', '.h', '.py'], output_dir, source_mode)
+    return run
+
+
+def test_job_stopped_by_the_rate_limit_is_resumed(job_worker):
+    fake = FakeGitHub(build_repo(file_count=20), rate_limit=1, rate_window=3600).start()
+    try:
+        result = job_worker(fake)  # The commit lookup takes the only request; the tree listing is refused
+    finally:
+        fake.stop()
+    assert result['status'] == 'rate_limited'
+    assert result['resume_at'] > time.time() + 600
+
+
+def test_other_failure_after_a_rate_limited_request_is_an_error(job_worker, monkeypatch):
+    def disk_full(agent):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(app.GitHubFolderAgent, 'save_all_documents', disk_full)
+    # The GraphQL query is refused for the limit and the files come as raw downloads instead
+    fake = FakeGitHub(build_repo(file_count=20), rate_limit=2, rate_window=3600).start()
+    try:
+        result = job_worker(fake, 'graphql', token='test')
+    finally:
+        fake.stop()
+    assert fake.counts.get('rate_limited')
+    assert result['status'] == 'error'
+    assert 'resume_at' not in result
+    assert result['error'] == "No space left on device"
+
+
+def test_progress_report_changes_with_status_codes_alone(tmp_path):
+    agent = app.GitHubFolderAgent(output_directory=str(tmp_path))
+    first = app.agent_progress(agent)
+    agent._count_response(200)
+    assert app.agent_progress(agent) != first
+    assert first['http']['status_codes'] == {}
+
+
+def test_janitor_sweeps_from_the_first_request(backend, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'janitor_thread', None)
+    stale = tmp_path / 'output' / 'left-over'
+    stale.mkdir(parents=True)
+    os.utime(stale, (time.time() - 2 * app.JANITOR_INTERVAL,) * 2)
+    assert backend.get('/api/health').status_code == 200
+    deadline = time.time() + 10
+    while stale.exists() and time.time() < deadline:
+        time.sleep(0.05)
+    assert not stale.exists()
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+def post_json(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode('utf-8'), {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)
+
+
+@pytest.fixture
+def running_server(tmp_path):
+    """The backend in its own process, converting from a fake GitHub; yields its base URL."""
+    fake = FakeGitHub(build_repo(file_count=STATUS_LOAD_FILES, median_size=8000)).start()
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, GITHUB_API_URL=fake.base, GITHUB_RAW_URL=fake.base + '/raw',
+               PYTHONPATH=os.pathsep.join([os.path.join(ROOT, 'github-docx-web', 'backend'), ROOT]))
+    server = subprocess.Popen([sys.executable, '-c', f'import app; app.app.run(port={port}, threaded=True)'],
+                              cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                get_json(base + '/api/health')
+                break
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise
+                time.sleep(0.1)
+        yield base
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        fake.stop()
+
+
+def test_status_stays_fast_while_jobs_render(running_server):
+    """/api/status answers quickly while several highlighted conversions run in the worker processes."""
+    job_ids = []
+    for index in range(STATUS_LOAD_JOBS):
+        # A made-up extension per job keeps the jobs from sharing one result
+        body = {'url': URL, 'extensions': ['.cpp', '.h', '.py', f'.none{index}'], 'highlight': 'friendly'}
+        job_ids.append(post_json(running_server + '/api/convert', body)['job_id'])
+
+    latencies, statuses = [], {}
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        for job_id in job_ids:
+            started = time.perf_counter()
+            statuses[job_id] = get_json(f'{running_server}/api/status/{job_id}')['status']
+            latencies.append(time.perf_counter() - started)
+        if all(status in ('completed', 'error', 'cancelled') for status in statuses.values()):
+            break
+        time.sleep(0.02)
+
+    assert list(statuses.values()) == ['completed'] * STATUS_LOAD_JOBS
+    assert get_json(running_server + '/api/health')['memory']['workers'] >= 1
+    latencies.sort()
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{len(latencies)} status requests, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms")
+    assert p99 < STATUS_P99_SECONDS
@@ -0,0 +1,38 @@
+"""
+The github-docx command must answer --help and reject bad arguments without
+importing the converters (see benchmarks/cli_startup.py for the timings).
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('docx', 'lxml', 'requests', 'urllib3', 'pygments')
+
+
+def imported_modules(*args):
+    """Runs python -X importtime -m github_docx with args; returns its exit code and the modules it imported."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    env.pop('GITHUB_TOKEN', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'github_docx', *args], env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=60)
+    modules = {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines()
+               if line.startswith('import time:') and '|' in line}
+    return result.returncode, modules
+
+
+def heavy(modules):
+    return sorted(name for name in modules if name.split('.')[0] in HEAVY)
+
+
+def test_help_imports_no_converter_dependencies():
+    returncode, modules = imported_modules('--help')
+    assert returncode == 0
+    assert 'github_docx.cli' in modules
+    assert heavy(modules) == []
+
+
+def test_rejected_argument_imports_no_converter_dependencies():
+    returncode, modules = imported_modules('https://example.com/not/github')
+    assert returncode == 2  # argparse's usage error
+    assert heavy(modules) == []
@@ -0,0 +1,308 @@
+"""Unit tests for the shared transport, cache, archive and git code in github_docx.core."""
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from github_docx.core import BaseAgent, SkippedFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from fake_github import FakeGitHub, OWNER, REPO, BRANCH, ROOT_FOLDER, blob_sha, build_repo
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, text='', url=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+        self.url = url
+
+
+def test_retry_after_in_seconds():
+    assert BaseAgent()._retry_delay(FakeResponse(429, {'Retry-After': '7'}), 0) == 7.0
+
+
+def test_retry_after_as_http_date():
+    response = FakeResponse(429, {'Retry-After': formatdate(time.time() + 30, usegmt=True)})
+    assert 25 <= BaseAgent()._retry_delay(response, 0) <= 30
+
+
+def test_unreadable_retry_after_falls_back_to_backoff():
+    delay = BaseAgent()._retry_delay(FakeResponse(429, {'Retry-After': 'soon'}), 2)
+    assert 0 <= delay <= 4
+
+
+def test_not_modified_after_eviction(tmp_path, monkeypatch):
+    agent = BaseAgent(api_cache_dir=str(tmp_path))
+    url = agent.api_base + '/repos/o/r'
+    key = agent._api_cache_key(url, None)
+    agent._write_api_cache(key, {'url': url, 'etag': '"v1"', 'stored_at': time.time(), 'body': '{"ok": true}'})
+
+    def not_modified(*args, **kwargs):
+        (tmp_path / (key + '.json')).unlink()  # Evicted while the request was in flight
+        return FakeResponse(304, {'ETag': '"v1"'})
+
+    monkeypatch.setattr(agent, '_send_request', not_modified)
+    assert agent.http_get(url).json() == {'ok': True}
+
+
+def test_corrupt_cached_blob_is_a_miss(tmp_path):
+    agent = BaseAgent(cache_dir=str(tmp_path))
+    sha = 'ab' * 20
+    path = tmp_path / sha[:2] / (sha[2:] + '.z')
+    path.parent.mkdir()
+    path.write_bytes(b'not zlib data')
+    assert agent.read_cached_blob(sha) is None
+    assert not path.exists()
+
+
+def test_file_size_limit_is_inclusive():
+    agent = BaseAgent(max_file_bytes=12)
+    whole = {'path': 'a.cpp', 'size': 12}
+    assert agent.decode_content(whole, b'int a;\nint b') == 'int a;\nint b'
+    assert 'truncated' not in whole
+    over = {'path': 'a.cpp', 'size': 13}
+    assert agent.decode_content(over, b'int a;\nint b;') == 'int a;\n'  # Cut at the last line end
+    assert over['truncated']
+
+    agent.large_file_mode = "skip"
+    agent.check_size(whole)
+    with pytest.raises(SkippedFile):
+        agent.check_size(over)
+
+
+def test_decoding_of_non_utf8_content():
+    agent = BaseAgent()
+    assert agent.decode_content({}, '// café'.encode('cp1252')) == '// café'
+    assert agent.decode_content({}, 'x = "\u00e9"'.encode('utf-8')) == 'x = "é"'
+    assert agent.decode_content({}, b'a\x01b\x1fc') == 'abc'  # No control characters in the XML
+    # Cut inside a two-byte character: the partial character is dropped, not read as cp1252
+    assert BaseAgent(max_file_bytes=6).decode_content({}, 'abcdeé'.encode('utf-8')) == 'abcde'
+    with pytest.raises(SkippedFile):
+        agent.decode_content({}, b'\x7fELF\x00\x00')
+
+
+class FakeTarball:
+    """Stands in for the streamed tarball response: members are stored in the given order."""
+
+    def __init__(self, files):
+        self.raw = io.BytesIO()
+        with tarfile.open(fileobj=self.raw, mode='w:gz') as archive:
+            for path, text in files:
+                member = tarfile.TarInfo('o-r-abc123/' + path)
+                member.size = len(text)
+                archive.addfile(member, io.BytesIO(text.encode()))
+        self.raw.seek(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+def test_archive_members_follow_the_manifest(monkeypatch):
+    files = [(f'src/f{index}.cpp', f'int f{index}();\n' * 50) for index in range(10)]
+    tar_order = files[5:] + files[::-1][5:]  # Second half first, then the first half backwards
+    agent = BaseAgent()
+    agent.archive_holdback_chars = 2000  # Room for two held members; the rest are spilled
+    agent.resolved_refs[('o', 'r', 'main')] = ('abc123', 'tree')
+    monkeypatch.setattr(agent, 'http_get', lambda *args, **kwargs: FakeTarball(tar_order))
+    manifest = [{'path': path} for path, _ in files] + [{'path': 'src/gone.cpp'}]
+
+    members = list(agent.fetch_archive_files('https://github.com/o/r/tree/main/src', ['.cpp'], manifest))
+    assert [(item['path'], content) for item, content in members] == files + [('src/gone.cpp', None)]
+    assert agent.skipped_files == [('src/gone.cpp', "not in the repository archive")]
+
+
+# Answers one cat-file request with the header and the start of a blob, then stalls
+STALLED_CAT_FILE = r'''
+import sys
+sha = sys.stdin.readline().strip()
+sys.stdout.buffer.write(sha.encode() + b' blob 1000000\n' + b'x' * 1000)
+sys.stdout.flush()
+sys.stdin.read()
+'''
+
+
+def test_git_blob_read_fails_when_cat_file_dies(tmp_path):
+    subprocess.run(['git', 'init', '-q', str(tmp_path)], check=True)
+    (tmp_path / 'a.cpp').write_text('int a;\n')
+    sha = subprocess.run(['git', '-C', str(tmp_path), 'hash-object', '-w', 'a.cpp'],
+                         check=True, capture_output=True, text=True).stdout.strip()
+    agent = BaseAgent(source_mode="git")
+    agent.git_dir = str(tmp_path)
+    agent._git_batch = stalled = subprocess.Popen([sys.executable, '-c', STALLED_CAT_FILE],
+                                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    outcome = []
+
+    def read():
+        try:
+            outcome.append(agent.read_git_blob(sha))
+        except RuntimeError as e:
+            outcome.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    time.sleep(0.3)
+    stalled.kill()
+    reader.join(timeout=10)
+    assert not reader.is_alive()
+    assert isinstance(outcome[0], RuntimeError)
+    assert agent.read_git_blob(sha) == b'int a;\n'  # A new cat-file process took over
+    agent.close_git()
+
+
+def build_source_tree(root):
+    """A small tree with nested folders, characters Word stores specially, a binary and an oversized file."""
+    (root / 'src' / 'lib').mkdir(parents=True)
+    (root / 'src' / 'main.cpp').write_text('#include <vector>\nint main() {\n\treturn 1 < 2 && "x";\n}\n')
+    (root / 'src' / 'notes.py').write_text('# café ✓\r\ndef f(a):\r\n    return a  # <tag>\r\n')
+    (root / 'src' / 'lib' / 'util.h').write_text('#pragma once\n' + 'int value;\n' * 400)
+    (root / 'src' / 'lib' / 'blob.cpp').write_bytes(b'\x00\x01\x02binary')
+
+
+def document_contents(path):
+    """Paragraph styles and text, and the formatting of every run, of a saved document."""
+    from docx import Document
+
+    contents = []
+    for paragraph in Document(path).paragraphs:
+        text = re.sub(r'Generated on: .*', 'Generated on:', paragraph.text)
+        runs = [(run.font.color.rgb, run.bold, run.italic) for run in paragraph.runs]
+        contents.append((paragraph.style.name, text, runs))
+    return contents
+
+
+def test_streamed_documents_match_saved_ones(tmp_path):
+    from github_docx.by_folder import GitHubFolderAgent
+
+    build_source_tree(tmp_path / 'repo')
+    outputs = {}
+    for streaming in (False, True):
+        output = tmp_path / f'streaming-{streaming}'
+        agent = GitHubFolderAgent(str(output), streaming=streaming, source_mode="local", max_file_bytes=2000,
+                                  highlight_theme="friendly", highlight_workers=1)
+        agent.run(str(tmp_path / 'repo' / 'src'), ['.cpp', '.h', '.py'])
+        assert agent.error is None
+        outputs[streaming] = sorted(os.listdir(output))
+    assert outputs[True] == outputs[False] == ['Root.docx', 'lib.docx']
+    for name in outputs[True]:
+        saved = document_contents(tmp_path / 'streaming-False' / name)
+        assert document_contents(tmp_path / 'streaming-True' / name) == saved
+        assert any(colour for _, _, runs in saved for colour, _, _ in runs)  # Highlighted
+    notes = [text for _, text, _ in document_contents(tmp_path / 'streaming-True' / 'lib.docx')]
+    assert any('blob.cpp' in text for text in notes) and any(text.startswith('Note:') for text in notes)
+
+
+def convert_from(fake, output, source_mode='api', agent_class=None, **options):
+    """Converts the fake repository with the by-folder agent (or agent_class) and returns the agent."""
+    from github_docx.by_folder import GitHubFolderAgent
+
+    agent = (agent_class or GitHubFolderAgent)(str(output), source_mode=source_mode, **options)
+    agent.api_base = fake.base
+    agent.raw_base = fake.base + '/raw'
+    agent.run(f"https://github.com/{OWNER}/{REPO}/tree/{BRANCH}/{ROOT_FOLDER}", ['.cpp', '.h', '.py'])
+    return agent
+
+
+def assert_same_documents(first, second):
+    names = sorted(name for name in os.listdir(first) if name.endswith('.docx'))
+    assert names and sorted(name for name in os.listdir(second) if name.endswith('.docx')) == names
+    for name in names:
+        assert document_contents(os.path.join(second, name)) == document_contents(os.path.join(first, name))
+
+
+def test_graphql_batches_split_when_too_large(tmp_path):
+    fake = FakeGitHub(build_repo(file_count=30, median_size=2000), graphql_max_bytes=20000).start()
+    try:
+        agent = convert_from(fake, tmp_path / 'graphql', 'graphql', github_token='test')
+        convert_from(fake, tmp_path / 'api')
+    finally:
+        fake.stop()
+    assert agent.error is None
+    assert fake.counts.get('graphql_too_large')
+    assert agent.graphql_stats['splits'] > 0
+    assert agent.graphql_stats['files'] > 0
+    assert_same_documents(tmp_path / 'api', tmp_path / 'graphql')
+
+
+def change_file(fake, path, data):
+    fake.files[path] = data
+    fake.blob_shas[path] = blob_sha(data)
+    fake.blobs[fake.blob_shas[path]] = data
+
+
+def test_incremental_run_renders_only_changed_files(tmp_path):
+    fake = FakeGitHub(build_repo(file_count=20)).start()
+    try:
+        first = convert_from(fake, tmp_path / 'out', incremental=True)
+        change_file(fake, sorted(fake.files)[3], b'int changed = 1;\n')
+        fake.reset_counts()
+        second = convert_from(fake, tmp_path / 'out', incremental=True)
+        assert fake.counts['raw'] == 1  # Only the changed file is downloaded
+        fresh = convert_from(fake, tmp_path / 'fresh')
+        assert_same_documents(tmp_path / 'fresh', tmp_path / 'out')
+        themed = convert_from(fake, tmp_path / 'out', incremental=True, highlight_theme='friendly', highlight_workers=1)
+    finally:
+        fake.stop()
+    assert first.error is second.error is fresh.error is themed.error is None
+    assert first.incremental_stats['rendered'] == 20
+    assert (second.incremental_stats['reused'], second.incremental_stats['rendered']) == (19, 1)
+    # Fragments stored with other render options are dropped
+    assert (themed.incremental_stats['reused'], themed.incremental_stats['rendered']) == (0, 20)
+
+
+def test_interrupted_run_resumes_from_the_checkpoint(tmp_path):
+    from github_docx.by_folder import GitHubFolderAgent
+
+    class InterruptedAgent(GitHubFolderAgent):
+        def emit_file(self, *args, **kwargs):
+            if self.incremental_stats['rendered'] == 8:
+                raise ConnectionError("connection lost")
+            super().emit_file(*args, **kwargs)
+
+    fake = FakeGitHub(build_repo(file_count=20)).start()
+    try:
+        interrupted = convert_from(fake, tmp_path / 'out', agent_class=InterruptedAgent, incremental=True)
+        assert interrupted.error == "connection lost"
+        with open(tmp_path / 'out' / '.manifest.json', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        assert len(checkpoint['resume']['manifest']) == 20 and len(checkpoint['files']) == 8
+        fake.reset_counts()
+        resumed = convert_from(fake, tmp_path / 'out', incremental=True)
+        assert fake.counts == {'raw': 12}  # No new listing, and only the files not rendered yet
+        fresh = convert_from(fake, tmp_path / 'fresh')
+    finally:
+        fake.stop()
+    assert resumed.error is None
+    assert (resumed.incremental_stats['reused'], resumed.incremental_stats['rendered']) == (8, 12)
+    with open(tmp_path / 'out' / '.manifest.json', encoding='utf-8') as f:
+        assert 'resume' not in json.load(f)
+    assert_same_documents(tmp_path / 'fresh', tmp_path / 'out')
+
+
+def test_truncated_file_is_noted_in_the_single_report(tmp_path):
+    from github_docx.single import GitHubFolderAgent
+
+    build_source_tree(tmp_path / 'repo')
+    output = tmp_path / 'report.docx'
+    agent = GitHubFolderAgent(str(output), source_mode="local", max_file_bytes=2000)
+    agent.run(str(tmp_path / 'repo' / 'src'), ['.cpp', '.h', '.py'])
+    assert agent.error is None
+    texts = [text for _, text, _ in document_contents(output)]
+    note = texts.index("Full Path: lib/util.h") + 1
+    assert texts[note] == "Note: truncated to the first 2.0 KB of 4.3 KB"
+    appendix = texts[texts.index("Appendix: Skipped and Truncated Files") + 1:]
+    assert appendix == ["lib/blob.cpp: binary file", "lib/util.h: truncated to the first 2.0 KB of 4.3 KB"]